@@ -0,0 +1,87 @@
+"""Compare loading the tileset, the menu background and the music from the asset pack against decoding their files.
+
+Each way runs in a fresh interpreter, several times, and reports the median time to load the
+assets and how much the peak memory of the process grew while loading them. The views of the pack
+are only read from disk when they are used, so the time and memory to read every sample once, like
+the mixer does when it converts the music, is reported as well.
+Make the pack first, the music is left out of both when `assets/music/music.wav` is missing:
+    python -m updates.make_pack
+    python -m benchmarks.assets
+    python -m benchmarks.assets --runs 10
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import print_table
+from updates.make_pack import IMAGES, SOUNDS, TILESET
+
+CHILD = """
+import json
+import os
+import resource
+import sys
+import time
+
+import tcod
+
+import core.assets as assets
+from updates.make_pack import IMAGES, SOUNDS, TILESET
+
+if sys.argv[1] == "files":
+    assets._pack_loaded = True  # As if there was no pack.
+else:
+    assets.pack()
+
+
+def peak():
+    # In KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+before = peak()
+start = time.perf_counter()
+loaded = [assets.tileset(*TILESET)]
+loaded += [assets.image(name) for name in IMAGES]
+sounds = [assets.sound(name)[0] for name in SOUNDS if os.path.exists(name)]
+load = time.perf_counter() - start
+load_peak = peak() - before
+for samples in sounds:
+    float(samples.sum())
+print(json.dumps({"load": load, "load_peak": load_peak, "read": time.perf_counter() - start, "read_peak": peak() - before}))
+"""
+
+
+def run_once(way: str) -> dict:
+    process = subprocess.run([sys.executable, "-c", CHILD, way], capture_output=True, text=True, check=True)
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh starts for each way, the median is reported.")
+    args = parser.parse_args()
+
+    import core.assets as assets
+
+    if assets.pack() is None:
+        sys.exit("There is no asset pack, make it with: python -m updates.make_pack")
+    print(f"assets: {', '.join([TILESET[0], *IMAGES, *SOUNDS])}")
+    rows = []
+    for way in ("files", "pack"):
+        runs = [run_once(way) for _ in range(args.runs)]
+
+        def median(field: str) -> float:
+            return statistics.median(run[field] for run in runs)
+
+        rows.append((way, median("load") * 1e3, median("load_peak") / 2 ** 10,
+                     median("read") * 1e3, median("read_peak") / 2 ** 10))
+    print_table(("decoded from", "load ms", "peak MiB", "load + read samples ms", "peak MiB"), rows)
+
+
+if __name__ == "__main__":
+    main()
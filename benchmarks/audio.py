@@ -0,0 +1,143 @@
+"""Compare streaming a playlist through core.audio against decoding and converting each track whole, and time the sound effects.
+
+Both run without an audio device, on tracks made up for the run at other sample rates than the
+device. Decoding whole is what the menu did before, `soundfile.read` and `convert` of the full
+track, keeping both. Streaming pulls every block the mixer would queue, crossfades included, and
+reports the time a block takes against the time it plays for. Both report the peak of the memory
+they allocate, traced with tracemalloc.
+For the sound effects of core.sfx, it reports the time to decode them all into the sample cache,
+the time `sfx.play` takes on the game thread and the time to mix the most voices into a block.
+Run from the project folder:
+    python -m benchmarks.audio
+    python -m benchmarks.audio --seconds 300 --tracks 3
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+import numpy as np  # type: ignore
+
+import core.audio as audio
+import core.sfx as sfx
+from benchmarks.common import print_table
+
+FREQUENCY = 48000  # Of the device.
+CHANNELS = 2
+BLOCK_FRAMES = 1024  # The usual buffer of an SDL device.
+
+
+def make_tracks(folder: str, count: int, seconds: float) -> list:
+    """Stereo and mono tones at 44.1 and 22.05 kHz, in 16-bit WAV files."""
+    import soundfile
+
+    tracks = []
+    for n in range(count):
+        samplerate = (44100, 22050)[n % 2]
+        t = np.arange(int(seconds * samplerate)) / samplerate
+        tone = 0.2 * np.sin(2 * np.pi * (220 + 110 * n) * t)
+        samples = np.stack([tone, tone[::-1]], axis=1) if n % 2 == 0 else tone
+        tracks.append(os.path.join(folder, f"track{n}.wav"))
+        soundfile.write(tracks[-1], samples, samplerate, subtype="PCM_16")
+    return tracks
+
+
+def decode_whole(tracks: list, traced: bool) -> None:
+    """What the menu did before, keeping the decoded and the converted track."""
+    import soundfile
+    import tcod.sdl.audio
+
+    kept = []
+    for track in tracks:
+        sound, samplerate = soundfile.read(track, dtype="float32")
+        kept.append((sound, tcod.sdl.audio.convert_audio(sound, samplerate, out_rate=FREQUENCY, out_format=np.float32,
+                                                          out_channels=CHANNELS)))
+
+
+def stream(tracks: list, traced: bool) -> List[float]:
+    """Pull every block of the playlist, returns the time each took, not kept when the memory is traced."""
+    music = audio.Music(FREQUENCY, CHANNELS, BLOCK_FRAMES)
+    music.play(tracks, loop=False)
+    times = []
+    while music.playing:
+        start = time.perf_counter()
+        music.mix_block()
+        if not traced:
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def measure(function: Callable[[bool], object]) -> Tuple[float, float, object]:
+    """Seconds the call takes, and the peak of the memory it allocates in MiB, measured in a second, traced call."""
+    start = time.perf_counter()
+    result = function(False)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    function(True)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=120, help="Length of each track.")
+    parser.add_argument("--tracks", type=int, default=2, help="Tracks in the playlist.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        tracks = make_tracks(folder, args.tracks, args.seconds)
+        whole_seconds, whole_peak, _ = measure(lambda traced: decode_whole(tracks, traced))
+        stream_seconds, stream_peak, times = measure(lambda traced: stream(tracks, traced))
+
+    print(f"{args.tracks} tracks of {args.seconds:.0f} s to a {FREQUENCY} Hz device, {BLOCK_FRAMES} frame blocks")
+    print_table(
+        ("way", "total ms", "peak MiB"),
+        [("decoded whole", whole_seconds * 1e3, whole_peak), ("streamed", stream_seconds * 1e3, stream_peak)],
+    )
+    budget = BLOCK_FRAMES / FREQUENCY
+    p99 = sorted(times)[int(len(times) * 0.99)]
+    print(f"\nstreamed {len(times)} blocks, {len(times) * budget:.1f} s with the crossfades, "
+          f"p99 {p99 * 1e3:.3f} ms a block for {budget * 1e3:.1f} ms of sound "
+          f"({p99 / budget:.1%} of the time the decoder thread has)")
+
+    print()
+    effects()
+
+
+def effects() -> None:
+    start = time.perf_counter()
+    cache = sfx.SampleCache(FREQUENCY, CHANNELS)
+    for name in sfx.SOUNDS:
+        cache.get(name)
+    decoded = time.perf_counter() - start
+    sfx._effects = sfx.Effects(cache)
+    names = list(sfx.SOUNDS) * 1000
+    start = time.perf_counter()
+    for name in names:
+        sfx.play(name)
+    trigger = (time.perf_counter() - start) / len(names)
+    sfx._effects.triggered.clear()
+
+    block = np.zeros((BLOCK_FRAMES, CHANNELS), np.float32)
+    mixes = []
+    for n in range(2000):
+        sfx.play(names[n % len(sfx.SOUNDS)])  # One more every block, the oldest voices make room.
+        start = time.perf_counter()
+        sfx._effects.mix(block)
+        mixes.append(time.perf_counter() - start)
+    sfx._effects = None
+    print_table(
+        ("sound effects", "value"),
+        [("decoded into the cache, ms", decoded * 1e3), ("cache, KiB", cache.size / 2 ** 10),
+         ("sfx.play on the game thread, us", trigger * 1e6),
+         (f"mixing up to {sfx.MAX_VOICES} voices, p99 ms a block", sorted(mixes)[int(len(mixes) * 0.99)] * 1e3)],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Shared helpers for the benchmark scripts."""
+from __future__ import annotations
+
+import copy
+import random
+import time
+from typing import TYPE_CHECKING, Callable, List, Sequence, Tuple
+
+import numpy as np  # type: ignore
+
+import core.settings as settings
+import game.entity_factories as entity_factories
+from core.engine import Engine
+from game.game_map import GameWorld
+
+if TYPE_CHECKING:
+    from game.entity import Entity
+    from game.game_map import GameMap
+
+
+def build_engine(floor: int = 1, seed: int = 0) -> Engine:
+    """Return an Engine on the given floor, laid out the same way as a new game would grow it."""
+    random.seed(seed)
+
+    player = copy.deepcopy(entity_factories.player)
+    engine = Engine(player=player)
+    engine.game_world = GameWorld(
+        engine=engine,
+        max_rooms=30,
+        room_min_size=6,
+        room_max_size=10,
+        map_width=80 + settings.data.screen_width + 10 * (floor - 1),
+        map_height=43 + settings.data.screen_height + 10 * (floor - 1),
+        current_floor=floor - 1,
+        screen_width=settings.data.screen_width,
+        screen_height=settings.data.screen_height,
+        player=player
+    )
+    engine.game_world.generate_floor()
+    engine.update_fov()
+    return engine
+
+
+def populate(
+        gamemap: GameMap,
+        count: int,
+        seed: int = 0,
+        factories: Sequence[Entity] = (entity_factories.orc, entity_factories.troll, entity_factories.health_potion),
+) -> None:
+    """Spawn `count` copies of `factories` on random floor tiles of the map."""
+    rng = random.Random(seed)
+    floor_tiles = np.argwhere(gamemap.tiles["walkable"])
+    for _ in range(count):
+        x, y = floor_tiles[rng.randrange(len(floor_tiles))]
+        rng.choice(factories).spawn(gamemap, int(x), int(y))
+
+
+def time_calls(function: Callable[[], object], repeat: int) -> List[float]:
+    """Call `function` `repeat` times and return the duration of each call in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def print_table(header: Tuple[str, ...], rows: List[Tuple[object, ...]]) -> None:
+    """Print rows as a plain aligned text table."""
+    cells = [header] + [tuple(f"{value:.3f}" if isinstance(value, float) else str(value) for value in row) for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(header))]
+    for n, row in enumerate(cells):
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+        if n == 0:
+            print("  ".join("-" * width for width in widths))
@@ -0,0 +1,61 @@
+"""Compare drawing entities by sorting the whole floor against the indexed, per layer draw.
+
+Run from the project folder:
+    python -m benchmarks.entity_render --entities 100 1000 10000 --frames 200
+"""
+from __future__ import annotations
+
+import argparse
+from typing import Tuple
+
+import tcod
+
+from benchmarks.common import build_engine, populate, print_table, time_calls
+from game.game_map import GameMap
+
+
+def render_sorted(gamemap: GameMap, console: tcod.console.Console) -> None:
+    """The entity drawing GameMap.render did before the index, kept here for comparison."""
+    player = gamemap.player
+    first_pixel = player.x - gamemap.center[0], player.y - gamemap.center[1]
+    for entity in sorted(gamemap.entities, key=lambda x: x.render_order.value):
+        if entity is player:
+            continue
+        if (gamemap.visible[entity.x, entity.y]
+                and abs(entity.x - player.x) < gamemap.center[0] + 1
+                and abs(entity.y - player.y) < gamemap.center[1] + 1):
+            console.print(entity.x - first_pixel[0], entity.y - first_pixel[1], entity.char, fg=entity.color)
+
+
+def bench_entities(count: int, frames: int, floor: int, seed: int) -> Tuple[object, ...]:
+    engine = build_engine(floor, seed)
+    gamemap = engine.game_map
+    player = gamemap.player
+
+    populate(gamemap, count, seed)
+    gamemap.visible[:] = True  # Worst case, everything on screen is drawn.
+
+    console = tcod.console.Console(80, 50, order="F")
+    gamemap.render(console, player.x, player.y)
+    first_pixel = player.x - gamemap.center[0], player.y - gamemap.center[1]
+    on_screen = sum(1 for _ in gamemap.entities.in_rect(*first_pixel, first_pixel[0] + 81, first_pixel[1] + 51))
+
+    old = sum(time_calls(lambda: render_sorted(gamemap, console), frames)) / frames
+    new = sum(time_calls(lambda: gamemap.render(console, player.x, player.y), frames)) / frames
+    return len(gamemap.entities), on_screen, old * 1e3, new * 1e3, old / new
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entities", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--floor", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = [bench_entities(count, args.frames, args.floor, args.seed) for count in args.entities]
+    print_table(("entities", "on screen", "sorted ms", "indexed ms", "speedup"), rows)
+
+
+if __name__ == "__main__":
+    main()
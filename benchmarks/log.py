@@ -0,0 +1,98 @@
+"""Compare the time a log call takes on the game thread, written to the file inline and through core.log.
+
+The inline way is the file handler main.py set up before, appending to the log with every call.
+Through core.log, the call only queues the record and the writer thread does the rest. Each way
+logs the same messages, a few with a traceback, into a temporary folder, and reports the latency
+of a call, the time a frame spent logging, and the size of the files, rotation included.
+The structured per-turn events are timed the same way.
+Run from the project folder:
+    python -m benchmarks.log
+    python -m benchmarks.log --calls 200000 --per-frame 20
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from typing import List, Tuple
+
+import core.log as log
+from benchmarks.common import print_table
+
+FRAME = 1 / 60
+
+
+def log_calls(calls: int, per_frame: int, event: bool = False) -> Tuple[List[float], List[float]]:
+    """Seconds each call took, and each frame spent logging.
+    The calls come in frames of FRAME seconds, the rest of each frame is idle like the game waiting for input.
+    """
+    times = []
+    frames = []
+    for frame_start in range(0, calls, per_frame):
+        start_frame = time.perf_counter()
+        for n in range(frame_start, min(frame_start + per_frame, calls)):
+            start = time.perf_counter()
+            if event:
+                log.perf("turn", turn=n, floor=n // 1000, actors=12, turn_ms=1.5, player_action_ms=0.2, enemy_turns_ms=0.9)
+            elif n % 1000 == 0:
+                try:
+                    raise ValueError(n)
+                except ValueError:
+                    logging.error("Exception occurred during event handling", exc_info=True)
+            else:
+                logging.debug("Derived map data reuse: %s of %s layers", n % 7, 7)
+            times.append(time.perf_counter() - start)
+        frames.append(time.perf_counter() - start_frame)
+        time.sleep(max(FRAME - frames[-1], 0))
+    return times, frames
+
+
+def folder_size(folder: str) -> Tuple[int, int]:
+    """Files in the folder and their size in bytes."""
+    names = os.listdir(folder)
+    return len(names), sum(os.path.getsize(os.path.join(folder, name)) for name in names)
+
+
+def run(way: str, calls: int, per_frame: int, folder: str) -> tuple:
+    root = logging.getLogger()
+    if way == "inline":
+        handler = logging.FileHandler(os.path.join(folder, log.LOG_FILE), mode="a")
+        handler.setFormatter(logging.Formatter(log.FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+        times, frames = log_calls(calls, per_frame)
+        handler.close()
+        root.removeHandler(handler)
+    else:
+        log.setup(folder, perf_events=way == "events")
+        times, frames = log_calls(calls, per_frame, event=way == "events")
+        log.stop()
+        for handler in list(root.handlers) + list(log.perf_logger.handlers):
+            root.removeHandler(handler)
+            log.perf_logger.removeHandler(handler)
+    times.sort()
+    frames.sort()
+    files, size = folder_size(folder)
+    return (way, times[len(times) // 2] * 1e6, times[int(len(times) * 0.99)] * 1e6,
+            frames[int(len(frames) * 0.99)] * 1e3, frames[-1] * 1e3, files, size / 2 ** 20)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50_000)
+    parser.add_argument("--per-frame", type=int, default=100, help="Log calls in each frame.")
+    args = parser.parse_args()
+
+    rows = []
+    for way in ("inline", "queued", "events"):
+        with tempfile.TemporaryDirectory() as folder:
+            rows.append(run(way, args.calls, args.per_frame, folder))
+    print(f"{args.calls} calls, {args.per_frame} a frame, rotated past {log.MAX_BYTES / 2 ** 20:.0f} MiB "
+          f"with {log.BACKUPS} backups")
+    print_table(("way", "call p50 us", "call p99 us", "frame p99 ms", "frame max ms", "files", "MiB"), rows)
+
+
+if __name__ == "__main__":
+    main()
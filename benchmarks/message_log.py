@@ -0,0 +1,82 @@
+"""Benchmark the message log with very long runs.
+
+Compares the bounded log with an archive against an unbounded log kept fully in memory.
+Run from the project folder:
+    python -m benchmarks.message_log --messages 100000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import pickle
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Optional, Tuple
+
+import tcod
+
+from benchmarks.common import print_table
+from core.message_log import MESSAGE_CAPACITY, MessageLog
+
+WORDS = "orc troll goblin attacks for hit points the player dodges you picked up a sword potion scroll".split()
+
+
+def bench_log(messages: int, capacity: Optional[int], archive_path: Optional[str], seed: int) -> Tuple[object, ...]:
+    rng = random.Random(seed)
+    console = tcod.console.Console(80, 50, order="F")
+    history = tcod.console.Console(74, 44, order="F")
+
+    tracemalloc.start()
+    log = MessageLog(capacity=capacity, archive_path=archive_path)
+    start = time.perf_counter()
+    for _ in range(messages):
+        log.add_message(" ".join(rng.choices(WORDS, k=rng.randint(3, 18))))
+    add_time = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    frames = 1000
+    start = time.perf_counter()
+    for _ in range(frames):
+        log.render(console, 21, 45, 40, 5)
+    frame_time = (time.perf_counter() - start) / frames
+
+    pages = 200
+    start = time.perf_counter()
+    for _ in range(pages):
+        history.clear()
+        log.render_history(history, 1, 1, 72, 42, end=rng.randrange(1, len(log) + 1))
+    page_time = (time.perf_counter() - start) / pages
+
+    return (
+        "unbounded" if capacity is None else f"ring {capacity}",
+        len(log),
+        add_time * 1e6 / messages,
+        frame_time * 1e6,
+        page_time * 1e3,
+        len(pickle.dumps(log)) / 1024,
+        peak / 1024 / 1024,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        rows = [
+            bench_log(args.messages, None, None, args.seed),
+            bench_log(args.messages, MESSAGE_CAPACITY, os.path.join(folder, "archive.log"), args.seed),
+        ]
+    print_table(
+        ("log", "messages", "add us", "frame us", "history page ms", "pickle KiB", "peak MiB"),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
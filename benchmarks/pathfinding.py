@@ -0,0 +1,95 @@
+"""Compare hierarchical pathfinding against a full map search.
+
+Run from the project folder:
+    python -m benchmarks.pathfinding --floors 1 10 25 40 --queries 200
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import List, Tuple
+
+import numpy as np  # type: ignore
+
+import game.pathfinding as pathfinding
+from benchmarks.common import build_engine, print_table
+
+
+def path_cost(start: Tuple[int, int], path: List[Tuple[int, int]]) -> int:
+    """Cost of a path with the weights BaseAI uses, 2 for cardinal and 3 for diagonal steps."""
+    cost = 0
+    x, y = start
+    for next_x, next_y in path:
+        cost += 3 if next_x != x and next_y != y else 2
+        x, y = next_x, next_y
+    return cost
+
+
+def bench_floor(floor: int, queries: int, seed: int) -> Tuple[object, ...]:
+    engine = build_engine(floor, seed)
+    gamemap = engine.game_map
+    ai = engine.player.ai
+    whole_map = slice(0, gamemap.width), slice(0, gamemap.height)
+
+    rng = random.Random(seed)
+    floor_tiles = np.argwhere(gamemap.tiles["walkable"])
+    pairs = [
+        (tuple(floor_tiles[rng.randrange(len(floor_tiles))]), tuple(floor_tiles[rng.randrange(len(floor_tiles))]))
+        for _ in range(queries)
+    ]
+
+    full_paths = []
+    start_time = time.perf_counter()
+    for start, goal in pairs:
+        engine.player.x, engine.player.y = start
+        full_paths.append(ai.get_path_within(whole_map, *goal))
+    full_time = time.perf_counter() - start_time
+
+    threshold = pathfinding.HIERARCHICAL_MIN_CELLS
+    pathfinding.HIERARCHICAL_MIN_CELLS = 0
+    try:
+        hierarchical_paths = []
+        start_time = time.perf_counter()
+        for start, goal in pairs:
+            engine.player.x, engine.player.y = start
+            hierarchical_paths.append(ai.get_path_to(*goal))
+        hierarchical_time = time.perf_counter() - start_time
+    finally:
+        pathfinding.HIERARCHICAL_MIN_CELLS = threshold
+
+    ratios = [
+        path_cost(start, hierarchical) / path_cost(start, full)
+        for (start, _), full, hierarchical in zip(pairs, full_paths, hierarchical_paths)
+        if full and hierarchical
+    ]
+    return (
+        floor,
+        gamemap.width * gamemap.height,
+        len(gamemap.rooms),
+        queries / full_time,
+        queries / hierarchical_time,
+        full_time / hierarchical_time,
+        float(np.mean(ratios)) if ratios else float("nan"),
+        float(np.max(ratios)) if ratios else float("nan"),
+        gamemap.pathfinder.hits,
+        gamemap.pathfinder.misses,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--floors", type=int, nargs="+", default=[1, 10, 25, 40])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = [bench_floor(floor, args.queries, args.seed) for floor in args.floors]
+    print_table(
+        ("floor", "tiles", "rooms", "full q/s", "hier q/s", "speedup", "cost ratio", "worst ratio", "route hits", "route misses"),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
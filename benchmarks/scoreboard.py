@@ -0,0 +1,201 @@
+"""Measure how long the scoreboard client stalls the game, against a local stand-in server.
+
+The stand-in answers like the scoreboard server after a set latency and can be switched to failing.
+The run compares a plain blocking request per scoreboard read, as the game used to make, with the
+client's reads from the local leaderboard. It then checks that runs finished while the server fails
+are kept on the leaderboard and sent once it is back, including by a new client started on the same
+folder, that a run sent late with an old time still reaches a client that synced past that time, and
+times the leaderboard queries on a table of many runs.
+Run from the project folder:
+    python -m benchmarks.scoreboard --latency 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+import components.scoreboard as scoreboard
+from benchmarks.common import print_table
+from components.leaderboard import Leaderboard
+
+
+class StandIn(ThreadingHTTPServer):
+    """A scoreboard server kept in memory."""
+
+    daemon_threads = True
+
+    def __init__(self, latency: float) -> None:
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.latency = latency
+        self.failing = False
+        self.scores: List[dict] = []
+        self.requests = 0
+
+    def receive(self, runs: List[dict]) -> None:
+        """Keep runs numbered in the order they were received, as the server does."""
+        for run in runs:
+            self.scores.append({**run, "seq": len(self.scores) + 1})
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandIn
+
+    def reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def answer(self) -> bool:
+        """Wait the latency, then fail the request if the server is failing."""
+        self.server.requests += 1
+        time.sleep(self.server.latency)
+        if self.server.failing:
+            self.reply(503, {})
+            return False
+        return True
+
+    def do_GET(self) -> None:
+        if not self.answer():
+            return
+        query = parse_qs(urlparse(self.path).query)
+        after, limit = int(query.get("after", ["0"])[0]), int(query.get("limit", ["10"])[0])
+        self.reply(200, {"scores": self.server.scores[after:after + limit]})  # Run number n is at index n - 1.
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not self.answer():
+            return
+        self.server.receive(body["scores"])
+        self.reply(200, {})
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def stalls(call: Callable[[], object], times: int) -> List[float]:
+    """How long each of `times` calls blocked, in milliseconds."""
+    result = []
+    for _ in range(times):
+        start = time.perf_counter()
+        call()
+        result.append((time.perf_counter() - start) * 1e3)
+    return result
+
+
+def wait_for(condition: Callable[[], bool], timeout: float) -> float:
+    """Seconds until `condition` holds, or the timeout."""
+    start = time.perf_counter()
+    while not condition() and time.perf_counter() - start < timeout:
+        time.sleep(0.005)
+    return time.perf_counter() - start
+
+
+def late_runs(server: StandIn, count: int = 12) -> int:
+    """Send runs ended long ago, all at the same time, after a client synced, and return how many it fetched.
+    Like runs a client kept while offline, they come in over more than one page of the next sync.
+    """
+    page_size, scoreboard.PAGE_SIZE = scoreboard.PAGE_SIZE, count // 2
+    client = scoreboard.ScoreboardClient(server.url, tempfile.mkdtemp())
+    wait_for(lambda: len(client.leaderboard) == len(server.scores), 10)
+    requests.post(f"{server.url}/scores", json={"scores": [
+        {"name": f"late{n}", "score": 100 + n, "floor": 1, "level": 1, "xp": 0, "turns": 10, "time": 0.5}
+        for n in range(count)
+    ]}, timeout=5)
+    client.synced_at = 0.0  # Sync again right away.
+    client.wake.set()
+    wait_for(lambda: len(client.leaderboard) == len(server.scores), 10)
+    client.close()
+    scoreboard.PAGE_SIZE = page_size
+    fetched = sum(1 for name, _ in client.leaderboard.top(len(server.scores)) if name.startswith("late"))
+    if fetched < count:
+        raise SystemExit(f"Only {fetched} of {count} runs sent late were fetched.")
+    return fetched
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds the stand-in takes to answer.")
+    parser.add_argument("--reads", type=int, default=20, help="Scoreboard reads, like frames of the popup.")
+    parser.add_argument("--scores", type=int, default=50, help="Runs finished while the server fails.")
+    parser.add_argument("--runs", type=int, default=50_000, help="Runs on the leaderboard the queries are timed on.")
+    args = parser.parse_args()
+
+    server = StandIn(args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    scoreboard.BACKOFF_BASE = 0.05  # Retry quickly, the stand-in comes back within the run.
+    folder = tempfile.mkdtemp()
+    rows = []
+
+    blocking = stalls(lambda: requests.get(f"{server.url}/scores", params={"limit": 15}, timeout=5), args.reads)
+    rows.append(("blocking get", max(blocking), sum(blocking) / len(blocking)))
+
+    # Runs other players sent, fetched by the first sync.
+    server.receive([
+        {"name": f"other{n}", "score": 2000 + n, "floor": 3, "level": 4, "xp": 50, "turns": 900, "time": 1.0 + n}
+        for n in range(30)
+    ])
+    client = scoreboard.ScoreboardClient(server.url, folder)
+    for n in range(5):
+        client.submit(1000 + n, "player", floor=2, level=3, xp=20, turns=400)
+    read = stalls(lambda: client.scores(15, "player"), args.reads)
+    fetched = wait_for(lambda: "other29" in client.scores(15, "player"), 10)
+    read += stalls(lambda: client.scores(15, "player"), args.reads)
+    rows.append(("get_score", max(read), sum(read) / len(read)))
+
+    server.failing = True
+    submits = stalls(lambda: client.submit(500, "offline", floor=1, level=1, xp=0, turns=50), args.scores)
+    rows.append(("send_score offline", max(submits), sum(submits) / len(submits)))
+    wait_for(lambda: client.failures > 1, 10)
+    client.close()
+    kept = len(Leaderboard(os.path.join(folder, "leaderboard.db")).unsent(args.scores + 5))
+
+    server.failing = False
+    restarted = scoreboard.ScoreboardClient(server.url, folder)
+    flushed = wait_for(lambda: not restarted.leaderboard.unsent(1), 10)
+    restarted.close()
+
+    late = late_runs(server)
+
+    leaderboard = restarted.leaderboard = Leaderboard(os.path.join(tempfile.mkdtemp(), "leaderboard.db"))
+    rng = random.Random(0)
+    leaderboard.add(
+        ({"name": f"player{rng.randrange(2000)}", "score": rng.randrange(100_000), "time": float(n)}
+         for n in range(args.runs)),
+        sent=True,
+    )
+    for name, call in (
+            ("text top 15", lambda: leaderboard.text(15, "player7")),
+            ("rank", lambda: leaderboard.rank(rng.randrange(100_000))),
+            ("get_rank", lambda: restarted.rank(50_000)),
+    ):
+        times = stalls(call, args.reads)
+        rows.append((f"{name} of {args.runs} runs", max(times), sum(times) / len(times)))
+
+    print_table(("call", "max stall ms", "mean stall ms"), rows)
+    print(f"\nsynced runs shown {fetched:.3f}s after the first read, the stand-in answers in {args.latency}s")
+    print(f"{kept} runs were kept unsent while the server failed, a new client sent them in {flushed:.3f}s")
+    print(f"{sum(entry['name'] == 'offline' for entry in server.scores)} of {args.scores} offline runs "
+          f"reached the server in {server.requests} requests")
+    print(f"{late} runs sent late with an old time, across a page boundary, were fetched by a client already synced")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Report the time to first frame and what the game imports before it, like `python -X importtime`.
+
+Each run starts a fresh interpreter that imports the game the way main.py does, loads the tileset and
+renders the main menu into a console, then waits for the loading deferred until after the first
+frame. Opening the window is left out, it needs a display and its time doesn't depend on the game.
+The report has the median time to the first frame against its target, the modules that take the most
+time to import, by their own time and with what they import, and flags the modules meant to be
+loaded after the first frame that were imported before it.
+With `--bundle`, it also compares the launches from source with the ones from a bundle made by
+updates/make_bundle.py, cold, when nothing is cached yet, and warm.
+Run from the project folder:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --top 30
+    python -m benchmarks.startup --bundle builds/The_Lost_Mind.pyz
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from benchmarks.common import print_table
+from core.startup import FIRST_FRAME_TARGET
+
+# Slow to import and only needed once the menu is on screen.
+DEFERRED_MODULES = ("requests", "soundfile", "updates.update_game", "updates.manifest")
+
+FIRST_FRAME = "-- first frame --\n"  # Written to stderr by the child, the imports after it were deferred.
+
+CHILD = f"FIRST_FRAME = {FIRST_FRAME!r}\n" + """
+from core.startup import startup
+import json
+import sys
+
+import tcod
+
+import core.settings as settings
+import main
+
+tileset = main.load_tileset()
+console = tcod.console.Console(settings.data.screen_width, settings.data.screen_height, order="F")
+main.setup_game.MainMenu().on_render(console)
+modules = sorted(sys.modules)
+sys.stderr.write(FIRST_FRAME)
+sys.stderr.flush()
+startup.frame_presented()
+first_frame = startup.first_frame
+startup.wait(60)
+print(json.dumps({"first_frame": first_frame, "deferred": startup.timings, "modules": modules}))
+"""
+
+
+# Starts the game like CHILD, without the import report, and prints the time of its first frame.
+LAUNCH = """
+from core.startup import startup
+import time
+
+import tcod
+
+import core.settings as settings
+import main
+
+tileset = main.load_tileset()
+console = tcod.console.Console(settings.data.screen_width, settings.data.screen_height, order="F")
+main.setup_game.MainMenu().on_render(console)
+print(time.time())
+"""
+
+
+class Import(NamedTuple):
+    """One line of `-X importtime`, times in microseconds."""
+
+    module: str
+    own: int
+    cumulative: int
+
+
+def parse_importtime(text: str) -> List[Import]:
+    """The imports made before the first frame."""
+    imports = []
+    for line in text.splitlines():
+        if line == FIRST_FRAME.strip():
+            break
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        imports.append(Import(name.strip(), int(own), int(cumulative)))
+    return imports
+
+
+def run_once() -> Dict[str, object]:
+    """Start the game in a fresh interpreter, returns its timings and the imports it made."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD], capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["imports"] = parse_importtime(process.stderr)
+    return result
+
+
+def launch_once(env: Dict[str, str], cwd: Optional[str] = None) -> float:
+    """Seconds from starting the interpreter to the first frame."""
+    start = time.time()
+    process = subprocess.run([sys.executable, "-c", LAUNCH], capture_output=True, text=True, check=True,
+                             env={**os.environ, **env}, cwd=cwd)
+    return float(process.stdout.strip().splitlines()[-1]) - start
+
+
+def compare_launches(bundle: str, runs: int) -> None:
+    """Launches from source, the way the game runs now and with its bytecode cached, against the bundle."""
+    bundle = os.path.abspath(bundle)
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        def median(env_for_run, cwd: Optional[str] = None) -> float:
+            return statistics.median(launch_once(env_for_run(run), cwd) for run in range(runs)) * 1e3
+
+        # A copy of the game without its __pycache__ folders, main.py turns writing bytecode off so
+        # every launch from source compiles the game again. The libraries keep their own bytecode.
+        source = os.path.join(folder, "source")
+        for name in ("core", "components", "game", "updates", "assets"):
+            shutil.copytree(name, os.path.join(source, name), ignore=shutil.ignore_patterns("__pycache__"))
+        shutil.copy("main.py", source)
+        environment = {"PYTHONPATH": source, "LOST_MIND_DATA": os.path.join(folder, "data_source")}
+        rows.append(("source, compiled at every launch",
+                     median(lambda run: {**environment, "PYTHONDONTWRITEBYTECODE": "1"}, source)))
+        subprocess.run([sys.executable, "-m", "compileall", "-q", source], check=True, capture_output=True)
+        rows.append(("source, bytecode cached", median(lambda run: environment, source)))
+
+        # From an empty folder, so nothing of the source tree can be imported, and with a new data
+        # folder for the cold launches, so the assets are extracted again.
+        empty = os.path.join(folder, "empty")
+        os.makedirs(empty)
+        rows.append(("bundle, cold", median(lambda run: {"PYTHONPATH": bundle,
+                                                         "LOST_MIND_DATA": os.path.join(folder, f"data{run}")}, empty)))
+        data = os.path.join(folder, "data")
+        launch_once({"PYTHONPATH": bundle, "LOST_MIND_DATA": data}, empty)
+        rows.append(("bundle, warm", median(lambda run: {"PYTHONPATH": bundle, "LOST_MIND_DATA": data}, empty)))
+
+    print_table(("launch", "first frame ms"), rows)
+    print(f"(median of {runs} launches each, from starting the interpreter, without opening the window)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh starts, the median is reported.")
+    parser.add_argument("--top", type=int, default=15, help="Modules listed.")
+    parser.add_argument("--bundle", help="A bundle made by updates/make_bundle.py to compare the launches with.")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    first_frames = [run["first_frame"] for run in runs]
+    imports: Dict[str, List[Import]] = {}
+    for run in runs:
+        for entry in run["imports"]:
+            imports.setdefault(entry.module, []).append(entry)
+
+    def median(module: str, field: str) -> float:
+        return statistics.median(getattr(entry, field) for entry in imports[module]) / 1e3
+
+    print_table(
+        ("module", "own ms", "with imports ms"),
+        [(module, median(module, "own"), median(module, "cumulative"))
+         for module in sorted(imports, key=lambda module: -median(module, "own"))[:args.top]],
+    )
+    game = [module for module in imports if module.split(".")[0] in ("core", "game", "components", "updates")]
+    print()
+    print_table(
+        ("game module", "own ms", "with imports ms"),
+        [(module, median(module, "own"), median(module, "cumulative"))
+         for module in sorted(game, key=lambda module: -median(module, "cumulative"))[:args.top]],
+    )
+
+    deferred: Dict[str, List[float]] = {}
+    for run in runs:
+        for name, seconds in run["deferred"]:
+            deferred.setdefault(name, []).append(seconds * 1e3)
+    if deferred:
+        print()
+        print_table(("loaded after the first frame", "median ms"),
+                    [(name, statistics.median(times)) for name, times in deferred.items()])
+
+    first_frame = statistics.median(first_frames)
+    verdict = "within" if first_frame <= FIRST_FRAME_TARGET else "over"
+    print(f"\nfirst frame after {first_frame * 1e3:.0f} ms (median of {args.runs}, without opening the window), "
+          f"{verdict} the {FIRST_FRAME_TARGET * 1e3:.0f} ms target")
+    early = sorted({module for run in runs for module in run["modules"] if module in DEFERRED_MODULES})
+    if early:
+        print(f"imported before the first frame, but meant to be loaded after it: {', '.join(early)}")
+    if args.bundle:
+        print()
+        compare_launches(args.bundle, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Play large headless scenarios and report how turn time, frame time and memory scale.
+
+Scenarios, each measured at several points of its scale:
+    depth      floors from GameWorld growth, up to floor 100, played by the fight bot
+    horde      an open room carved around a player that waits, packed with orcs and trolls
+    long_run   10k turns of fighting monsters that keep arriving, so corpses and messages pile up
+    inventory  a player carrying up to the full 26 items, with the inventory menu open
+Every point reports p50/p95/p99 turn and frame latency and the process RSS. For each scenario the
+growth of every cost is fitted as a power of the scale, and costs growing faster than the scenario
+allows are flagged as superlinear.
+Run from the project folder:
+    python -m benchmarks.stress
+    python -m benchmarks.stress --scenarios depth --depths 1 25 50 100
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import os
+import random
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+import tcod
+
+import core.input_handlers as input_handlers
+import core.settings as settings
+import core.tile_types as tile_types
+import game.entity_factories as entity_factories
+from benchmarks.common import build_engine, print_table
+from core.actions import Action, TakeStairsAction, WaitAction
+from core.engine import Engine
+from core.profiler import profiler
+from core.rewind import RewindBuffer
+from game.bots import FightBot
+from game.procgen import RectangularRoom
+
+try:
+    import resource
+except ImportError:  # Windows has no resource module.
+    resource = None
+
+
+class Point(NamedTuple):
+    """The measurements of a scenario at one value of its scale."""
+
+    scenario: str
+    scale: int
+    turns: List[float]  # Milliseconds.
+    frames: List[float]
+    rss: Optional[float]  # MiB.
+
+
+class Scenario(NamedTuple):
+    """
+    A scenario, `run` returns its points for the command line arguments.
+    A cost is flagged when it grows faster than scale ** `limit`.
+    """
+
+    name: str
+    scale: str
+    limit: float
+    run: Callable[[argparse.Namespace], List[Point]]
+
+
+def rss_mib() -> Optional[float]:
+    """Resident memory of this process, the peak where the current one can't be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+def immortal(engine: Engine) -> Engine:
+    """Keep the player alive, so a scenario isn't cut short, and keep the rewind buffer like the game does."""
+    engine.player.fighter.max_hp = engine.player.fighter.hp = 10 ** 9
+    engine.rewind = RewindBuffer(engine)
+    return engine
+
+
+def play(
+        engine: Engine, turns: int, choose: Callable[[Engine], Action], handler: Optional[input_handlers.EventHandler] = None
+) -> Tuple[List[float], List[float]]:
+    """Play `turns` turns, drawing a frame after each one, and return the turn and frame times in ms."""
+    handler = handler or input_handlers.MainGameEventHandler(engine)
+    console = tcod.console.Console(settings.data.screen_width, settings.data.screen_height, order="F")
+    turn_times, frame_times = [], []
+    for _ in range(turns):
+        action = choose(engine)
+        start = time.perf_counter()
+        if not handler.handle_action(action):
+            handler.handle_action(WaitAction(engine.player))
+        middle = time.perf_counter()
+        handler.on_render(console)
+        end = time.perf_counter()
+        turn_times.append((middle - start) * 1e3)
+        frame_times.append((end - middle) * 1e3)
+    return turn_times, frame_times
+
+
+def fight_on_floor(bot: FightBot) -> Callable[[Engine], Action]:
+    """The fight bot's choice, without ever taking the stairs so the floor keeps what happens on it."""
+    def choose(engine: Engine) -> Action:
+        action = bot.choose(engine)
+        if isinstance(action, TakeStairsAction) or getattr(action, "goal", None) == "downstairs":
+            return bot.random_step(engine)
+        return action
+    return choose
+
+
+def carve_arena(engine: Engine, count: int, min_distance: int = 2) -> None:
+    """Carve an open room around the player with floor for `count` monsters at least `min_distance` away."""
+    game_map = engine.game_map
+    player = engine.player
+    side = int(np.ceil(np.sqrt(count + (2 * min_distance - 1) ** 2))) + 2  # Its walls take a row and a column.
+    width, height = min(side, game_map.width - 2), min(side, game_map.height - 2)
+    x = min(max(player.x - width // 2, 0), game_map.width - width - 1)
+    y = min(max(player.y - height // 2, 0), game_map.height - height - 1)
+    room = RectangularRoom(x, y, width, height)
+    game_map.tiles[room.inner] = tile_types.floor
+    game_map.add_room(room)
+    engine.update_fov()
+
+
+def spawn_near(engine: Engine, factories: Sequence, count: int, rng: random.Random, min_distance: int = 2) -> int:
+    """Spawn up to `count` monsters on the free floor tiles closest to the player, at least `min_distance` away.
+    Returns how many were placed, fewer when the floor runs out of free tiles.
+    """
+    game_map = engine.game_map
+    player = engine.player
+    xs, ys = np.nonzero(game_map.tiles["walkable"])
+    distance = np.maximum(abs(xs - player.x), abs(ys - player.y))
+    keep = distance >= min_distance
+    order = np.argsort(distance[keep], kind="stable")
+    placed = 0
+    for n in order:
+        if placed == count:
+            break
+        x, y = int(xs[keep][n]), int(ys[keep][n])
+        if game_map.get_blocking_entity_at_location(x, y) is None:
+            rng.choice(factories).spawn(game_map, x, y)
+            placed += 1
+    return placed
+
+
+def run_depth(args: argparse.Namespace) -> List[Point]:
+    points = []
+    for depth in args.depths:
+        engine = immortal(build_engine(depth, args.seed))
+        turns, frames = play(engine, args.turns, fight_on_floor(FightBot(args.seed)))
+        points.append(Point("depth", depth, turns, frames, rss_mib()))
+    return points
+
+
+def run_horde(args: argparse.Namespace) -> List[Point]:
+    points = []
+    for size in args.hordes:
+        engine = immortal(build_engine(1, args.seed))
+        carve_arena(engine, size)
+        placed = spawn_near(engine, (entity_factories.orc, entity_factories.troll), size, random.Random(args.seed))
+        if placed < size:
+            raise SystemExit(f"horde: only {placed} of {size} monsters fit on the floor.")
+        turns, frames = play(engine, args.turns, lambda engine: WaitAction(engine.player))
+        points.append(Point("horde", placed, turns, frames, rss_mib()))
+    return points
+
+
+def run_long(args: argparse.Namespace) -> List[Point]:
+    engine = immortal(build_engine(5, args.seed))
+    rng = random.Random(args.seed)
+    choose = fight_on_floor(FightBot(args.seed))
+    handler = input_handlers.MainGameEventHandler(engine)
+    window = max(1, args.long_turns // 10)
+    points = []
+    for played in range(window, args.long_turns + 1, window):
+        turns, frames = [], []
+        for _ in range(window // args.spawn_every):
+            # New monsters keep coming, so the fights, corpses and messages never stop.
+            spawn_near(engine, (entity_factories.orc,), 1, rng, min_distance=4)
+            more_turns, more_frames = play(engine, args.spawn_every, choose, handler)
+            turns += more_turns
+            frames += more_frames
+        points.append(Point("long_run", played, turns, frames, rss_mib()))
+    corpses = sum(1 for entity in engine.game_map.entities if entity.name.startswith("remains of"))
+    print(f"long_run: {corpses} corpses and {len(engine.message_log)} messages after {args.long_turns} turns")
+    return points
+
+
+def run_inventory(args: argparse.Namespace) -> List[Point]:
+    items = (
+        entity_factories.health_potion, entity_factories.lightning_scroll, entity_factories.confusion_scroll,
+        entity_factories.dagger, entity_factories.leather_armor,
+    )
+    points = []
+    for count in (1, 6, 13, 26):
+        engine = immortal(build_engine(1, args.seed))
+        player = engine.player
+        rng = random.Random(args.seed)
+        for _ in range(count):
+            item = copy.deepcopy(rng.choice(items))
+            item.parent = player.inventory
+            player.inventory.items.append(item)
+        menu = input_handlers.InventoryActivateHandler(engine)
+        turns, frames = play(engine, args.turns, lambda engine: WaitAction(engine.player), menu)
+        points.append(Point("inventory", count, turns, frames, rss_mib()))
+    return points
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    # The area of a floor grows about with the square of its depth, what grows with it shows up as superlinear.
+    "depth": Scenario("depth", "depth", 1.15, run_depth),
+    "horde": Scenario("horde", "monsters", 1.15, run_horde),
+    # Turns late in a run should cost about the same as the first ones.
+    "long_run": Scenario("long_run", "turns", 0.25, run_long),
+    "inventory": Scenario("inventory", "items", 1.15, run_inventory),
+}
+
+
+def percentiles(times: List[float]) -> Tuple[float, float, float]:
+    return tuple(np.percentile(times, (50, 95, 99))) if times else (0.0, 0.0, 0.0)
+
+
+def growth(points: List[Point], cost: Callable[[Point], Optional[float]]) -> Optional[float]:
+    """Exponent of the power law fitted to a cost against the scale, the slope on a log-log plot."""
+    pairs = [(point.scale, cost(point)) for point in points]
+    pairs = [(x, y) for x, y in pairs if x and y and y > 0]
+    if len(pairs) < 2 or len({x for x, _ in pairs}) < 2:
+        return None
+    x, y = np.log([pair[0] for pair in pairs]), np.log([pair[1] for pair in pairs])
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def report(scenario: Scenario, points: List[Point]) -> List[str]:
+    """The growth of each cost of a scenario, with the superlinear ones flagged."""
+    costs = {
+        "turn p50": lambda point: percentiles(point.turns)[0],
+        "turn p99": lambda point: percentiles(point.turns)[2],
+        "frame p50": lambda point: percentiles(point.frames)[0],
+        "rss": lambda point: point.rss,
+    }
+    lines = []
+    for name, cost in costs.items():
+        exponent = growth(points, cost)
+        if exponent is None:
+            continue
+        flag = f"  superlinear, above {scenario.limit}" if exponent > scenario.limit else ""
+        lines.append(f"  {name:<10} grows as {scenario.scale}^{exponent:.2f}{flag}")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--turns", type=int, default=200, help="Turns played at each point.")
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 25, 50, 100])
+    parser.add_argument("--hordes", type=int, nargs="+", default=[10, 100, 300, 1000])
+    parser.add_argument("--long-turns", type=int, default=10_000)
+    parser.add_argument("--spawn-every", type=int, default=10, help="Turns between new monsters in long_run.")
+    args = parser.parse_args()
+
+    profiler.enabled = False  # Its trace would grow with the run and show up in the RSS.
+    rows = []
+    summaries = []
+    for name in args.scenarios:
+        scenario = SCENARIOS[name]
+        points = scenario.run(args)
+        for point in points:
+            rows.append((
+                point.scenario, f"{point.scale} {scenario.scale}",
+                *percentiles(point.turns), *percentiles(point.frames),
+                "-" if point.rss is None else f"{point.rss:.0f}",
+            ))
+        summaries += [f"{name}:"] + report(scenario, points)
+
+    print_table(
+        ("scenario", "scale", "turn p50", "p95", "p99", "frame p50", "p95", "p99", "RSS MiB"), rows
+    )
+    print()
+    print("\n".join(summaries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Time the hot paths of the engine and compare them against stored baselines.
+
+Every case runs headless on a floor built from a fixed seed, for each floor depth and each size
+(extra monsters on the floor, or messages in the log). Each result has the median and fastest call
+time and the peak memory allocated by one call, measured separately with tracemalloc so tracing
+doesn't slow the timed calls. Results are compared against a baseline file saved by an earlier run.
+Run from the project folder:
+    python -m benchmarks --save
+    python -m benchmarks --cases update_fov render --depths 1 20
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import tcod
+
+import core.settings as settings
+import game.entity_factories as entity_factories
+from benchmarks.common import build_engine, populate, print_table
+from core.engine import Engine
+from core.message_log import MessageLog
+from core.profiler import profiler
+from game.entity_index import EntitySet
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+SAVE_NAME = "benchmark.sav"
+WORDS = "orc troll goblin attacks for hit points the player dodges you picked up a sword potion scroll".split()
+
+# A call is a function to time, and an optional one to run after it outside of the timing.
+Call = Tuple[Callable[[], object], Optional[Callable[[], object]]]
+
+
+class Case(NamedTuple):
+    """A benchmarked function, `setup` prepares a game for (depth, size, seed) and returns the call."""
+
+    name: str
+    size: str  # What the size parameter counts, "-" if the case has none.
+    setup: Callable[[int, int, int], Call]
+    depth: bool = True  # Whether the floor depth matters, the case runs once otherwise.
+
+
+CASES: Dict[str, Case] = {}
+
+
+def case(
+        name: str, size: str = "entities", depth: bool = True
+) -> Callable[[Callable[[int, int, int], Call]], Callable[[int, int, int], Call]]:
+    """Register a case under `name`."""
+    def register(setup: Callable[[int, int, int], Call]) -> Callable[[int, int, int], Call]:
+        CASES[name] = Case(name, size, setup, depth)
+        return setup
+    return register
+
+
+def game(depth: int, entities: int, seed: int) -> Engine:
+    """A game on floor `depth` with `entities` more monsters, and a player that can't die while they act."""
+    engine = build_engine(depth, seed)
+    populate(engine.game_map, entities, seed, (entity_factories.orc, entity_factories.troll))
+    engine.message_log = MessageLog()
+    engine.player.fighter.max_hp = engine.player.fighter.hp = 10 ** 9
+    return engine
+
+
+@case("generate_dungeon", size="-")
+def bench_generate_dungeon(depth: int, entities: int, seed: int) -> Call:
+    from game.procgen import generate_dungeon
+
+    engine = build_engine(depth, seed)
+    world = engine.game_world
+    rng = random.Random(seed)
+
+    def call() -> None:
+        random.seed(rng.random())
+        generate_dungeon(
+            max_rooms=world.max_rooms,
+            room_min_size=world.room_min_size,
+            room_max_size=world.room_max_size,
+            map_width=world.map_width - 10,  # Already grown for the next floor.
+            map_height=world.map_height - 10,
+            engine=engine,
+            screen_width=world.screen_width,
+            screen_height=world.screen_height,
+            player=engine.player,
+        )
+    return call, None
+
+
+@case("update_fov")
+def bench_update_fov(depth: int, entities: int, seed: int) -> Call:
+    engine = game(depth, entities, seed)
+    revisions = engine.game_map.revisions
+    # Only the revision check would be timed otherwise, as if the player moved every call.
+    return engine.update_fov, lambda: revisions.bump("player")
+
+
+@case("handle_enemy_turns")
+def bench_handle_enemy_turns(depth: int, entities: int, seed: int) -> Call:
+    engine = game(depth, entities, seed)
+    random.seed(seed)
+    return engine.handle_enemy_turns, None
+
+
+@case("get_path_to")
+def bench_get_path_to(depth: int, entities: int, seed: int) -> Call:
+    engine = game(depth, entities, seed)
+    player = engine.player
+    hunters = [actor for actor in engine.game_map.actors if actor is not player and actor.ai] or [player]
+    turn = iter(range(10 ** 9))
+
+    def call() -> None:
+        hunter = hunters[next(turn) % len(hunters)]
+        hunter.ai.get_path_to(player.x, player.y)
+    return call, None
+
+
+@case("render")
+def bench_render(depth: int, entities: int, seed: int) -> Call:
+    engine = game(depth, entities, seed)
+    engine.game_map.visible[:] = True  # Worst case, everything on screen is drawn.
+    console = tcod.console.Console(settings.data.screen_width, settings.data.screen_height, order="F")
+    return lambda: engine.game_map.render(console, engine.player.x, engine.player.y), None
+
+
+@case("render_messages", size="messages", depth=False)
+def bench_render_messages(depth: int, messages: int, seed: int) -> Call:
+    rng = random.Random(seed)
+    log = MessageLog()
+    for _ in range(messages):
+        log.add_message(" ".join(rng.choices(WORDS, k=rng.randint(3, 18))))
+    console = tcod.console.Console(settings.data.screen_width, settings.data.screen_height, order="F")
+    return lambda: MessageLog.render_messages(console, 21, 45, 40, 5, log.messages), None
+
+
+@case("spawn")
+def bench_spawn(depth: int, entities: int, seed: int) -> Call:
+    engine = game(depth, 0, seed)
+    game_map = engine.game_map
+    before = list(game_map.entities)
+    count = max(entities, 1)
+
+    def remove() -> None:
+        game_map.entities = EntitySet(before)
+    return lambda: populate(game_map, count, seed), remove
+
+
+@case("save_as")
+def bench_save_as(depth: int, entities: int, seed: int) -> Call:
+    engine = game(depth, entities, seed)
+    return lambda: engine.save_as(SAVE_NAME), None
+
+
+@case("load_game")
+def bench_load_game(depth: int, entities: int, seed: int) -> Call:
+    from game.setup_game import load_game
+
+    game(depth, entities, seed).save_as(SAVE_NAME)
+    return lambda: load_game(SAVE_NAME), None
+
+
+class Result(NamedTuple):
+    name: str
+    depth: int
+    size: int
+    median_ms: float
+    min_ms: float
+    peak_kib: Optional[float]
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}/{self.depth}/{self.size}"
+
+
+def measure(bench: Case, depth: int, size: int, seed: int, repeat: int, memory: bool) -> Result:
+    """Run a case `repeat` times, and once more under tracemalloc for its peak memory."""
+    call, after = bench.setup(depth, size, seed)
+    call()  # Warm the caches the game keeps between turns, like it would be after the first one.
+    if after:
+        after()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+        if after:
+            after()
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        call()
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        if after:
+            after()
+    return Result(bench.name, depth, size, statistics.median(timings) * 1e3, min(timings) * 1e3, peak)
+
+
+def run(
+        names: List[str], depths: List[int], sizes: List[int], seed: int = 0, repeat: int = 20, memory: bool = True
+) -> List[Result]:
+    """Measure every case for every depth and size, a case without a size runs once per depth."""
+    profiler.enabled = False  # The game's own sections would add to what is measured.
+    results = []
+    for name in names:
+        bench = CASES[name]
+        for depth in (depths if bench.depth else depths[:1]):
+            for size in (sizes if bench.size != "-" else [0]):
+                results.append(measure(bench, depth, size, seed, repeat, memory))
+    if os.path.exists(settings.data.path_folder + SAVE_NAME):
+        os.remove(settings.data.path_folder + SAVE_NAME)
+    return results
+
+
+def compare(results: List[Result], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[Tuple[object, ...]]:
+    """Table rows of the results, with the change of the median against the baseline."""
+    rows = []
+    for result in results:
+        old = baseline.get(result.key)
+        change = "" if old is None else (result.median_ms - old["median_ms"]) / old["median_ms"]
+        flag = "" if change == "" else "slower" if change > threshold else "faster" if change < -threshold else ""
+        rows.append((
+            result.name,
+            result.depth if CASES[result.name].depth else "-",
+            "-" if CASES[result.name].size == "-" else f"{result.size} {CASES[result.name].size}",
+            result.median_ms,
+            result.min_ms,
+            "-" if result.peak_kib is None else f"{result.peak_kib:.0f}",
+            "-" if old is None else old["median_ms"],
+            "" if change == "" else f"{change * 100:+.1f}%",
+            flag,
+        ))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 25])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 100, 1000], help="Extra monsters or messages.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file to compare against and save to.")
+    parser.add_argument("--save", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Change of the median that is reported.")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = run(args.cases, args.depths, args.sizes, args.seed, args.repeat, not args.no_memory)
+    print_table(
+        ("case", "depth", "size", "median ms", "min ms", "peak KiB", "baseline ms", "change", ""),
+        compare(results, baseline, args.threshold),
+    )
+
+    if args.save:
+        baseline.update({
+            result.key: {"median_ms": result.median_ms, "min_ms": result.min_ms, "peak_kib": result.peak_kib}
+            for result in results
+        })
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
@@ -0,0 +1,326 @@
+"""Measure the update download against a local stand-in of the releases page.
+
+The stand-in redirects `latest` to a newer release and serves its assets from a folder, with Range
+requests and a set latency, and can break a download off halfway or publish wrong hashes. The run
+compares the memory the old whole-body download and the streamed one allocate, checks that a broken
+download resumes where it stopped and that a wrong hash is refused, and runs the update worker while a
+60 fps frame loop reads its progress, the way the Update screen does. It then publishes a release with
+a manifest, changing a part of the files of an installed game, and compares the delta update with the
+full archive, downloading one file at a time and in parallel, and the quick and full verification.
+Run from the project folder:
+    python -m benchmarks.update --sizes 8 32 128
+    python -m benchmarks.update --sizes 8 --files 400 --changed 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional, Tuple
+
+import requests
+
+import core.exceptions as exceptions
+import updates.constant
+import updates.manifest as manifest
+import updates.update_game as update_game
+from benchmarks.common import print_table
+
+CHUNK = 1 << 16
+
+
+def sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_archive(folder: str, version: float, size: int, seed: int = 0) -> str:
+    """Write a release archive with `size` bytes of incompressible data and its published hash, returns its path."""
+    path = os.path.join(folder, f"The_Lost_Mind_{version}.zip")
+    rng = random.Random(seed)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        with archive.open(f"The_Lost_Mind_{version}/data.bin", "w") as f:
+            for start in range(0, size, CHUNK):
+                f.write(rng.randbytes(min(CHUNK, size - start)))
+    with open(path + ".sha256", "w") as f:
+        f.write(f"{sha256(path)}  {os.path.basename(path)}\n")
+    return path
+
+
+def make_game(folder: str, files: int, seed: int = 0) -> None:
+    """Write a game folder of `files` files from 4 KiB to 1 MiB, in a few subfolders."""
+    rng = random.Random(seed)
+    for n in range(files):
+        path = os.path.join(folder, rng.choice(("", "assets", "assets/images", "data")), f"file{n}.bin")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(rng.randbytes(rng.randint(4, 1024) * 1024))
+
+
+def change_game(folder: str, part: float, seed: int = 1) -> List[str]:
+    """Rewrite a part of the files of a game folder and add a new one, returns the paths touched."""
+    rng = random.Random(seed)
+    paths = manifest.game_files(folder)
+    touched = rng.sample(paths, max(1, int(len(paths) * part))) + ["assets/new.bin"]
+    for path in touched:
+        with open(os.path.join(folder, path), "wb") as f:
+            f.write(rng.randbytes(rng.randint(4, 1024) * 1024))
+    return touched
+
+
+class StandIn(ThreadingHTTPServer):
+    """The releases page of one newer version, serving the assets in a folder."""
+
+    daemon_threads = True
+
+    def __init__(self, version: float, assets: str, latency: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.version = version
+        self.assets = assets
+        self.latency = latency
+        self.drop_after: Optional[int] = None  # Break the next download off after this many bytes.
+        self.bad_hash = False
+        self.served = 0  # Asset bytes sent.
+        self.lock = threading.Lock()
+
+    @property
+    def releases(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/releases"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandIn
+    protocol_version = "HTTP/1.1"
+
+    def send(self, status: int, body: bytes = b"", headers: Tuple[Tuple[str, str], ...] = ()) -> None:
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        server = self.server
+        time.sleep(server.latency)
+        prefix = f"/releases/download/{server.version}/"
+        if self.path == "/releases/latest":
+            self.send(302, headers=(("Location", f"/releases/tag/{server.version}"),))
+        elif self.path.startswith("/releases/tag/"):
+            self.send(200, b"release page")
+        elif self.path.endswith(".sha256") and server.bad_hash:
+            self.send(200, b"0" * 64 + b"\n")
+        elif self.path.startswith(prefix) and os.path.isfile(os.path.join(server.assets, self.path[len(prefix):])):
+            self.send_asset(os.path.join(server.assets, self.path[len(prefix):]))
+        else:
+            self.send(404)
+
+    def send_asset(self, path: str) -> None:
+        size = os.path.getsize(path)
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        start = int(match.group(1)) if match else 0
+        if start >= size and match:
+            self.send(416, headers=(("Content-Range", f"bytes */{size}"),))
+            return
+        self.send_response(206 if match else 200)
+        if match:
+            self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+        self.send_header("Content-Length", str(size - start))
+        self.end_headers()
+        with self.server.lock:
+            drop_after, self.server.drop_after = self.server.drop_after, None
+        sent = 0
+        with open(path, "rb") as f:
+            f.seek(start)
+            for chunk in iter(lambda: f.read(CHUNK), b""):
+                if drop_after is not None and sent + len(chunk) > drop_after:
+                    chunk = chunk[:drop_after - sent]
+                    self.close_connection = True
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                with self.server.lock:
+                    self.server.served += len(chunk)
+                if self.close_connection:
+                    return
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def serve(version: float, assets: str, latency: float = 0.0) -> StandIn:
+    server = StandIn(version, assets, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def peak(call: Callable[[], object]) -> Tuple[float, float]:
+    """Seconds a call took and the peak memory it allocated in MiB."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    call()
+    seconds = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return seconds, memory
+
+
+def timed(call: Callable[[], object]) -> Tuple[float, object]:
+    start = time.perf_counter()
+    result = call()
+    return time.perf_counter() - start, result
+
+
+def whole_body(url: str, path: str) -> None:
+    """The download as the game used to make it, the whole archive in memory before it is written."""
+    r = requests.get(url)
+    with open(path, "wb") as f:
+        f.write(r.content)
+
+
+def frame_loop(worker: update_game.UpdateWorker, timeout: float) -> Tuple[int, float]:
+    """Run 60 fps frames reading the worker's state until it finishes, returns the frames and the longest one in ms."""
+    frames, longest = 0, 0.0
+    end = time.perf_counter() + timeout
+    while worker.is_alive() and time.perf_counter() < end:
+        start = time.perf_counter()
+        _ = worker.state, worker.progress, worker.done_bytes
+        if worker.state == update_game.AVAILABLE:
+            worker.download()  # The player picks yes.
+        longest = max(longest, (time.perf_counter() - start) * 1e3)
+        frames += 1
+        time.sleep(1 / 60)
+    return frames, longest
+
+
+def archive_runs(args: argparse.Namespace, version: float) -> List[str]:
+    """The full archive download, in the working folder."""
+    os.makedirs("server")
+    rows = []
+    for size in args.sizes:
+        archive = make_archive("server", version, size * 2 ** 20)
+        server = serve(version, "server")
+        update_game.new_version = version
+        url = update_game.archive_url(version, releases=server.releases)
+
+        seconds, memory = peak(lambda: whole_body(url, "Update.zip"))
+        rows.append(("whole body", size, seconds, memory))
+        seconds, memory = peak(lambda: update_game.download_game(releases=server.releases))
+        rows.append(("streamed", size, seconds, memory))
+        os.remove("Update.zip")
+        server.shutdown()
+        server.server_close()
+    print_table(("download", "MiB", "seconds", "peak MiB"), rows)
+
+    # Break a download off halfway, the next attempt asks for the rest only.
+    server = serve(version, "server")
+    size = os.path.getsize(archive)
+    server.drop_after = size // 2
+    try:
+        update_game.download_game(releases=server.releases)
+    except requests.RequestException as error:
+        broken = type(error).__name__
+    else:
+        broken = "nothing"
+    kept = os.path.getsize("Update.zip.part")
+    server.served = 0
+    path = update_game.download_game(releases=server.releases)  # Checked against the published hash.
+    resumed = path is not None and server.served - os.path.getsize(archive + ".sha256") == size - kept
+    os.remove("Update.zip")
+
+    server.bad_hash = True
+    try:
+        update_game.download_game(releases=server.releases)
+        refused = False
+    except exceptions.DownloadError:
+        refused = not os.path.exists("Update.zip")
+    server.bad_hash = False
+
+    worker = update_game.UpdateWorker(server.releases)
+    finished, (frames, longest) = timed(lambda: frame_loop(worker, 60))
+    installed = os.path.isdir(update_game.STAGING)
+    server.shutdown()
+    shutil.rmtree(update_game.STAGING, ignore_errors=True)
+    return [
+        f"broken off after {kept / 2 ** 20:.1f} of {size / 2 ** 20:.1f} MiB ({broken}), resumed and verified: {resumed}",
+        f"wrong hash refused and the archive removed: {refused}",
+        f"update worker {worker.state} in {finished:.2f}s, installed: {installed}, {frames} frames drawn meanwhile, "
+        f"the longest took {longest:.3f} ms",
+    ]
+
+
+def delta_runs(args: argparse.Namespace, version: float) -> List[str]:
+    """A delta update of an installed game, in the working folder."""
+    make_game("installed", args.files)
+    manifest.publish("installed", version - 1, "old_assets")  # Installs get the manifest of their release.
+    shutil.copytree("installed", "release")
+    touched = change_game("release", args.changed)
+    release = manifest.publish("release", version, "assets")
+    full_size = sum(entry["size"] for entry in release["files"].values())
+
+    server = serve(version, "assets", args.latency)
+    rows = []
+    for workers in (1, manifest.WORKERS):
+        shutil.rmtree("staging", ignore_errors=True)
+        server.served = 0
+        seconds, paths = timed(lambda: manifest.changed("installed", release))
+        download, finished = timed(lambda: manifest.download_changed(
+            release, paths, "staging", server.releases, workers=workers
+        ))
+        staged = all(
+            manifest.hash_file(os.path.join("staging", path)) == release["files"][path]["sha256"] for path in paths
+        )
+        rows.append((f"{workers} at once", len(paths), server.served / 2 ** 20, seconds, download, staged))
+    server.shutdown()
+    print()
+    print_table(("delta update", "files", "MiB", "compare s", "download s", "verified"), rows)
+
+    os.remove(os.path.join("installed", manifest.HASH_CACHE))
+    full, bad = timed(lambda: manifest.verify("installed", full=True))
+    quick, _ = timed(lambda: manifest.verify("installed"))
+    with open(os.path.join("installed", manifest.game_files("installed")[0]), "ab") as f:
+        f.write(b"damaged")
+    _, damaged = timed(lambda: manifest.verify("installed"))
+    return [
+        f"{len(touched)} of {len(release['files'])} files changed, the delta was "
+        f"{rows[-1][2]:.1f} MiB of the {full_size / 2 ** 20:.1f} MiB release",
+        f"verifying the installed game took {full:.3f}s hashing every file and {quick:.3f}s from the cache, "
+        f"{len(bad)} files didn't match, a damaged file found: {len(damaged) == 1}",
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 32, 128], help="Archive sizes in MiB.")
+    parser.add_argument("--files", type=int, default=400, help="Files of the game the delta update runs on.")
+    parser.add_argument("--changed", type=float, default=0.05, help="Part of the files a release changes.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the stand-in takes to answer.")
+    args = parser.parse_args()
+
+    version = updates.constant.VERSION + 1
+    folder = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(folder)  # The update is saved and installed in the working folder.
+    try:
+        lines = archive_runs(args, version)
+        lines += delta_runs(args, version)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder, ignore_errors=True)
+    print()
+    print("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
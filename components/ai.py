@@ -3,11 +3,14 @@ from __future__ import annotations
 import random
 from typing import List, Optional, Tuple, TYPE_CHECKING
 
-import numpy as np  # type: ignore
 import tcod
 
+import game.pathfinding as pathfinding
 from core.actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction
 
+# Steps of the shared route checked for other actors, a crowded route is searched around them instead.
+CROWD_STEPS = 4
+
 if TYPE_CHECKING:
     from game.entity import Actor
 
@@ -19,22 +22,29 @@ class BaseAI(Action):
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         """Compute and return a path to the target position.
 
+        On large maps the search is limited to the rooms on the route between both points,
+        falling back to the whole map if that finds nothing.
         If there is no valid path, return an empty list.
         """
-        # Copy the walkable array.
-        cost = np.array(
-            self.entity.gamemap.tiles["walkable"],
-            dtype=np.int8)
-
-        for entity in self.entity.gamemap.entities:
-            # Check if an entity blocks movement and the cost isn't zero (blocking).
-            if entity.blocks_movement and cost[entity.x,
-                                               entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways. A higher number means enemies will take longer paths to
-                # surround the player.
-                cost[entity.x, entity.y] += 10
+        gamemap = self.entity.gamemap
+        whole_map = slice(0, gamemap.width), slice(0, gamemap.height)
+
+        if gamemap.width * gamemap.height >= pathfinding.HIERARCHICAL_MIN_CELLS:
+            bounds = gamemap.pathfinder.search_bounds(
+                (self.entity.x, self.entity.y), (dest_x, dest_y))
+            if bounds is not None:
+                path = self.get_path_within(bounds, dest_x, dest_y)
+                if path:
+                    return path
+
+        return self.get_path_within(whole_map, dest_x, dest_y)
+
+    def get_path_within(
+            self, bounds: Tuple[slice, slice], dest_x: int, dest_y: int
+    ) -> List[Tuple[int, int]]:
+        """Compute a path to the target position, only searching the tiles inside `bounds`."""
+        x_offset, y_offset = bounds[0].start, bounds[1].start
+        cost = self.entity.gamemap.movement_cost(bounds)
 
         # Create a graph from the cost array and pass that graph to a new pathfinder.
         graph = tcod.path.SimpleGraph(
@@ -42,13 +52,14 @@ class BaseAI(Action):
         pathfinder = tcod.path.Pathfinder(graph)
 
         # Start position.
-        pathfinder.add_root((self.entity.x, self.entity.y))
+        pathfinder.add_root((self.entity.x - x_offset, self.entity.y - y_offset))
 
         # Compute the path to the destination and remove the starting point.
-        path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+        path: List[List[int]] = pathfinder.path_to(
+            (dest_x - x_offset, dest_y - y_offset))[1:].tolist()
 
         # Convert from List[List[int]] to List[Tuple[int, int]].
-        return [(index[0], index[1]) for index in path]
+        return [(index[0] + x_offset, index[1] + y_offset) for index in path]
 
 
 class HostileEnemy(BaseAI):
@@ -68,7 +79,17 @@ class HostileEnemy(BaseAI):
                 return MeleeAction(
                     self.entity, dx, dy).perform()
 
-            self.path = self.get_path_to(target.x, target.y)
+            # The distance map towards the player is shared by every monster this turn,
+            # but it ignores the other monsters, so they would all queue up in the same corridor.
+            self.path = self.engine.game_map.goal_maps.path_from(
+                "player", self.entity.x, self.entity.y)
+            if not self.path or any(
+                    self.engine.game_map.get_blocking_entity_at_location(x, y)
+                    for x, y in self.path[:-1][:CROWD_STEPS]
+            ):
+                # Someone is on the way, search a path that costs more through occupied tiles.
+                self.path = self.get_path_to(target.x, target.y)
+            self.entity.mark_state_changed()
 
         if self.path:
             dest_x, dest_y = self.path.pop(0)
@@ -95,6 +116,7 @@ class ConfusedEnemy(BaseAI):
         self.turns_remaining = turns_remaining
 
     def perform(self) -> None:
+        self.entity.mark_state_changed()  # Counting down the turns left changes it every turn.
         # Revert the AI back to the original state if the effect has run its course.
         if self.turns_remaining <= 0:
             self.engine.message_log.add_message(
@@ -139,6 +161,7 @@ class FreezedEnemy(BaseAI):
         self.turns_remaining = turns_remaining
 
     def perform(self) -> None:
+        self.entity.mark_state_changed()  # Counting down the turns left changes it every turn.
         # Revert the AI back to the original state if the effect has run its course.
         if self.turns_remaining <= 0:
             self.engine.message_log.add_message(
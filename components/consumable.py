@@ -5,6 +5,7 @@ from typing import TYPE_CHECKING, Optional
 
 import core.actions as actions
 import core.color as color
+import core.sfx as sfx
 import components.ai
 import components.inventory
 from components.base_component import BaseComponent
@@ -18,6 +19,7 @@ if TYPE_CHECKING:
 
 class Consumable(BaseComponent):
     parent: Item
+    sound = "item"  # Played when the item is used up, one of core.sfx.SOUNDS.
 
     def get_action(self, consumer: Actor) -> Optional[ActionOrHandler]:
         """Try to return the action for this item."""
@@ -32,6 +34,7 @@ class Consumable(BaseComponent):
 
     def consume(self) -> None:
         """Remove the consumed item from its containing inventory."""
+        sfx.play(self.sound)
         entity = self.parent
         inventory = entity.parent
         if isinstance(inventory, components.inventory.Inventory):
@@ -39,6 +42,8 @@ class Consumable(BaseComponent):
 
 
 class ConfusionConsumable(Consumable):
+    sound = "confusion"
+
     def __init__(self, number_of_turns: int):
         self.number_of_turns = number_of_turns
 
@@ -70,10 +75,12 @@ class ConfusionConsumable(Consumable):
         target.ai = components.ai.ConfusedEnemy(
             entity=target, previous_ai=target.ai, turns_remaining=self.number_of_turns,
         )
+        target.mark_state_changed()
         self.consume()
 
 
 class PosionConsumable(Consumable):
+    sound = "poison"
 
     def __init__(self, damage: int, number_of_turns: int):
         self.damage = damage
@@ -106,10 +113,13 @@ class PosionConsumable(Consumable):
         target.ai = components.ai.ConfusedEnemy(
             entity=target, previous_ai=target.ai, turns_remaining=self.number_of_turns,
         )
+        target.mark_state_changed()
         self.consume()
 
 
 class FreezeConsumable(Consumable):
+    sound = "freeze"
+
     def __init__(self, number_of_turns: int):
         self.number_of_turns = number_of_turns
 
@@ -140,10 +150,13 @@ class FreezeConsumable(Consumable):
         target.ai = components.ai.FreezedEnemy(
             entity=target, previous_ai=target.ai, turns_remaining=self.number_of_turns,
         )
+        target.mark_state_changed()
         self.consume()
 
 
 class FireballDamageConsumable(Consumable):
+    sound = "fireball"
+
     def __init__(self, damage: int, radius: int):
         self.damage = damage
         self.radius = radius
@@ -179,6 +192,8 @@ class FireballDamageConsumable(Consumable):
 
 
 class HealingConsumable(Consumable):
+    sound = "heal"
+
     def __init__(self, amount: int):
         self.amount = amount
 
@@ -197,6 +212,8 @@ class HealingConsumable(Consumable):
 
 
 class LightningDamageConsumable(Consumable):
+    sound = "lightning"
+
     def __init__(self, damage: int, maximum_range: int):
         self.damage = damage
         self.maximum_range = maximum_range
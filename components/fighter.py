@@ -6,6 +6,7 @@ from typing import TYPE_CHECKING
 import core.color as color
 import core.input_handlers as input_handlers
 import core.settings as settings
+import core.sfx as sfx
 from components.base_component import BaseComponent
 from components.scoreboard import send_score
 from core.render_order import RenderOrder
@@ -34,6 +35,7 @@ class Fighter(BaseComponent):
 	@hp.setter
 	def hp(self, value: int) -> None:
 		self._hp = max(0, min(value, self.max_hp))
+		self.parent.mark_state_changed()
 		if self._hp == 0 and self.parent.ai:
 			self.die()
 
@@ -62,7 +64,11 @@ class Fighter(BaseComponent):
 	def send_to_scoreboard(self) -> None:
 		name = settings.data_settings["name"]
 		score = int(sum([i * 150 + (bool(i) * 350) for i in range(self.engine.player.level.current_level-1)]) + self.engine.player.level.current_xp + (bool(self.engine.player.level.current_level) * 350))
-		send_score(score, name)
+		level = self.engine.player.level
+		send_score(
+			score, name,
+			floor=self.engine.game_world.current_floor, level=level.current_level, xp=level.current_xp, turns=self.engine.turn,
+		)
 		
 	def open_scoreboard(self):
 		return input_handlers.PopupMessage(self, text="score") 
@@ -76,6 +82,7 @@ class Fighter(BaseComponent):
 		self.parent.ai = None
 		self.parent.name = f"remains of {self.parent.name}"
 		self.parent.render_order = RenderOrder.CORPSE
+		self.parent.mark_changed()
 
 
 		self.engine.player.level.add_xp(self.parent.level.xp_given)
@@ -83,12 +90,14 @@ class Fighter(BaseComponent):
 		if self.engine.player is self.parent:
 			death_message = "You died!"
 			death_message_color = color.player_die
+			sfx.play("player_death")
 			self.send_to_scoreboard()
 			self.open_scoreboard()
 
 		else:
 			death_message = f"{self.parent.name} is dead!"
 			death_message_color = color.enemy_die
+			sfx.play("death")
 
 		self.engine.message_log.add_message(death_message, death_message_color)
 
@@ -0,0 +1,156 @@
+"""
+Local leaderboard of finished runs, stored in SQLite next to the settings.
+
+Every run is kept with its floor, level, XP, turn count and time. Runs from the online scoreboard
+are merged in as they are synced, so the leaderboard can be shown right away, offline too. Runs not
+yet sent to the server are marked, the scoreboard client sends them from there.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    floor INTEGER,
+    level INTEGER,
+    xp INTEGER,
+    turns INTEGER,
+    time REAL NOT NULL,
+    sent INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (name, score, time)
+);
+CREATE INDEX IF NOT EXISTS runs_score ON runs (score DESC);
+CREATE INDEX IF NOT EXISTS runs_name_score ON runs (name, score DESC);
+CREATE INDEX IF NOT EXISTS runs_unsent ON runs (id) WHERE sent = 0;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+"""
+
+# The details of a run besides its name and score, as sent to and received from the server.
+DETAILS = ("floor", "level", "xp", "turns")
+
+
+def format_scores(top: List[Tuple[str, int]], best: Optional[int] = None) -> str:
+    """
+    The lines of a scoreboard as shown in game, starting and ending with a new line.
+
+    :param top: Name and score of the best runs, best first.
+    :param best: Personal best of the player, shown last if given.
+    """
+    lines = [""]
+    for place, (name, score) in enumerate(top, start=1):
+        lines.append(f"{place:>2}. {name[:16]:<16} {score:>8}")
+    if best is not None:
+        lines.append(f"Best personal : {best}")
+    return "\n".join(lines) + "\n"
+
+
+class Leaderboard:
+    """
+    The runs table. Each thread gets its own connection, so reading while the scoreboard worker
+    writes doesn't wait on it.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.local = threading.local()
+        self.revision = 0  # Changes whenever runs are added, for callers caching what they read.
+        with self.connection as db:
+            db.executescript(SCHEMA)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def record(self, name: str, score: int, sent: bool = False, run_time: Optional[float] = None, **details: int) -> None:
+        """
+        Add a finished run, a run already stored is ignored.
+
+        :param name: Name of the player.
+        :param score: Score of the run.
+        :param sent: The server already has this run.
+        :param run_time: When the run ended, now if None.
+        :param details: The floor, level, xp and turns of the run.
+        """
+        self.add([dict(name=name, score=score, time=run_time or time.time(), **details)], sent)
+
+    def add(self, runs: Iterable[Dict[str, object]], sent: bool) -> int:
+        """Add runs given as dicts with the keys of the table, returns how many were new."""
+        rows = [
+            (run["name"], run["score"], *(run.get(key) for key in DETAILS), run["time"], int(sent))
+            for run in runs
+        ]
+        with self.connection as db:
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO runs (name, score, floor, level, xp, turns, time, sent)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            added = db.total_changes - before
+        if added:
+            self.revision += 1
+        return added
+
+    def unsent(self, limit: int) -> List[Dict[str, object]]:
+        """The oldest runs the server doesn't have yet, with their id."""
+        rows = self.connection.execute(
+            "SELECT id, name, score, floor, level, xp, turns, time FROM runs WHERE sent = 0 ORDER BY id LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [dict(zip(("id", "name", "score", *DETAILS, "time"), row)) for row in rows]
+
+    def mark_sent(self, ids: Iterable[int]) -> None:
+        with self.connection as db:
+            db.executemany("UPDATE runs SET sent = 1 WHERE id = ?", ((run_id,) for run_id in ids))
+
+    def top(self, limit: int) -> List[Tuple[str, int]]:
+        """Name and score of the best `limit` runs."""
+        return self.connection.execute(
+            "SELECT name, score FROM runs ORDER BY score DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+    def best(self, name: str) -> Optional[int]:
+        """Best score of a player, None if they have no run."""
+        return self.connection.execute("SELECT MAX(score) FROM runs WHERE name = ?", (name,)).fetchone()[0]
+
+    def rank(self, score: int) -> int:
+        """Place a run with this score would take, 1 for the best."""
+        return self.connection.execute("SELECT COUNT(*) FROM runs WHERE score > ?", (score,)).fetchone()[0] + 1
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def text(self, limit: int, name: str = "") -> str:
+        """The scoreboard shown in game: the best runs, and the personal best of `name` if given."""
+        return format_scores(self.top(limit), self.best(name) if name else None)
+
+    def get_meta(self, key: str, default: object = None) -> object:
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_meta(self, key: str, value: object) -> None:
+        with self.connection as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self) -> None:
+        """Close the connection of the calling thread."""
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+def open_leaderboard(folder: str) -> Leaderboard:
+    """The leaderboard stored in `folder`."""
+    return Leaderboard(os.path.join(folder, "leaderboard.db"))
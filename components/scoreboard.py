@@ -1,33 +1,272 @@
+"""
+Client of the online scoreboard.
+
+Nothing here blocks the game: the scores shown are read from the local leaderboard, which a worker
+thread keeps in sync with the server over one pooled HTTPS session. Finished runs are stored on the
+leaderboard by the worker and sent from there in batches, retrying with exponential backoff while the
+server can't be reached, so runs made offline are sent on a later run.
+
+The server takes `POST /scores` with
+    {"scores": [{"name": str, "score": int, "floor": int, "level": int, "xp": int, "turns": int,
+                 "time": float, "version": float}, ...]}
+and answers `GET /scores?after=S&limit=N` with the first N runs it received after the run numbered S, in
+the order received and in the same form, each with the number `"seq": int` the server gave it as it
+received it. Only the runs added since the last sync are fetched: the cursor is that number rather than
+the `time` of a run, which the player's clock set when it ended, and which is old for a run sent late.
+"""
+import atexit
+import os
+import random
+import threading
 import time
-import requests
+from typing import Dict, List, Optional, Tuple, Union
+
+import core.settings as settings
+from components.leaderboard import Leaderboard, open_leaderboard
 
 try:
     from updates.constant import VERSION
 except:
     from updates.constant import VERSION
 
-# Suppress only the single InsecureRequestWarning from urllib3 needed for this use case
-requests.packages.urllib3.disable_warnings()
-
 URL = "https://localhost:1234"
+# Path of a CA bundle for a server with its own certificate, otherwise the system ones are used.
+CA_BUNDLE = os.environ.get("LOST_MIND_SCOREBOARD_CA")
+
+TIMEOUT = (3.05, 10)  # Connect and read timeout in seconds, only the worker waits on them.
+SYNC_EVERY = 60  # Seconds between fetches of the runs the server received.
+PAGE_SIZE = 500  # Runs fetched per request while syncing.
+BATCH_SIZE = 20  # Runs sent per request.
+BACKOFF_BASE = 2  # Seconds to wait after the first failure, doubled after every further one.
+BACKOFF_MAX = 300
 
+LOADING = "\nLoading the scoreboard...\n"
+OFFLINE = "\nThe scoreboard can't be reached.\n"
 
-def structure_scoreboard(text):
+
+class ScoreboardClient:
     """
-    Structure the scoreboard data
-    This is not available for public use
+    Serves the scoreboard from the local leaderboard and talks to the server from a background thread.
     """
 
+    def __init__(
+            self,
+            url: str = URL,
+            folder: Optional[str] = None,
+            verify: Union[bool, str] = True,
+            leaderboard: Optional[Leaderboard] = None,
+    ) -> None:
+        """
+        :param url: Address of the scoreboard server.
+        :param folder: Folder of the leaderboard, the settings folder by default.
+        :param verify: Verify the server certificate, or the path of a CA bundle to verify it with.
+        :param leaderboard: Leaderboard to use instead of the one in `folder`.
+        """
+        # Imported here rather than with the module, as it is slow to import and the menu shows without it.
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url = url.rstrip("/")
+        if leaderboard is None:
+            leaderboard = open_leaderboard(settings.data.path_folder if folder is None else folder)
+        self.leaderboard = leaderboard
+
+        self.session = requests.Session()
+        self.session.verify = verify
+        # Only the worker uses the session, one kept-alive connection is all it needs.
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+        self.lock = threading.Lock()
+        # Its own generator for the backoff, draws from the global one would change the seeded game.
+        self.random = random.Random()
+        self.finished: List[Dict[str, object]] = []  # Runs the worker hasn't stored yet.
+        self.texts: Dict[Tuple[int, str], Tuple[int, str]] = {}  # (limit, name) -> (revision, text)
+        self.ranks: Dict[int, Tuple[int, int]] = {}  # score -> (revision, rank)
+        self.synced_at = 0.0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.offline = False  # The last request failed.
+        self.sent = 0
+
+        self.wake = threading.Event()
+        self.closing = False
+        self.worker = threading.Thread(target=self.run, name="scoreboard", daemon=True)
+        self.worker.start()
+        self.wake.set()  # Send the runs earlier sessions left, and sync.
+
+    def scores(self, limit: int = 10, name: str = "") -> str:
+        """
+        Return the scoreboard text from the leaderboard, syncing it in the background if it is old.
+        Never waits on the network.
+        """
+        if time.time() - self.synced_at > SYNC_EVERY:
+            self.wake.set()
+        revision = self.leaderboard.revision
+        cached = self.texts.get((limit, name))
+        if cached is None or cached[0] != revision:
+            cached = self.texts[limit, name] = revision, self.leaderboard.text(limit, name)
+        if cached[1].strip():
+            return cached[1]
+        return OFFLINE if self.offline else LOADING
+
+    @property
+    def loading(self) -> bool:
+        """True until the first sync ends, or fails."""
+        return not self.synced_at and not self.offline
+
+    @property
+    def revision(self) -> Tuple[int, bool]:
+        """Changes whenever the scoreboard text may have, when runs were added or the server went on or offline."""
+        return self.leaderboard.revision, self.offline
+
+    def rank(self, score: int) -> int:
+        """Place a score takes on the leaderboard, counted again only when runs were added."""
+        revision = self.leaderboard.revision
+        cached = self.ranks.get(score)
+        if cached is None or cached[0] != revision:
+            cached = self.ranks[score] = revision, self.leaderboard.rank(score)
+        return cached[1]
+
+    def submit(self, score: int, name: str, **details: int) -> None:
+        """Queue a finished run, the worker stores it on the leaderboard before it tries to send it."""
+        with self.lock:
+            self.finished.append(dict(name=name, score=score, time=time.time(), **details))
+        self.wake.set()
+
+    def store_finished(self) -> None:
+        """Add the queued runs to the leaderboard, as not sent yet."""
+        with self.lock:
+            finished, self.finished = self.finished, []
+        if finished:
+            self.leaderboard.add(finished, sent=False)
+
+    def close(self, timeout: float = 1.0) -> None:
+        """Stop the worker, runs not sent yet stay on the leaderboard for the next session."""
+        self.closing = True
+        self.wake.set()
+        self.worker.join(timeout)
+        self.store_finished()
+        self.leaderboard.close()
+        self.session.close()
+
+    def run(self) -> None:
+        """The worker: send the runs the server doesn't have first, then fetch the ones it received since the last sync."""
+        import requests
+
+        while not self.closing:
+            self.wake.wait(max(0.0, self.retry_at - time.time()) if self.retry_at else None)
+            self.wake.clear()
+            self.store_finished()
+            if self.closing:
+                break
+            if time.time() < self.retry_at:
+                continue  # Backing off, the work waits for the retry time.
+            try:
+                while not self.closing and self.send_batch():
+                    pass
+                if not self.closing and time.time() - self.synced_at > SYNC_EVERY:
+                    self.sync()
+            except (requests.RequestException, ValueError, KeyError, TypeError):
+                self.failures += 1
+                self.offline = True
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1))
+                self.retry_at = time.time() + delay * self.random.uniform(0.5, 1.0)
+            else:
+                self.failures = 0
+                self.offline = False
+                self.retry_at = 0.0
+        self.leaderboard.close()
+
+    def send_batch(self) -> bool:
+        """Send the oldest runs the server doesn't have, returns False if there were none."""
+        batch = self.leaderboard.unsent(BATCH_SIZE)
+        if not batch:
+            return False
+        scores = [{**{key: value for key, value in run.items() if key != "id"}, "version": VERSION} for run in batch]
+        response = self.session.post(f"{self.url}/scores", json={"scores": scores}, timeout=TIMEOUT)
+        response.raise_for_status()
+        self.leaderboard.mark_sent(run["id"] for run in batch)
+        self.sent += len(batch)
+        return True
+
+    def sync(self) -> None:
+        """Fetch the runs the server received since the last sync, a page at a time."""
+        after = self.leaderboard.get_meta("synced_seq", 0)
+        while not self.closing:
+            response = self.session.get(
+                f"{self.url}/scores", params={"after": after, "limit": PAGE_SIZE}, timeout=TIMEOUT
+            )
+            response.raise_for_status()
+            runs = response.json()["scores"]
+            if runs:
+                self.leaderboard.add(runs, sent=True)
+                after = max(run["seq"] for run in runs)
+                self.leaderboard.set_meta("synced_seq", after)
+            if len(runs) < PAGE_SIZE:
+                break
+        self.synced_at = time.time()
+
+
+_client: Optional[ScoreboardClient] = None
+_client_lock = threading.Lock()  # The startup thread and the menu may both ask for it first.
+_enabled = True
+
+
+def client() -> ScoreboardClient:
+    """The client used by the game, started on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ScoreboardClient(verify=CA_BUNDLE or True)
+            atexit.register(_client.close)
+    return _client
+
+
+def disable() -> None:
+    """Keep games off the scoreboard, for bot runs."""
+    global _enabled
+    _enabled = False
+
 
 def get_score(limit=10, name=""):
     """
-    Get the scoreboard from the server
-    This is not available for public use
+    Get the scoreboard text from the local leaderboard, synced with the server in the background.
+    """
+    if not _enabled:
+        return ""
+    return client().scores(limit, name)
+
+
+def get_rank(score):
+    """
+    Get the place a score takes on the local leaderboard, None while the scoreboard is disabled.
+    """
+    if not _enabled:
+        return None
+    return client().rank(score)
+
+
+def get_revision():
+    """
+    Get a value that changes whenever the scoreboard text may have, None while the scoreboard is disabled.
+    """
+    if not _enabled:
+        return None
+    return client().revision
+
+
+def is_loading():
+    """
+    Check if the scoreboard is still waiting on its first sync with the server.
     """
+    return _enabled and client().loading
 
 
-def send_score(score, name):
+def send_score(score, name, **details):
     """
-    Send score to the server
-    This is not available for public use
+    Record a finished run and send it to the server in the background.
+    `details` are the floor, level, xp and turns of the run.
     """
+    if _enabled:
+        client().submit(score, name, **details)
@@ -6,6 +6,7 @@ from typing import TYPE_CHECKING, Optional, Tuple
 import core.color as color
 import core.exceptions as exceptions
 import core.settings as settings
+import core.sfx as sfx
 
 if TYPE_CHECKING:
     from core.engine import Engine
@@ -48,6 +49,7 @@ class PickupAction(Action):
                     raise exceptions.Impossible("Your inventory is full.")
 
                 self.engine.game_map.entities.remove(item)
+                self.engine.game_map.revisions.bump("entities")
                 item.parent = self.entity.inventory
                 inventory.items.append(item)
 
@@ -116,10 +118,29 @@ class TakeStairsAction(Action):
             self.engine.message_log.add_message(
                 "You descend the staircase.", color.descend
             )
+            sfx.play("stairs")
         else:
             raise exceptions.Impossible("There are no stairs here.")
 
 
+class TravelAction(Action):
+    """Take one step towards the nearest goal of a goal map registered on the game map."""
+
+    def __init__(self, entity: Actor, goal: str, arrived_message: str = "You are already there."):
+        super().__init__(entity)
+
+        self.goal = goal
+        self.arrived_message = arrived_message
+
+    def perform(self) -> None:
+        path = self.engine.game_map.goal_maps.path_from(self.goal, self.entity.x, self.entity.y)
+        if not path:
+            raise exceptions.Impossible(self.arrived_message)
+
+        dest_x, dest_y = path[0]
+        return BumpAction(self.entity, dest_x - self.entity.x, dest_y - self.entity.y).perform()
+
+
 class ActionWithDirection(Action):
     def __init__(self, entity: Actor, dx: int, dy: int):
         super().__init__(entity)
@@ -153,6 +174,7 @@ class MeleeAction(ActionWithDirection):
             raise exceptions.Impossible("Nothing to attack.")
 
         damage = self.entity.fighter.power - target.fighter.defense
+        sfx.play("attack")
 
         attack_desc = f"{self.entity.name.capitalize()} attacks {target.name}"
 
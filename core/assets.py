@@ -0,0 +1,197 @@
+"""
+Where the game's assets are read from.
+
+From the source tree they are the files under `assets/`. A bundle made by `updates/make_bundle.py`
+carries them inside its archive instead, next to the compiled modules. Assets are read from the
+archive there, and the ones that have to be a file, like the images tcod loads by path, are
+extracted once to a cache folder named after the bundle's hash.
+
+The images and the music are also kept decoded in `assets/assets.pack`, made by
+`updates/make_pack.py`. The pack is memory-mapped and its entries are handed out as read-only
+NumPy views of the mapping, so nothing is decoded or copied when the game starts. Without a pack,
+or when an asset changed after the pack was made, the asset is decoded from its file.
+"""
+from __future__ import annotations
+
+import io
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zipfile
+import zipimport
+from typing import Any, BinaryIO, Dict, Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+import tcod
+
+import core.settings as settings
+
+# Inside the bundle, the list of its files with their sizes and hashes, and the hash of the whole bundle.
+BUNDLE_INDEX = "bundle.json"
+
+# The archive this module was imported from, None when the game runs from source.
+BUNDLE: Optional[str] = __loader__.archive if isinstance(__loader__, zipimport.zipimporter) else None
+
+PACK = "assets/assets.pack"
+PACK_MAGIC = b"LMPACK1\0"
+PACK_HEADER = struct.Struct("<8sQ")  # The magic and the length of the index that follows it.
+PACK_ALIGN = 64  # Every entry starts at a multiple of this, so its view is aligned for any dtype.
+
+_archive: Optional[zipfile.ZipFile] = None
+_pack: Optional[AssetPack] = None
+_pack_loaded = False
+_pack_lock = threading.Lock()
+_lock = threading.Lock()  # The startup thread reads assets too.
+
+
+def archive() -> zipfile.ZipFile:
+    """The bundle opened for reading, kept open so its index is read once."""
+    global _archive
+    if _archive is None:
+        _archive = zipfile.ZipFile(BUNDLE)
+    return _archive
+
+
+def exists(name: str) -> bool:
+    """Whether the game has the asset `name`, in the asset pack or as a file."""
+    if BUNDLE is not None:
+        with _lock:
+            try:
+                archive().getinfo(name)
+            except KeyError:
+                return False
+            return True
+    return os.path.exists(name) or packed(name) is not None
+
+
+def read(name: str) -> bytes:
+    """The content of an asset, `name` is its path from the game folder like "assets/images/icon.ico"."""
+    if BUNDLE is None:
+        with open(name, "rb") as f:
+            return f.read()
+    with _lock:
+        return archive().read(name)
+
+
+def open_asset(name: str) -> BinaryIO:
+    """An asset as a binary file object."""
+    if BUNDLE is None:
+        return open(name, "rb")
+    return io.BytesIO(read(name))
+
+
+def path(name: str) -> str:
+    """A path an asset can be loaded from, for libraries that only take paths."""
+    if BUNDLE is None:
+        return os.path.join(*name.split("/"))
+    with _lock:
+        bundle_hash = json.loads(archive().read(BUNDLE_INDEX))["hash"]
+        target = os.path.join(settings.data.path_folder, "assets_cache", bundle_hash[:16], *name.split("/"))
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target + ".tmp", "wb") as f:
+                f.write(archive().read(name))
+            os.replace(target + ".tmp", target)
+    return target
+
+
+class AssetPack:
+    """Decoded assets in one memory-mapped file.
+
+    The file starts with PACK_HEADER and a JSON index, which names for each array of an entry its
+    offset from the start of the data, its dtype and shape, details like the sample rate of a sound, and the
+    size of the file it was decoded from.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.made = os.fstat(f.fileno()).st_mtime_ns
+        magic, length = PACK_HEADER.unpack_from(self.map)
+        if magic != PACK_MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not an asset pack")
+        self.entries: Dict[str, Dict[str, Any]] = json.loads(self.map[PACK_HEADER.size:PACK_HEADER.size + length])
+        # The data follows the index, at the next multiple of PACK_ALIGN.
+        self.start = -(-(PACK_HEADER.size + length) // PACK_ALIGN) * PACK_ALIGN
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def array(self, name: str, key: str = "data") -> np.ndarray:
+        """A read-only view of one array of an entry, its pages are read when they are first used."""
+        entry = self.entries[name]["arrays"][key]
+        count = int(np.prod(entry["shape"]))
+        return np.frombuffer(self.map, entry["dtype"], count, self.start + entry["offset"]).reshape(entry["shape"])
+
+    def details(self, name: str) -> Dict[str, Any]:
+        return self.entries[name]["details"]
+
+    def is_current(self, name: str) -> bool:
+        """False when the asset file changed after the pack was made, assets in a bundle never change.
+        An asset written after the pack, like by an update, is decoded from its file even when it is the same.
+        """
+        if name not in self.entries:
+            return False
+        if BUNDLE is not None:
+            return True
+        try:
+            stat = os.stat(os.path.join(*name.split("/")))
+        except OSError:
+            return True  # Only shipped in the pack.
+        return stat.st_size == self.entries[name]["size"] and stat.st_mtime_ns <= self.made
+
+
+def pack() -> Optional[AssetPack]:
+    """The asset pack, opened the first time it is needed, None when there is none."""
+    global _pack, _pack_loaded
+    with _pack_lock:
+        if not _pack_loaded:
+            _pack_loaded = True
+            try:
+                if PACK in archive().namelist() if BUNDLE is not None else os.path.exists(PACK):
+                    _pack = AssetPack(path(PACK))
+            except (OSError, ValueError):
+                logging.warning("Could not open the asset pack, the assets are decoded from their files.", exc_info=True)
+        return _pack
+
+
+def packed(name: str) -> Optional[AssetPack]:
+    """The pack when it has a current copy of `name`."""
+    asset_pack = pack()
+    if asset_pack is not None and asset_pack.is_current(name):
+        return asset_pack
+    return None
+
+
+def image(name: str) -> np.ndarray:
+    """The RGB pixels of an image, shaped (height, width, 3)."""
+    asset_pack = packed(name)
+    if asset_pack is not None:
+        return asset_pack.array(name)
+    return tcod.image.load(path(name))[:, :, :3]
+
+
+def sound(name: str) -> Tuple[np.ndarray, int]:
+    """The float32 samples of a sound, shaped (frames, channels), and its sample rate."""
+    asset_pack = packed(name)
+    if asset_pack is not None:
+        return asset_pack.array(name), asset_pack.details(name)["samplerate"]
+    import soundfile  # Only needed without a pack, and slow to import.
+
+    return soundfile.read(open_asset(name), dtype="float32", always_2d=True)
+
+
+def tileset(name: str, columns: int, rows: int, charmap: Sequence[int]) -> tcod.tileset.Tileset:
+    """A tilesheet laid out like `tcod.tileset.load_tilesheet` reads it."""
+    asset_pack = packed(name)
+    if asset_pack is None:
+        return tcod.tileset.load_tilesheet(path(name), columns, rows, charmap)
+    tiles = asset_pack.array(name)
+    loaded = tcod.tileset.Tileset(tiles.shape[2], tiles.shape[1])
+    for codepoint, tile in zip(asset_pack.array(name, "codepoints").tolist(), tiles):
+        loaded.set_tile(codepoint, tile)
+    return loaded
@@ -0,0 +1,292 @@
+"""
+Music streamed to the audio device in small blocks, with the sound effects of core.sfx mixed in.
+
+Tracks are read a block at a time, from the asset pack when it has them or decoded from their
+file, and resampled to the device on a decoder thread. The decoded blocks wait in a bounded queue
+that the mixer thread takes from to fill the device, so the memory used stays the same however
+long the music is. A playlist moves on to its next track with a crossfade, or without a gap when a
+track loops into itself. The volume is applied as the blocks are queued to the device, so a change
+is heard right away.
+The audio device is opened the first time music is played, the game runs silently without one.
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np  # type: ignore
+
+import core.assets as assets
+
+CROSSFADE = 2.0  # Seconds two tracks of a playlist overlap.
+READ_FRAMES = 4096  # Frames read from a track at once.
+BUFFERED_BLOCKS = 8  # Blocks decoded ahead of the device.
+QUEUED_BLOCKS = 2  # Blocks queued to the device, a volume change is heard after these.
+
+
+def to_channels(samples: np.ndarray, channels: int) -> np.ndarray:
+    """Samples shaped (frames, channels), mono is copied to every speaker and mixed down for one."""
+    if channels == 1 and samples.shape[1] > 1:
+        return samples.mean(axis=1, keepdims=True)
+    if samples.shape[1] == channels:
+        return samples
+    return samples[:, np.arange(channels) % samples.shape[1]]
+
+
+class Track:
+    """One asset of a playlist, read in blocks and resampled to the device with linear interpolation."""
+
+    def __init__(self, name: str, frequency: int, channels: int) -> None:
+        self.name = name
+        self.channels = channels
+        self.file = None
+        asset_pack = assets.packed(name)
+        if asset_pack is not None:
+            self.samples: Optional[np.ndarray] = asset_pack.array(name)
+            samplerate = asset_pack.details(name)["samplerate"]
+            self.frames = len(self.samples)
+        else:
+            import soundfile  # Only needed without an asset pack, and slow to import.
+
+            self.samples = None
+            self.file = soundfile.SoundFile(assets.open_asset(name))
+            samplerate = self.file.samplerate
+            self.frames = self.file.frames
+        self.step = samplerate / frequency  # Frames of the track for each frame of the device.
+        self.read_frames = 0
+        self.pending = np.zeros((0, channels), np.float32)  # Read but not resampled yet.
+        self.offset = 0.0  # Position of the next device frame in `pending`.
+        self.ended = False
+
+    def read(self, frames: int) -> np.ndarray:
+        if self.file is not None:
+            block = self.file.read(frames, dtype="float32", always_2d=True)
+        else:
+            block = self.samples[self.read_frames:self.read_frames + frames]
+        self.read_frames += len(block)
+        return to_channels(block, self.channels)
+
+    def remaining(self) -> int:
+        """Frames of the device left to play."""
+        return int((self.frames - self.read_frames + len(self.pending) - self.offset) / self.step)
+
+    def convert(self, frames: int) -> np.ndarray:
+        """The next `frames` frames for the device, fewer once the track ends."""
+        needed = int(self.offset + frames * self.step) + 2
+        while len(self.pending) < needed and not self.ended:
+            block = self.read(max(READ_FRAMES, needed - len(self.pending)))
+            if len(block) == 0:
+                self.ended = True
+            self.pending = np.concatenate((self.pending, block))
+        positions = self.offset + np.arange(frames) * self.step
+        if self.ended:
+            positions = positions[positions < len(self.pending) - 1]
+        index = positions.astype(np.intp)
+        fraction = (positions - index)[:, np.newaxis].astype(np.float32)
+        samples = self.pending[index] * (1 - fraction) + self.pending[index + 1] * fraction
+        consumed = self.offset + len(samples) * self.step
+        self.pending = self.pending[int(consumed):]
+        self.offset = consumed - int(consumed)
+        return samples
+
+    @property
+    def finished(self) -> bool:
+        return self.ended and len(self.pending) - self.offset <= 1
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+
+class Music(threading.Thread):
+    """Plays a playlist into a bounded queue of blocks for the mixer."""
+
+    def __init__(self, frequency: int, channels: int, block_frames: int) -> None:
+        super().__init__(name="music", daemon=True)
+        self.frequency = frequency
+        self.channels = channels
+        self.block_frames = block_frames
+        self.blocks: queue.Queue = queue.Queue(maxsize=BUFFERED_BLOCKS)
+        self.lock = threading.Lock()
+        self.playlist: List[str] = []
+        self.index = 0
+        self.loop = True
+        self.crossfade = CROSSFADE
+        self.requested: Optional[List[str]] = None  # A new playlist, switched to by the decoder thread.
+        self.current: Optional[Track] = None
+        self.outgoing: Optional[Track] = None  # The track fading out.
+        self.fade_position = 0
+        self.fade_frames = 0
+        self.running = True
+
+    @property
+    def playing(self) -> bool:
+        return self.current is not None or self.outgoing is not None or bool(self.requested)
+
+    def play(self, playlist: Sequence[str], loop: bool = True, crossfade: float = CROSSFADE) -> None:
+        """Crossfade from what is playing to `playlist`, an empty playlist fades the music out."""
+        with self.lock:
+            self.requested = list(playlist)
+            self.loop = loop
+            self.crossfade = crossfade
+
+    def stop(self) -> None:
+        self.play([])
+
+    def next_track(self) -> Optional[Track]:
+        if not self.playlist:
+            return None
+        if self.index >= len(self.playlist):
+            if not self.loop:
+                return None
+            self.index = 0
+        self.index += 1
+        return Track(self.playlist[self.index - 1], self.frequency, self.channels)
+
+    def upcoming(self) -> Optional[str]:
+        if self.index < len(self.playlist):
+            return self.playlist[self.index]
+        return self.playlist[0] if self.loop and self.playlist else None
+
+    def start_fade(self, track: Optional[Track]) -> None:
+        """Fade the current track out and `track` in."""
+        if self.outgoing is not None:
+            self.outgoing.close()
+        self.outgoing = self.current
+        self.current = track
+        self.fade_position = 0
+        self.fade_frames = max(int(self.crossfade * self.frequency), 1)
+
+    def gains(self, frames: int) -> np.ndarray:
+        """How far the fade is at each of the next frames, from 0 to 1."""
+        return np.clip((self.fade_position + np.arange(frames)) / self.fade_frames, 0, 1)[:, np.newaxis]
+
+    def mix_block(self) -> np.ndarray:
+        """The next block of music."""
+        with self.lock:
+            if self.requested is not None:
+                self.playlist, self.index, self.requested = self.requested, 0, None
+                self.start_fade(self.next_track())
+
+        block = np.zeros((self.block_frames, self.channels), np.float32)
+        fading = self.outgoing is not None
+        filled = 0
+        while filled < self.block_frames and self.current is not None:
+            samples = self.current.convert(self.block_frames - filled)
+            if fading:
+                samples = samples * np.sin(self.gains(len(samples)) * np.pi / 2)
+            block[filled:filled + len(samples)] += samples
+            filled += len(samples)
+            if self.current.finished:
+                # Too short to crossfade, or looping into itself, the next track follows without a gap.
+                self.current.close()
+                if self.current.read_frames == 0:
+                    logging.warning(f"{self.current.name} has no samples, the music is stopped.")
+                    self.playlist = []
+                self.current = self.next_track()
+        if self.outgoing is not None:
+            samples = self.outgoing.convert(self.block_frames)
+            block[:len(samples)] += samples * np.cos(self.gains(len(samples)) * np.pi / 2)
+            self.fade_position += self.block_frames
+            if self.fade_position >= self.fade_frames or self.outgoing.finished:
+                self.outgoing.close()
+                self.outgoing = None
+
+        if self.current is not None and self.outgoing is None and self.crossfade > 0:
+            upcoming = self.upcoming()
+            if upcoming not in (None, self.current.name) and self.current.remaining() <= self.crossfade * self.frequency:
+                self.start_fade(self.next_track())
+        return block
+
+    def run(self) -> None:
+        while self.running:
+            if not self.playing:
+                time.sleep(0.01)
+                continue
+            try:
+                block = self.mix_block()
+            except Exception:
+                logging.error("Music playback failed", exc_info=True)
+                with self.lock:
+                    self.current = self.outgoing = None
+                continue
+            self.blocks.put(block)  # Waits while the queue is full.
+
+
+class Mixer(threading.Thread):
+    """Feeds the audio device from the music, a few blocks ahead.
+    Other sources, like the sound effects of core.sfx, have their `mix` called with every block to add to it.
+    """
+
+    def __init__(self, device, volume: float = 1.0) -> None:
+        super().__init__(name="mixer", daemon=True)
+        self.device = device
+        self.volume = volume
+        self.music = Music(device.frequency, device.channels, device.buffer_samples)
+        self.sources: List = []
+        self.underruns = 0  # Blocks the music wasn't decoded in time for.
+        self.running = True
+        self.music.start()
+        self.start()
+
+    def run(self) -> None:
+        while self.running:
+            if self.device.queued_samples >= self.device.buffer_samples * QUEUED_BLOCKS:
+                time.sleep(0.002)
+                continue
+            try:
+                block = self.music.blocks.get_nowait()
+            except queue.Empty:
+                block = np.zeros((self.device.buffer_samples, self.device.channels), np.float32)
+                self.underruns += self.music.playing
+            for source in self.sources:
+                source.mix(block)
+            self.device.queue_audio(block * self.volume)
+
+    def close(self) -> None:
+        self.running = self.music.running = False
+        self.device.close()
+
+
+_mixer: Optional[Mixer] = None
+_mixer_failed = False
+_lock = threading.Lock()
+_volume = 1.0
+
+
+def mixer() -> Optional[Mixer]:
+    """The mixer, the audio device is opened the first time, None when there is no audio device."""
+    global _mixer, _mixer_failed
+    with _lock:
+        if _mixer is None and not _mixer_failed:
+            try:
+                import tcod.sdl.audio
+
+                _mixer = Mixer(tcod.sdl.audio.open(format=np.float32), _volume)
+            except Exception:
+                _mixer_failed = True
+                logging.warning("Could not open the audio device, the game runs without sound.", exc_info=True)
+        return _mixer
+
+
+def play_music(playlist: Sequence[str], loop: bool = True, crossfade: float = CROSSFADE) -> None:
+    """Crossfade to `playlist`, the names of its tracks like "assets/music/music.wav"."""
+    current = mixer()
+    if current is not None:
+        current.music.play(playlist, loop, crossfade)
+
+
+def stop_music() -> None:
+    if _mixer is not None:
+        _mixer.music.stop()
+
+
+def set_volume(volume: float) -> None:
+    """Set the volume of the music and the sound effects, from 0 to 1."""
+    global _volume
+    _volume = volume
+    if _mixer is not None:
+        _mixer.volume = volume
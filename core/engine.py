@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import lzma
 import pickle
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional, Tuple
 
 from tcod.console import Console
 from tcod.map import compute_fov
@@ -10,13 +10,19 @@ from tcod.map import compute_fov
 import core.exceptions as exceptions
 import core.render_functions as render_functions
 from core.message_log import MessageLog
+from core.profiler import profiler
+from core.replay import LEVEL_UP_CHOICES, Recorder
 
 if TYPE_CHECKING:
+	from core.rewind import RewindBuffer
 	from game.entity import Actor
 	from game.game_map import GameMap, GameWorld
 
 import core.settings as settings
 
+# How far the player sees.
+FOV_RADIUS = 8
+
 
 class Engine:
 	game_map: GameMap
@@ -24,49 +30,114 @@ class Engine:
 
 	def __init__(self, player: Actor):
 		self.message_log = MessageLog()
-		self.mouse_location = (0, 0)
+		self._mouse_location = (0, 0)
 		self.player = player
+		self.turn = 0  # Turns the player completed.
+		self.seed: Optional[int] = None  # Seed the game was generated from, None for unknown.
+		self.recorder: Optional[Recorder] = None
+		self.rewind: Optional[RewindBuffer] = None  # The last turns, for undo.
+
+	def __getstate__(self) -> dict:
+		"""Leave the replay recorder and the rewind buffer out of saves.
+		A loaded game can't be replayed from its seed, and starts a new rewind buffer.
+		"""
+		state = self.__dict__.copy()
+		state["recorder"] = None
+		state["rewind"] = None
+		return state
+
+	def __setstate__(self, state: dict) -> None:
+		"""Restore a pickled Engine, including saves made before the mouse location was a property."""
+		if "mouse_location" in state:
+			state["_mouse_location"] = state.pop("mouse_location")
+		state.setdefault("turn", 0)
+		state.setdefault("seed", None)
+		state.setdefault("recorder", None)
+		state.setdefault("rewind", None)
+		self.__dict__.update(state)
+
+	@property
+	def mouse_location(self) -> Tuple[int, int]:
+		return self._mouse_location
+
+	@mouse_location.setter
+	def mouse_location(self, value: Tuple[int, int]) -> None:
+		if value != self._mouse_location:
+			self._mouse_location = value
+			if hasattr(self, "game_map"):
+				self.game_map.revisions.bump("ui")
+
+	def level_up(self, choice: int) -> None:
+		"""Spend a pending level up on one of LEVEL_UP_CHOICES, recording the choice if the game is recorded."""
+		if self.recorder is not None:
+			self.recorder.record_level_up(choice)
+		getattr(self.player.level, LEVEL_UP_CHOICES[choice])()
+		if self.rewind is not None:
+			self.rewind.capture()
+		if self.recorder is not None:
+			self.recorder.checkpoint(self)
+
+	def undo(self) -> bool:
+		"""Step back to the state before the last turn, returns False if there is nothing to undo."""
+		if self.rewind is None:
+			return False
+		if self.recorder is not None:
+			self.recorder.record_undo()
+		undone = self.rewind.rewind()
+		if self.recorder is not None:
+			self.recorder.checkpoint(self)
+		return undone
 
 	def handle_enemy_turns(self) -> None:
-		for entity in set(self.game_map.actors) - {self.player}:
+		# Actors act in the order they were added to the map, so replays see the same turn order.
+		for entity in [actor for actor in self.game_map.actors if actor is not self.player]:
 			if entity.ai:
-				try:
-					entity.ai.perform()
-				except exceptions.Impossible:
-					pass  # Ignore impossible action exceptions from AI.
+				with profiler.section(type(entity.ai).__name__, "ai"):
+					try:
+						entity.ai.perform()
+					except exceptions.Impossible:
+						pass  # Ignore impossible action exceptions from AI.
 
 	def update_fov(self) -> None:
-		"""Recompute the visible area based on the players point of view."""
+		"""Recompute the visible area based on the players point of view.
+		Nothing is done unless the tiles or the player moved since the last time.
+		"""
+		if not self.game_map.revisions.needs_update("visible", "tiles", "player"):
+			return
 		self.game_map.visible[:] = compute_fov(
 			self.game_map.tiles["transparent"],
 			(self.player.x, self.player.y),
-			radius=8,
+			radius=FOV_RADIUS,
 		)
 		# If a tile is "visible" it should be added to "explored".
 		self.game_map.explored |= self.game_map.visible
+		self.game_map.revisions.bump("fov")
 
 	def render(self, console: Console) -> None:
-		self.game_map.render(console, self.player.x, self.player.y)
-
-		self.message_log.render(console=console, x=21, y=45, width=40, height=5)
-
-		render_functions.render_bar(
-			console=console,
-			current_value=self.player.fighter.hp,
-			maximum_value=self.player.fighter.max_hp,
-			total_width=20,
-		)
-
-		render_functions.render_dungeon_level(
-			console=console,
-			dungeon_level=self.game_world.current_floor,
-			location=(0, 47),
-		)
-
-		render_functions.render_names_at_mouse_location(
-			console=console, x=21, y=44, engine=self
-			# console=console, x=0, y=49, engine=self
-		)
+		with profiler.section("render map", "render"):
+			self.game_map.render(console, self.player.x, self.player.y)
+
+		with profiler.section("render log", "render"):
+			self.message_log.render(console=console, x=21, y=45, width=40, height=5)
+
+		with profiler.section("render hud", "render"):
+			render_functions.render_bar(
+				console=console,
+				current_value=self.player.fighter.hp,
+				maximum_value=self.player.fighter.max_hp,
+				total_width=20,
+			)
+
+			render_functions.render_dungeon_level(
+				console=console,
+				dungeon_level=self.game_world.current_floor,
+				location=(0, 47),
+			)
+
+			render_functions.render_names_at_mouse_location(
+				console=console, x=21, y=44, engine=self
+				# console=console, x=0, y=49, engine=self
+			)
 
 	def save_as(self, filename: str) -> None:
 		"""Save this Engine instance as a compressed file."""
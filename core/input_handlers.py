@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import os
 import re
-from typing import TYPE_CHECKING, Callable, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple, Union
 
 import tcod
 
@@ -10,9 +10,12 @@ import core.actions as actions
 import core.color as color
 import components.scoreboard
 import core.exceptions as exceptions
+import core.log as log
 import core.settings as settings
 from core.actions import Action, BumpAction, PickupAction, WaitAction
 from core.engine import Engine
+from core.layers import LayerCache, dim
+from core.profiler import profiler
 
 if TYPE_CHECKING:
     from core.engine import Engine
@@ -47,6 +50,10 @@ def player_controls():
         "stairs": getattr(tcod.event.KeySym, f'{settings.data_settings["controls"]["stairs"]}'),
         "restart": getattr(tcod.event.KeySym, f'{settings.data_settings["controls"]["restart"]}'),
         "history": getattr(tcod.event.KeySym, f'{settings.data_settings["controls"]["history"]}'),
+        "travel_stairs": getattr(tcod.event.KeySym, f'{settings.data_settings["controls"]["travel_stairs"]}'),
+        "explore": getattr(tcod.event.KeySym, f'{settings.data_settings["controls"]["explore"]}'),
+        # The control has its own name, "undo" in the settings turns undo on and off.
+        "undo": getattr(tcod.event.KeySym, f'{settings.data_settings["controls"]["undo_turn"]}'),
     }
 
     WAIT_KEYS = {
@@ -91,22 +98,48 @@ class BaseEventHandler(tcod.event.EventDispatch[ActionOrHandler]):
     def on_render(self, console: tcod.Console) -> None:
         raise NotImplementedError()
 
+    def redraw_key(self) -> object:
+        """Return a value that changes whenever a mouse motion changed what this handler draws.
+        Other events always cause a redraw.
+        """
+        return None
+
+    def needs_redraw(self) -> bool:
+        """Return True to keep rendering frames without waiting for input, while work is in progress."""
+        return False
+
     def ev_quit(self, event: tcod.event.Quit) -> Optional[Action]:
         raise SystemExit()
 
 
-class PopupMessage(BaseEventHandler):
+class PopupHandler(BaseEventHandler):
+    """Base for popups drawn over their dimmed parent handler.
+    The dimmed parent is rendered once into an offscreen layer and blitted on every frame after.
+    """
+
+    def __init__(self, parent_handler: BaseEventHandler):
+        self.parent = parent_handler
+        self.layers = LayerCache()
+
+    def render_parent(self, console: tcod.Console) -> None:
+        """Render the parent and dim the result, redrawn only when the parent reports a change."""
+        def draw(layer: tcod.Console) -> None:
+            self.parent.on_render(layer)
+            dim(layer)
+
+        self.layers.blit(console, "parent", draw, key=self.parent.redraw_key())
+
+
+class PopupMessage(PopupHandler):
     """Display a popup text window."""
 
     def __init__(self, parent_handler: BaseEventHandler, text: str):
-        self.parent = parent_handler
+        super().__init__(parent_handler)
         self.text = text
 
     def on_render(self, console: tcod.Console) -> None:
         """Render the parent and dim the result, then print the message on top."""
-        self.parent.on_render(console)
-        console.rgb["fg"] //= 8
-        console.rgb["bg"] //= 8
+        self.render_parent(console)
         console.print(
             console.width // 2,
             console.height // 2,
@@ -121,20 +154,27 @@ class PopupMessage(BaseEventHandler):
         return self.parent
 
 
-class PopupScoreboard(BaseEventHandler):
+class PopupScoreboard(PopupHandler):
     """Display a popup text window with scoreboard."""
 
-    def __init__(self, parent_handler: BaseEventHandler, scores: list, name: str):
-        self.parent = parent_handler
-        self.scores = scores.split("\n")
+    def __init__(self, parent_handler: BaseEventHandler, name: str, limit: int = 20):
+        super().__init__(parent_handler)
         self.name = name
+        self.limit = limit
+        self.drawn_revision: object = None  # Of the leaderboard when the scores were last drawn.
+
+    def needs_redraw(self) -> bool:
+        """Keep drawing while the scoreboard loads, and draw again once a background sync changed it."""
+        return components.scoreboard.is_loading() or components.scoreboard.get_revision() != self.drawn_revision
 
     def on_render(self, console: tcod.Console) -> None:
-        """Render the parent and dim the result, then print the message on top."""
-        self.parent.on_render(console)
-        console.rgb["fg"] //= 8
-        console.rgb["bg"] //= 8
-        for i, s in enumerate(self.scores):
+        """Render the parent and dim the result, then print the message on top.
+        The scores are read from the local leaderboard, drawn again whenever a sync changes it.
+        """
+        self.render_parent(console)
+        self.drawn_revision = components.scoreboard.get_revision()
+        scores = components.scoreboard.get_score(limit=self.limit, name=self.name).split("\n")
+        for i, s in enumerate(scores):
             fg_color = color.white
             if self.name in s or "Best personal" in s:
                 fg_color = color.rose_red
@@ -153,11 +193,11 @@ class PopupScoreboard(BaseEventHandler):
         return self.parent
 
 
-class PopupMessageChangeKey(BaseEventHandler):
+class PopupMessageChangeKey(PopupHandler):
     """Display a popup text window when you change the settings."""
 
     def __init__(self, parent_handler: BaseEventHandler, text: str, selected: int, name="", menu=False):
-        self.parent = parent_handler
+        super().__init__(parent_handler)
         self.text = text
         self.selected = selected
         self.name = name
@@ -165,9 +205,7 @@ class PopupMessageChangeKey(BaseEventHandler):
 
     def on_render(self, console: tcod.Console) -> None:
         """Render the parent and dim the result, then print the message on top."""
-        self.parent.on_render(console)
-        console.rgb["fg"] //= 8
-        console.rgb["bg"] //= 8
+        self.render_parent(console)
         console.print(
             console.width // 2,
             console.height // 2,
@@ -256,21 +294,50 @@ class EventHandler(BaseEventHandler):
         if action is None:
             return False
 
+        recorder = self.engine.recorder
+        if recorder is not None:
+            recorder.record(action)
         try:
-            action.perform()
-        except exceptions.Impossible as exc:
-            self.engine.message_log.add_message(exc.args[0], color.impossible)
-            return False  # Skip enemy turn on exceptions.
-
-        self.engine.handle_enemy_turns()
-
-        self.engine.update_fov()
+            performed = self.perform_turn(action)
+            if performed and self.engine.rewind is not None:
+                self.engine.rewind.capture()
+            return performed
+        finally:
+            if recorder is not None:
+                recorder.checkpoint(self.engine)
+
+    def perform_turn(self, action: Action) -> bool:
+        """Perform the player's action and, if it was possible, the rest of the turn."""
+        with profiler.section("turn"):
+            try:
+                with profiler.section("player action"):
+                    action.perform()
+            except exceptions.Impossible as exc:
+                self.engine.message_log.add_message(exc.args[0], color.impossible)
+                return False  # Skip enemy turn on exceptions.
+
+            with profiler.section("enemy turns"):
+                self.engine.handle_enemy_turns()
+
+            with profiler.section("update fov"):
+                self.engine.update_fov()
+        self.engine.turn += 1
+        if log.perf_enabled:
+            log.perf(
+                "turn", turn=self.engine.turn, floor=self.engine.game_world.current_floor,
+                actors=sum(1 for _ in self.engine.game_map.actors),
+                **{f"{name.replace(' ', '_')}_ms": round(profiler.last[name], 3)
+                   for name in ("turn", "player action", "enemy turns", "update fov") if name in profiler.last},
+            )
         return True
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
         if self.engine.game_map.in_bounds(event.tile.x, event.tile.y):
             self.engine.mouse_location = event.tile.x, event.tile.y
 
+    def redraw_key(self) -> object:
+        return tuple(self.engine.game_map.revisions.counters.values())
+
     def on_render(self, console: tcod.Console) -> None:
         self.engine.render(console)
 
@@ -383,7 +450,6 @@ class LevelUpEventHandler(AskUserEventHandler):
             )
 
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[ActionOrHandler]:
-        player = self.engine.player
         key = event.sym
 
         if key in MOVE_KEYS:
@@ -401,13 +467,7 @@ class LevelUpEventHandler(AskUserEventHandler):
             raise exceptions.mainMenu()
 
         elif event.sym in CONFIRM_KEYS:
-            match self.SELECTED:
-                case 0:
-                    player.level.increase_max_hp()
-                case 1:
-                    player.level.increase_power()
-                case 2:
-                    player.level.increase_defense()
+            self.engine.level_up(self.SELECTED)  # Listed in the order of replay.LEVEL_UP_CHOICES.
         else:
             self.engine.message_log.add_message("Invalid entry.", color.invalid)
 
@@ -691,8 +751,26 @@ class MainGameEventHandler(EventHandler):
 
         elif key == INTERACTION_KEYS["stats"]:
             return CharacterScreenEventHandler(self.engine)
+        elif key == INTERACTION_KEYS["travel_stairs"]:
+            action = actions.TravelAction(player, "downstairs", "You are already on the stairs.")
+        elif key == INTERACTION_KEYS["explore"]:
+            action = actions.TravelAction(player, "frontier", "There is nothing left to explore.")
         elif key == tcod.event.KeySym.m:
             pass
+        elif key == INTERACTION_KEYS["undo"] and settings.data_settings["undo"]:
+            if self.engine.undo():
+                self.engine.message_log.add_message("You take back your last turn.")
+            else:
+                self.engine.message_log.add_message("There is nothing left to undo.", color.impossible)
+        elif key == tcod.event.KeySym.F3:
+            profiler.overlay = not profiler.overlay
+        elif key == tcod.event.KeySym.F4:
+            if profiler.trace:
+                trace_path, _ = profiler.export(settings.data.path_folder)
+                self.engine.message_log.add_message(f"Profile saved to {trace_path}")
+            else:
+                self.engine.message_log.add_message("Open the profiler with F3 to record a profile.", color.impossible)
+            self.engine.game_map.revisions.bump("ui")
         # No valid key was pressed
         return action
 
@@ -704,12 +782,24 @@ class GameOverEventHandler(EventHandler):
         super().__init__(engine)
         self.TITLE = "Scoreboard"
         self.name = settings.data_settings["name"]
-        score = int((self.engine.player.level.current_level / 2) * (150 * (self.engine.player.level.current_level - 1)) + self.engine.player.level.current_xp)
+        self.current_score = int((self.engine.player.level.current_level / 2) * (150 * (self.engine.player.level.current_level - 1)) + self.engine.player.level.current_xp)
+        self.get_score = components.scoreboard.get_score(limit=15, name=self.name)
+        self.drawn_revision: object = None  # Of the leaderboard when the scores were last drawn.
+
+    def needs_redraw(self) -> bool:
+        """Keep drawing while the scoreboard loads, and draw again once a background sync changed it."""
+        return components.scoreboard.is_loading() or components.scoreboard.get_revision() != self.drawn_revision
+
+    @property
+    def score(self) -> List[str]:
+        """The lines of the scoreboard and the rank of this run, from the local leaderboard.
+        The leaderboard is synced in the background, the lines are drawn again when it changes.
+        """
+        self.drawn_revision = components.scoreboard.get_revision()
         self.get_score = components.scoreboard.get_score(limit=15, name=self.name)
-        if self.get_score == "Timed out":
-            self.get_score = ""
-        self.score = self.get_score + f"Current score : {score}"
-        self.score = self.score.split("\n")
+        rank = components.scoreboard.get_rank(self.current_score)
+        place = f" (#{rank})" if rank else ""
+        return (self.get_score + f"Current score : {self.current_score}{place}").split("\n")
 
     def on_quit(self) -> None:
         """Handle exiting out of a finished game."""
@@ -733,6 +823,7 @@ class GameOverEventHandler(EventHandler):
 
         y = 0
 
+        score = self.score
         width = len(self.TITLE) + 15
         height = 3
         if self.get_score:
@@ -750,7 +841,7 @@ class GameOverEventHandler(EventHandler):
             bg=(0, 0, 0),
         )
 
-        for i, txt in enumerate(self.score[1:]):
+        for i, txt in enumerate(score[1:]):
             color_font = color.white
             if self.name in txt or "Current" in txt:
                 color_font = color.rose_red
@@ -773,13 +864,18 @@ class HistoryViewer(EventHandler):
 
     def __init__(self, engine: Engine):
         super().__init__(engine)
-        self.log_length = len(engine.message_log.messages)
+        self.log_length = len(engine.message_log)
         self.cursor = self.log_length - 1
+        self.log_console: Optional[tcod.Console] = None
 
     def on_render(self, console: tcod.Console) -> None:
         super().on_render(console)  # Draw the main state as the background.
 
-        log_console = tcod.Console(console.width - 6, console.height - 6)
+        # The window is allocated once and cleared on the next frames.
+        if self.log_console is None or self.log_console.width != console.width - 6 or self.log_console.height != console.height - 6:
+            self.log_console = tcod.Console(console.width - 6, console.height - 6)
+        log_console = self.log_console
+        log_console.clear()
 
         # Draw a frame with a custom banner title.
         log_console.draw_frame(0, 0, log_console.width, log_console.height)
@@ -787,14 +883,14 @@ class HistoryViewer(EventHandler):
             0, 0, log_console.width, 1, "┤Message history├", alignment=tcod.CENTER
         )
 
-        # Render the message log using the cursor parameter.
-        self.engine.message_log.render_messages(
+        # Render the message log using the cursor parameter, archived messages are read as needed.
+        self.engine.message_log.render_history(
             log_console,
             1,
             1,
             log_console.width - 2,
             log_console.height - 2,
-            self.engine.message_log.messages[: self.cursor + 1],
+            end=self.cursor + 1,
         )
         log_console.blit(console, 3, 3)
 
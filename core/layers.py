@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Hashable, Tuple
+
+from tcod.console import Console
+
+
+class LayerCache:
+    """Offscreen consoles holding the static parts of a screen.
+
+    A layer is drawn once and then copied onto the frame with a single blit,
+    until its key or the console size changes.
+    """
+
+    def __init__(self) -> None:
+        self._layers: Dict[str, Tuple[Hashable, Console]] = {}
+        self.draws = 0
+        self.blits = 0
+
+    def blit(
+            self, console: Console, name: str, draw: Callable[[Console], None], key: Hashable = None
+    ) -> None:
+        """Copy the layer called `name` onto `console`, drawing it with `draw` first if needed.
+        `key` describes the content of the layer, a different key redraws it.
+        """
+        cached = self._layers.get(name)
+        if cached is None or cached[0] != key or cached[1].rgb.shape != console.rgb.shape:
+            layer = Console(console.width, console.height, order="F")
+            draw(layer)
+            self._layers[name] = cached = key, layer
+            self.draws += 1
+
+        console.rgba[...] = cached[1].rgba
+        self.blits += 1
+
+    def invalidate(self, name: str = None) -> None:
+        """Forget one layer, or all of them, so they are drawn again on the next blit."""
+        if name is None:
+            self._layers.clear()
+        else:
+            self._layers.pop(name, None)
+
+
+def dim(console: Console) -> None:
+    """Darken everything drawn on the console, used behind popups."""
+    console.rgb["fg"] //= 8
+    console.rgb["bg"] //= 8
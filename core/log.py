@@ -0,0 +1,103 @@
+"""
+Where the game's logs are written, off the game thread.
+
+Log calls only put the record on a queue, a background thread formats and writes them to
+`The_Lost_Mind.log` in the settings folder. The file is rotated when it grows past MAX_BYTES and
+BACKUPS older ones are kept. With `LOST_MIND_PERF_LOG=1` in the environment, the timings of every
+turn are also written as JSON lines to `perf.jsonl`, through the same thread:
+    {"time": 1700000000.123, "event": "turn", "turn": 12, "floor": 1, "turn_ms": 1.9, ...}
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Optional
+
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_FILE = "The_Lost_Mind.log"
+PERF_FILE = "perf.jsonl"
+MAX_BYTES = 2 * 2 ** 20
+BACKUPS = 3
+
+# Structured events, kept out of the game log.
+perf_logger = logging.getLogger("perf")
+perf_logger.propagate = False
+perf_enabled = False  # Checked before building an event, so they cost nothing when turned off.
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object a line, the event name and the fields given to `perf`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({"time": round(record.created, 3), "event": record.getMessage(), **getattr(record, "fields", {})})
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Queues the record as it is, its message is formatted by the writer thread.
+    Only a traceback is formatted right away, the frames it refers to change as the game goes on.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup(folder: str, level: int = logging.DEBUG, perf_events: Optional[bool] = None) -> None:
+    """Send the logs of the game and, if enabled, its performance events to files in `folder`."""
+    global _listener, perf_enabled
+    if _listener is not None:
+        return
+    if perf_events is None:
+        perf_events = os.environ.get("LOST_MIND_PERF_LOG", "") not in ("", "0")
+
+    game_log = logging.handlers.RotatingFileHandler(
+        os.path.join(folder, LOG_FILE), maxBytes=MAX_BYTES, backupCount=BACKUPS, encoding="utf-8", delay=True
+    )
+    game_log.setFormatter(logging.Formatter(FORMAT))
+    game_log.addFilter(lambda record: record.name != perf_logger.name)  # The events go to their own file.
+    handlers = [game_log]
+    if perf_events:
+        perf_log = logging.handlers.RotatingFileHandler(
+            os.path.join(folder, PERF_FILE), maxBytes=MAX_BYTES, backupCount=BACKUPS, encoding="utf-8", delay=True
+        )
+        perf_log.setFormatter(JsonLinesFormatter())
+        perf_log.addFilter(lambda record: record.name == perf_logger.name)
+        handlers.append(perf_log)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    queued = QueueHandler(records)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queued)
+    perf_logger.addHandler(queued)
+    perf_logger.setLevel(logging.INFO)
+    perf_enabled = perf_events
+
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop)
+
+
+def stop() -> None:
+    """Write what is still queued and stop the writer thread."""
+    global _listener, perf_enabled
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        perf_enabled = False
+
+
+def perf(event: str, **fields: object) -> None:
+    """Queue a structured performance event, `fields` are written as they are in its JSON line."""
+    if perf_enabled:
+        perf_logger.info(event, extra={"fields": fields})
@@ -1,16 +1,38 @@
+import glob
+import json
+import os
 import textwrap
-from typing import Iterable, List, Reversible, Tuple
+from array import array
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Reversible, Tuple
 
 import tcod
 
 import core.color as color
 
+# How many messages are kept in memory, older ones are moved to the archive.
+MESSAGE_CAPACITY = 1000
+# Every game archives its messages to its own file, named after the seed and a random id.
+ARCHIVE_NAME = "message_archive_{seed:08x}_{id}.log"
+ARCHIVE_GLOB = "message_archive_*.log"
+
 
 class Message:
 	def __init__(self, text: str, fg: Tuple[int, int, int]):
 		self.plain_text = text
 		self.fg = fg
 		self.count = 1
+		self._wrapped: Dict[int, Tuple[str, Tuple[str, ...]]] = {}
+
+	def __getstate__(self) -> dict:
+		"""Leave the wrapped lines out of saves."""
+		state = self.__dict__.copy()
+		state["_wrapped"] = {}
+		return state
+
+	def __setstate__(self, state: dict) -> None:
+		state.setdefault("_wrapped", {})
+		self.__dict__.update(state)
 
 	@property
 	def full_text(self) -> str:
@@ -18,10 +40,128 @@ class Message:
 		if self.count > 1:
 			return f"{self.plain_text} (x{self.count})"
 		return self.plain_text
-	
+
+	def wrapped(self, width: int) -> Tuple[str, ...]:
+		"""Return the lines of this message wrapped to `width`, cached until the text changes"""
+		text = self.full_text
+		cached = self._wrapped.get(width)
+		if cached is None or cached[0] != text:
+			cached = text, tuple(MessageLog.wrap(text, width))
+			self._wrapped[width] = cached
+		return cached[1]
+
+
+class MessageArchive:
+	"""Append only file of the messages pushed out of a MessageLog, read back by index.
+	Each message is one JSON line, the offset of every line is kept in memory.
+	Lines are written in batches of `FLUSH_EVERY`, anything pending is written before reading or saving.
+	A file that already exists is never cut short, the messages are appended after what it holds.
+	"""
+	FLUSH_EVERY = 64
+
+	def __init__(self, path: str) -> None:
+		self.path = path
+		self.count = 0
+		self.start = os.path.getsize(path) if os.path.isfile(path) else 0  # Where this archive's lines begin.
+		self._offsets: Optional[array] = array("q")
+		self._pending: List[bytes] = []
+
+	def __getstate__(self) -> dict:
+		"""Only the path and the length are saved, the offsets are read from the file again."""
+		self.flush()
+		return {"path": self.path, "count": self.count, "start": self.start, "_offsets": None, "_pending": []}
+
+	def __setstate__(self, state: dict) -> None:
+		state.setdefault("start", 0)
+		self.__dict__.update(state)
+
+	def __len__(self) -> int:
+		return self.count
+
+	@property
+	def offsets(self) -> array:
+		"""Offsets of each message in the file, scanned again after loading a save."""
+		if self._offsets is None:
+			self._offsets = array("q")
+			if os.path.isfile(self.path):
+				with open(self.path, "rb") as f:
+					f.seek(self.start)
+					offset = self.start
+					for line in f:
+						if len(self._offsets) == self.count:
+							break
+						self._offsets.append(offset)
+						offset += len(line)
+		return self._offsets
+
+	def append(self, message: Message) -> None:
+		"""Add a message at the end of the archive."""
+		self._pending.append(json.dumps([message.plain_text, message.fg, message.count]).encode() + b"\n")
+		self.count += 1
+		if len(self._pending) >= self.FLUSH_EVERY:
+			self.flush()
+
+	def flush(self) -> None:
+		"""Write the pending messages to the file."""
+		if not self._pending:
+			return
+		offsets = self.offsets
+		with open(self.path, "ab") as f:
+			offset = f.tell()
+			for line in self._pending:
+				offsets.append(offset)
+				offset += len(line)
+			f.write(b"".join(self._pending))
+		self._pending.clear()
+
+	def read(self, start: int, stop: int) -> Iterator[Message]:
+		"""Yield the messages from index `start` up to `stop`, oldest first."""
+		self.flush()
+		offsets = self.offsets
+		with open(self.path, "rb") as f:
+			for index in range(start, stop):
+				if index >= len(offsets):
+					# The archive file went missing or was cut short.
+					yield Message("(This message is no longer available)", color.impossible)
+					continue
+				f.seek(offsets[index])
+				text, fg, count = json.loads(f.readline())
+				message = Message(text, tuple(fg))
+				message.count = count
+				yield message
+
+
+def remove_archives(folder: str, keep: Optional[str] = None) -> None:
+	"""Delete the message archives in `folder` of games that are no longer saved, all but `keep`."""
+	keep = os.path.abspath(keep) if keep else None
+	for path in glob.glob(os.path.join(folder, ARCHIVE_GLOB)):
+		if os.path.abspath(path) != keep:
+			try:
+				os.remove(path)
+			except OSError:
+				pass  # In use or already gone, tried again with the next save.
+
+
 class MessageLog:
-	def __init__(self) -> None:
-		self.messages: List[Message] = []
+	def __init__(self, capacity: Optional[int] = MESSAGE_CAPACITY, archive_path: Optional[str] = None) -> None:
+		"""Keep the last `capacity` messages in memory, every message if it is None.
+		Older messages are appended to the file at `archive_path`, or forgotten if there is none.
+		"""
+		self.messages: Deque[Message] = deque(maxlen=capacity)
+		self.archive = MessageArchive(archive_path) if archive_path else None
+		self.dropped = 0  # Messages pushed out of memory, archived or not.
+
+	def __setstate__(self, state: dict) -> None:
+		"""Restore a pickled log, saves made before the ring buffer stored a plain list."""
+		if isinstance(state["messages"], list):
+			state["messages"] = deque(state["messages"][-MESSAGE_CAPACITY:], maxlen=MESSAGE_CAPACITY)
+			state["archive"] = None
+			state["dropped"] = 0
+		self.__dict__.update(state)
+
+	def __len__(self) -> int:
+		"""The number of messages ever added, including archived ones."""
+		return self.dropped + len(self.messages)
 
 	def add_message(
 			self, text: str, fg: Tuple[int, int, int] = color.white, *, stack: bool = True
@@ -33,16 +173,42 @@ class MessageLog:
 		if stack and self.messages and text == self.messages[-1].plain_text:
 			self.messages[-1].count += 1
 		else:
+			if len(self.messages) == self.messages.maxlen:
+				if self.archive is not None:
+					self.archive.append(self.messages[0])
+				self.dropped += 1
 			self.messages.append(Message(text, fg))
 
+	def iter_back(self, end: int) -> Iterator[Message]:
+		"""Yield the messages before index `end`, newest first.
+		Archived messages are read from disk a page at a time, only as far as the caller iterates.
+		"""
+		end = min(end, len(self))
+		for index in range(end - 1, self.dropped - 1, -1):
+			yield self.messages[index - self.dropped]
+
+		if self.archive is None:
+			return
+		stop = min(end, self.dropped, len(self.archive))
+		while stop > 0:
+			start = max(0, stop - 64)
+			yield from reversed(list(self.archive.read(start, stop)))
+			stop = start
+
 	def render(
 			self, console: tcod.console.Console, x: int, y: int, width: int, height: int
 	) -> None:
 		"""Render this log over the given area.
 		`x`, `y`, `width`, `height` is the rectrangular region to render onto the `console`
 		"""
-		self.render_messages(console, x, y, width, height, self.messages)
-	
+		self.render_newest_first(console, x, y, width, height, reversed(self.messages))
+
+	def render_history(
+			self, console: tcod.console.Console, x: int, y: int, width: int, height: int, end: int
+	) -> None:
+		"""Render the messages before index `end` over the given area, reading archived ones as needed."""
+		self.render_newest_first(console, x, y, width, height, self.iter_back(end))
+
 	@staticmethod
 	def wrap(string: str, width: int) -> Iterable[str]:
 		"""Return a wrapped text message"""
@@ -62,11 +228,25 @@ class MessageLog:
 		"""Render the messages provided.
 		The `messages` are rendered starting at the last message and working backwards
 		"""
+		cls.render_newest_first(console, x, y, width, height, reversed(messages))
+
+	@staticmethod
+	def render_newest_first(
+		console: tcod.console.Console,
+		x: int,
+		y: int,
+		width: int,
+		height: int,
+		messages: Iterable[Message]
+	) -> None:
+		"""Render messages from the bottom of the area up, `messages` must yield the newest first.
+		Iteration stops as soon as the area is full.
+		"""
 		y_offset = height - 1
 
-		for message in reversed(messages):
-			for line in reversed(list(cls.wrap(message.full_text, width))):
+		for message in messages:
+			for line in reversed(message.wrapped(width)):
 				console.print(x=x, y=y + y_offset, string=line, fg=message.fg)
 				y_offset -= 1
 				if y_offset < 0:
-					return
\ No newline at end of file
+					return
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from tcod.console import Console
+
+import core.color as color
+
+# How many timed sections are kept for the trace export, older ones are dropped.
+TRACE_CAPACITY = 200_000
+# Keep the trace from the start, for the whole game, with `LOST_MIND_TRACE=1` in the environment.
+TRACE_ENV = "LOST_MIND_TRACE"
+# How many frame and turn times the overlay averages over.
+HISTORY = 120
+
+
+class Section:
+    """Context manager timing one block of code, made by `Profiler.section`."""
+
+    __slots__ = ("profiler", "name", "category", "start")
+
+    def __init__(self, profiler: Profiler, name: str, category: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+
+    def __enter__(self) -> Section:
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.profiler.record(self.name, self.category, self.start, time.perf_counter_ns() - self.start)
+
+
+class Profiler:
+    """
+    Records how long the phases of a turn, a frame and floor generation take.
+
+    While the overlay is open, or `tracing` is set, every section is kept in a bounded trace along
+    with the floor it ran on, so the trace can be exported and compared between shallow and deep
+    floors. Frame and turn times, and the last time of each section, are always kept for the overlay.
+    """
+
+    def __init__(self, capacity: int = TRACE_CAPACITY) -> None:
+        self.enabled = True
+        self.overlay = False
+        self.tracing = os.environ.get(TRACE_ENV, "") not in ("", "0")
+        self.floor = 0
+        self.origin = time.perf_counter_ns()
+        # (name, category, floor, start ns, duration ns)
+        self.trace: Deque[Tuple[str, str, int, int, int]] = deque(maxlen=capacity)
+        self.frame_times: Deque[float] = deque(maxlen=HISTORY)
+        self.turn_times: Deque[float] = deque(maxlen=HISTORY)
+        self.last: Dict[str, float] = {}
+
+    def section(self, name: str, category: str = "game") -> Section:
+        """Time the code inside a `with` block as `name`, grouped under `category`."""
+        return Section(self, name, category)
+
+    def record(self, name: str, category: str, start: int, duration: int) -> None:
+        """Add a finished section, `start` and `duration` are in nanoseconds."""
+        if not self.enabled:
+            return
+        if self.overlay or self.tracing:
+            self.trace.append((name, category, self.floor, start, duration))
+        self.last[name] = duration / 1e6
+        if name == "frame":
+            self.frame_times.append(duration / 1e6)
+        elif name == "turn":
+            self.turn_times.append(duration / 1e6)
+
+    def clear(self) -> None:
+        """Forget everything recorded so far."""
+        self.trace.clear()
+        self.frame_times.clear()
+        self.turn_times.clear()
+        self.last.clear()
+
+    def totals(self) -> List[Tuple[str, str, int, int, float, float, float]]:
+        """Return (name, category, floor, calls, total ms, mean ms, max ms) for every section and floor."""
+        totals: Dict[Tuple[str, str, int], List[float]] = {}
+        for name, category, floor, _, duration in self.trace:
+            total = totals.setdefault((name, category, floor), [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += duration / 1e6
+            total[2] = max(total[2], duration / 1e6)
+        return [
+            (name, category, floor, int(calls), total, total / calls, longest)
+            for (name, category, floor), (calls, total, longest) in sorted(
+                totals.items(), key=lambda item: (item[0][2], item[0][1], item[0][0])
+            )
+        ]
+
+    def export_chrome_trace(self, path: str) -> None:
+        """Write the trace as Chrome trace events, open it with chrome://tracing or Perfetto."""
+        events = [
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self.origin) / 1000,
+                "dur": duration / 1000,
+                "pid": 1,
+                "tid": 1,
+                "args": {"floor": floor},
+            }
+            for name, category, floor, start, duration in self.trace
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def export_csv(self, path: str) -> None:
+        """Write the time spent in each section per floor as CSV."""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("section", "category", "floor", "calls", "total_ms", "mean_ms", "max_ms"))
+            for name, category, floor, calls, total, mean, longest in self.totals():
+                writer.writerow((name, category, floor, calls, f"{total:.3f}", f"{mean:.3f}", f"{longest:.3f}"))
+
+    def export(self, folder: str) -> Tuple[str, str]:
+        """Write both exports into `folder` with a timestamped name and return their paths."""
+        stem = f"{folder}profile_{time.strftime('%Y%m%d_%H%M%S')}"
+        self.export_chrome_trace(stem + ".json")
+        self.export_csv(stem + ".csv")
+        return stem + ".json", stem + ".csv"
+
+    def render_overlay(self, console: Console, x: int = 0, y: int = 0) -> None:
+        """Draw the average and worst frame and turn time, and the last time of each turn phase."""
+        lines = [
+            self.describe("frame", self.frame_times),
+            self.describe("turn", self.turn_times),
+        ]
+        lines += [
+            f"{name:<13}{self.last[name]:7.2f} ms"
+            for name in ("player action", "enemy turns", "update fov", "generate floor")
+            if name in self.last
+        ]
+        width = max(len(line) for line in lines) + 2
+        console.draw_rect(x, y, width, len(lines) + 2, ch=ord(" "), bg=(0, 0, 0))
+        for n, line in enumerate(lines):
+            console.print(x + 1, y + 1 + n, line, fg=color.white)
+
+    @staticmethod
+    def describe(name: str, times: Deque[float]) -> str:
+        """One overlay line for a series of times in milliseconds."""
+        if not times:
+            return f"{name:<13}     -- ms"
+        return f"{name:<13}{sum(times) / len(times):7.2f} ms (max {max(times):.2f})"
+
+
+# The profiler used by the game, sections from anywhere end up in the same trace.
+profiler = Profiler()
+
@@ -14,7 +14,7 @@ def get_names_at_location(x: int, y: int, game_map: GameMap) -> str:
 		return ""
 	
 	names = ", ".join(
-		entity.name for entity in game_map.entities if entity.x == x and entity.y == y
+		entity.name for entity in game_map.entities.at(x, y)
 	)
 	return names.capitalize()
 
@@ -49,12 +49,16 @@ def render_names_at_mouse_location(
 		console: Console, x: int, y: int, engine: Engine, bg=(0, 0, 0)
 ) -> None:
 	mouse_x, mouse_y = engine.mouse_location
+	game_map = engine.game_map
 
-	names_at_mouse_location = get_names_at_location(
-		x=mouse_x, y=mouse_y, game_map=engine.game_map
-	)
-	
-	if len(names_at_mouse_location) > 58:
-		names_at_mouse_location = names_at_mouse_location[:55] + "..."
+	# Only look the names up again when something under the mouse could have changed.
+	if game_map.revisions.needs_update("names_at_mouse", "entities", "fov", key=(mouse_x, mouse_y)):
+		names_at_mouse_location = get_names_at_location(
+			x=mouse_x, y=mouse_y, game_map=game_map
+		)
+
+		if len(names_at_mouse_location) > 58:
+			names_at_mouse_location = names_at_mouse_location[:55] + "..."
+		game_map.names_at_mouse = names_at_mouse_location
 
-	console.print(x=x, y=y, string=names_at_mouse_location, bg=(90, 90, 90))
\ No newline at end of file
+	console.print(x=x, y=y, string=game_map.names_at_mouse, bg=(90, 90, 90))
\ No newline at end of file
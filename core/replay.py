@@ -0,0 +1,267 @@
+"""Record the seed and every player action of a game, and play the record back without a window.
+
+A record is a small binary file: a header with the seed, then one entry per dispatched action or
+level up choice, each optionally followed by a CRC32 of the game state after it. Replaying a
+record rebuilds the same game from the seed and performs the same actions as fast as possible,
+stopping at the first entry whose state checksum differs from the recorded one.
+
+Replay a record from the project folder:
+    python -m core.replay path/to/last_run.lmr
+"""
+from __future__ import annotations
+
+import argparse
+import struct
+import time
+import zlib
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, Iterator, Optional, Tuple, Type
+
+import numpy as np  # type: ignore
+
+import core.actions as actions
+from game.entity import Actor
+
+if TYPE_CHECKING:
+    from core.engine import Engine
+
+MAGIC = b"LMRP"
+VERSION = 1
+FLAG_CHECKSUMS = 1
+
+HEADER = struct.Struct("<4sBBQ")  # Magic, version, flags, seed.
+OPCODE = struct.Struct("<B")
+DIRECTION = struct.Struct("<bb")
+INDEX = struct.Struct("<B")
+TARGET = struct.Struct("<Bhh")  # Inventory index, target x, target y.
+CHECKSUM = struct.Struct("<I")
+
+# Opcodes of the entries.
+WAIT, BUMP, MELEE, MOVE, PICKUP, STAIRS, TRAVEL, ITEM, DROP, EQUIP, LEVEL_UP, UNDO = range(12)
+
+DIRECTION_ACTIONS: Dict[int, Type[actions.ActionWithDirection]] = {
+    BUMP: actions.BumpAction,
+    MELEE: actions.MeleeAction,
+    MOVE: actions.MovementAction,
+}
+
+# The level up choices, in the order of the level up screen.
+LEVEL_UP_CHOICES = ("increase_max_hp", "increase_power", "increase_defense")
+
+
+class ReplayDivergence(Exception):
+    """The game state during a replay differs from the recorded one."""
+
+
+def state_checksum(engine: Engine) -> int:
+    """CRC32 of the map arrays, every entity on the map and the player's stats and inventory."""
+    game_map = engine.game_map
+    crc = zlib.crc32(np.ascontiguousarray(game_map.tiles).view(np.uint8))
+    crc = zlib.crc32(np.packbits(game_map.visible), crc)
+    crc = zlib.crc32(np.packbits(game_map.explored), crc)
+
+    state = [engine.game_world.current_floor, engine.turn]
+    for entity in game_map.entities:
+        state.append((entity.name, entity.x, entity.y, entity.char))
+        if isinstance(entity, Actor):
+            fighter = entity.fighter
+            state.append((fighter.hp, fighter.max_hp, fighter.base_power, fighter.base_defense))
+    level = engine.player.level
+    state.append((level.current_level, level.current_xp))
+    state.append(tuple(item.name for item in engine.player.inventory.items))
+    return zlib.crc32(repr(state).encode(), crc)
+
+
+def encode_action(action: actions.Action) -> bytes:
+    """Pack a player action into an entry, without the checksum."""
+    inventory = action.entity.inventory.items
+
+    if isinstance(action, actions.ActionWithDirection):
+        for opcode, cls in DIRECTION_ACTIONS.items():
+            if type(action) is cls:
+                return OPCODE.pack(opcode) + DIRECTION.pack(action.dx, action.dy)
+    elif isinstance(action, actions.WaitAction):
+        return OPCODE.pack(WAIT)
+    elif isinstance(action, actions.PickupAction):
+        return OPCODE.pack(PICKUP)
+    elif isinstance(action, actions.TakeStairsAction):
+        return OPCODE.pack(STAIRS)
+    elif isinstance(action, actions.TravelAction):
+        goal = action.goal.encode()
+        return OPCODE.pack(TRAVEL) + INDEX.pack(len(goal)) + goal
+    elif isinstance(action, actions.DropItem):
+        return OPCODE.pack(DROP) + INDEX.pack(inventory.index(action.item))
+    elif isinstance(action, actions.ItemAction):
+        return OPCODE.pack(ITEM) + TARGET.pack(inventory.index(action.item), *action.target_xy)
+    elif isinstance(action, actions.EquipAction):
+        return OPCODE.pack(EQUIP) + INDEX.pack(inventory.index(action.item))
+    raise TypeError(f"Can not record {type(action).__name__}.")
+
+
+def decode_entry(stream: BinaryIO, engine: Engine) -> Optional[Tuple[int, object]]:
+    """Read the next entry, returning its opcode and the action or level up choice it describes.
+    Returns None at the end of the record.
+    """
+    raw = stream.read(OPCODE.size)
+    if not raw:
+        return None
+    (opcode,) = OPCODE.unpack(raw)
+    player = engine.player
+    inventory = player.inventory.items
+
+    if opcode in DIRECTION_ACTIONS:
+        return opcode, DIRECTION_ACTIONS[opcode](player, *DIRECTION.unpack(stream.read(DIRECTION.size)))
+    if opcode == WAIT:
+        return opcode, actions.WaitAction(player)
+    if opcode == PICKUP:
+        return opcode, actions.PickupAction(player)
+    if opcode == STAIRS:
+        return opcode, actions.TakeStairsAction(player)
+    if opcode == UNDO:
+        return opcode, None
+    if opcode == TRAVEL:
+        (length,) = INDEX.unpack(stream.read(INDEX.size))
+        return opcode, actions.TravelAction(player, stream.read(length).decode())
+    if opcode in (DROP, EQUIP, LEVEL_UP):
+        (index,) = INDEX.unpack(stream.read(INDEX.size))
+        if opcode == LEVEL_UP:
+            return opcode, index
+        cls = actions.DropItem if opcode == DROP else actions.EquipAction
+        return opcode, cls(player, inventory[index])
+    if opcode == ITEM:
+        index, x, y = TARGET.unpack(stream.read(TARGET.size))
+        action = actions.ItemAction(player, inventory[index])
+        action.target_xy = x, y  # Recorded in map coordinates already.
+        return opcode, action
+    raise ValueError(f"Unknown replay opcode {opcode}.")
+
+
+class Recorder:
+    """Writes the entries of one game to a record file as they happen."""
+
+    def __init__(self, path: str, seed: int, checksums: bool = True) -> None:
+        self.path = path
+        self.checksums = checksums
+        self.entries = 0
+        self.file: Optional[BinaryIO] = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, FLAG_CHECKSUMS if checksums else 0, seed))
+
+    def record(self, action: actions.Action) -> None:
+        """Write a dispatched action, before it is performed."""
+        self.write(encode_action(action))
+
+    def record_level_up(self, choice: int) -> None:
+        """Write the level up choice, an index into LEVEL_UP_CHOICES."""
+        self.write(OPCODE.pack(LEVEL_UP) + INDEX.pack(choice))
+
+    def record_undo(self) -> None:
+        """Write that the last turn was undone."""
+        self.write(OPCODE.pack(UNDO))
+
+    def write(self, entry: bytes) -> None:
+        """Append an encoded entry."""
+        if self.file is not None:
+            self.file.write(entry)
+            self.entries += 1
+
+    def checkpoint(self, engine: Engine) -> None:
+        """Write the checksum of the state after the last entry, if this record has them."""
+        if self.file is not None and self.checksums:
+            self.file.write(CHECKSUM.pack(state_checksum(engine)))
+
+    def close(self) -> None:
+        """Finish the record, further entries are ignored."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ReplayResult:
+    """What a replay did, and where it diverged if it did."""
+
+    def __init__(self, seed: int) -> None:
+        self.seed = seed
+        self.entries = 0
+        self.turns = 0
+        self.seconds = 0.0
+        self.diverged_at: Optional[int] = None
+
+    @property
+    def turns_per_second(self) -> float:
+        return self.turns / max(self.seconds, 1e-9)
+
+
+def read_header(stream: BinaryIO) -> Tuple[int, bool]:
+    """Check the header of a record and return its seed and whether it has checksums."""
+    magic, version, flags, seed = HEADER.unpack(stream.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a replay record, or one made by another version of the game.")
+    return seed, bool(flags & FLAG_CHECKSUMS)
+
+
+def replay(
+        path: str,
+        new_game: Callable[[int], Engine],
+        verify: bool = True,
+        strict: bool = False,
+) -> ReplayResult:
+    """Play a record back headlessly.
+    `new_game` builds the starting Engine from the recorded seed.
+    With `verify` the state is compared against the recorded checksums, `strict` raises
+    ReplayDivergence at the first difference instead of stopping there.
+    """
+    import core.input_handlers as input_handlers
+
+    with open(path, "rb") as stream:
+        seed, has_checksums = read_header(stream)
+        result = ReplayResult(seed)
+        engine = new_game(seed)
+        handler = input_handlers.MainGameEventHandler(engine)
+
+        start = time.perf_counter()
+        for opcode, entry in iter_entries(stream, engine):
+            if opcode == LEVEL_UP:
+                engine.level_up(entry)
+            elif opcode == UNDO:
+                engine.undo()
+            elif handler.handle_action(entry):
+                result.turns += 1
+            result.entries += 1
+
+            if has_checksums:
+                (expected,) = CHECKSUM.unpack(stream.read(CHECKSUM.size))
+                if verify and state_checksum(engine) != expected:
+                    result.diverged_at = result.entries
+                    if strict:
+                        raise ReplayDivergence(f"State differs from the record after entry {result.entries}.")
+                    break
+        result.seconds = time.perf_counter() - start
+    return result
+
+
+def iter_entries(stream: BinaryIO, engine: Engine) -> Iterator[Tuple[int, object]]:
+    """Decode the entries of a record one at a time, against the current state of `engine`."""
+    while True:
+        entry = decode_entry(stream, engine)
+        if entry is None:
+            return
+        yield entry
+
+
+def main() -> None:
+    import game.setup_game as setup_game
+
+    parser = argparse.ArgumentParser(description="Play back a recorded game without a window.")
+    parser.add_argument("record")
+    parser.add_argument("--no-verify", action="store_true", help="Skip comparing the state checksums.")
+    args = parser.parse_args()
+
+    result = replay(args.record, lambda seed: setup_game.new_game(seed, archive=False), verify=not args.no_verify)
+    print(f"seed {result.seed}: {result.entries} entries, {result.turns} turns in {result.seconds:.3f}s "
+          f"({result.turns_per_second:.0f} turns/sec)")
+    if result.diverged_at is not None:
+        print(f"Diverged from the record after entry {result.diverged_at}.")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import random
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+from core.engine import FOV_RADIUS
+from game.entity_index import EntitySet
+
+if TYPE_CHECKING:
+    from core.engine import Engine
+    from game.entity import Entity
+    from game.game_map import GameMap
+
+# How many turns are kept by default, and how much memory they may use.
+REWIND_TURNS = 200
+REWIND_BUDGET = 8 * 1024 * 1024
+
+# Components whose fields are part of an entity's state.
+COMPONENTS = ("fighter", "level", "equipment", "inventory", "ai", "consumable", "equippable")
+
+# Rough size of a saved state of the random module, 625 ints.
+RANDOM_STATE_SIZE = 2500
+
+EntityState = Tuple[Dict[str, object], Tuple[Tuple[object, Dict[str, object]], ...]]
+
+
+def fields(obj: object) -> Dict[str, object]:
+    """Shallow copy of an object's attributes, lists are copied so later changes don't leak in."""
+    return fields_copy(vars(obj))
+
+
+def entity_state(entity: Entity) -> EntityState:
+    """The attributes of an entity and of each of its components."""
+    components = tuple(
+        (component, fields(component))
+        for component in (getattr(entity, name, None) for name in COMPONENTS)
+        if component is not None
+    )
+    return fields(entity), components
+
+
+def restore_entity(entity: Entity, state: EntityState) -> None:
+    """Put an entity and its components back in a state returned by `entity_state`."""
+    attributes, components = state
+    entity.__dict__.clear()
+    entity.__dict__.update(fields_copy(attributes))
+    for component, values in components:
+        component.__dict__.clear()
+        component.__dict__.update(fields_copy(values))
+
+
+def fields_copy(values: Dict[str, object]) -> Dict[str, object]:
+    """Copy of an attribute dict that doesn't share its lists."""
+    values = values.copy()
+    for key, value in values.items():
+        if value.__class__ is list:
+            values[key] = value.copy()
+    return values
+
+
+class Snapshot:
+    """What one turn changed, holding the values from before the turn."""
+
+    __slots__ = (
+        "turn", "floor", "game_map", "player_xy", "random_state", "cells", "tiles", "entities", "members", "size"
+    )
+
+    def __init__(
+            self, turn: int, floor: Tuple[int, int, int], player_xy: Tuple[int, int], random_state: object
+    ) -> None:
+        self.turn = turn
+        self.random_state = random_state  # So turns played again after a rewind roll the same.
+        self.floor = floor  # GameWorld current_floor, map_width and map_height.
+        self.player_xy = player_xy
+        self.game_map: Optional[GameMap] = None  # The previous map, when the turn changed floors.
+        self.cells: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+        self.tiles: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self.entities: List[Tuple[Entity, EntityState]] = []
+        self.members: Optional[List[Entity]] = None
+        self.size = 0
+
+
+class RewindBuffer:
+    """
+    The last turns of a game as deltas, so the game can be stepped back one turn at a time.
+
+    A shadow of the state after the last captured turn is kept. Capturing compares the game
+    against it only where a turn can change anything: the cells around the player's old and
+    new position for the FOV arrays, the whole tile array only when its revision moved, the
+    entities touched during the turn (see `Entity.mark_changed` and `Entity.mark_state_changed`)
+    along with the player and its items, and the list of entities only when one was added or
+    removed. The snapshot stores the previous values of what differs, so its cost follows the
+    size of the turn's changes. Old snapshots are dropped past `turns` or `budget` bytes.
+    """
+
+    def __init__(self, engine: Engine, turns: int = REWIND_TURNS, budget: int = REWIND_BUDGET) -> None:
+        self.engine = engine
+        self.turns = turns
+        self.budget = budget
+        self.snapshots: Deque[Snapshot] = deque()
+        self.size = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget every snapshot and take the current state as the new shadow."""
+        self.snapshots.clear()
+        self.size = 0
+        self._shadow_map(self.engine.game_map)
+        self._states: Dict[Entity, EntityState] = {
+            entity: entity_state(entity)
+            for entity in list(self.engine.game_map.entities) + self.engine.player.inventory.items
+        }
+        self.engine.game_map.entities.take_touched()
+        self._inventory = list(self.engine.player.inventory.items)
+        self._members = list(self.engine.game_map.entities)
+        self._stamp_members()
+        self._turn = self.engine.turn
+        self._floor = self._world_state()
+        self._player_xy = self.engine.player.x, self.engine.player.y
+        self._random = random.getstate()
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    def capture(self) -> None:
+        """Store what changed since the previous capture, call after every turn."""
+        engine = self.engine
+        game_map = engine.game_map
+        snapshot = Snapshot(self._turn, self._floor, self._player_xy, self._random)
+        snapshot.size += RANDOM_STATE_SIZE
+
+        new_floor = game_map is not self._map
+        touched = self._map.entities.take_touched()
+        if new_floor:
+            touched += game_map.entities.take_touched()
+            # A new floor, the old map object is kept whole as it was left.
+            snapshot.game_map = self._map
+            snapshot.size += self._map.tiles.nbytes + self._map.visible.nbytes * 2
+            self._shadow_map(game_map)
+        else:
+            self._capture_cells(snapshot)
+
+        player = engine.player
+        inventory = list(player.inventory.items)
+        # Items that left the inventory are compared too, they were used up or dropped.
+        for entity in dict.fromkeys([*touched, player, *self._inventory, *inventory]):
+            state = entity_state(entity)
+            previous = self._states.get(entity)
+            if previous != state:
+                snapshot.entities.append((entity, previous))
+                self._states[entity] = state
+                snapshot.size += 64 * (1 + len(state[1]))
+        self._inventory = inventory
+        if new_floor:
+            for entity in game_map.entities:
+                if entity not in self._states:
+                    self._states[entity] = entity_state(entity)
+
+        if game_map.entities is not self._entity_set or game_map.entities.changes != self._entity_changes:
+            members = list(game_map.entities)
+            if members != self._members:
+                snapshot.members = self._members
+                snapshot.size += 8 * len(self._members)
+                self._members = members
+            self._stamp_members()
+
+        self._turn = engine.turn
+        self._floor = self._world_state()
+        self._player_xy = engine.player.x, engine.player.y
+        self._random = random.getstate()
+
+        self.snapshots.append(snapshot)
+        self.size += snapshot.size
+        while self.snapshots and (len(self.snapshots) > self.turns or self.size > self.budget):
+            self.size -= self.snapshots.popleft().size
+
+    def rewind(self) -> bool:
+        """Undo the last captured turn. Returns False if there is nothing left to undo."""
+        if not self.snapshots:
+            return False
+        snapshot = self.snapshots.pop()
+        self.size -= snapshot.size
+        engine = self.engine
+
+        if snapshot.game_map is not None:
+            engine.game_map = snapshot.game_map
+            self._shadow_map(snapshot.game_map)
+        game_map = engine.game_map
+
+        if snapshot.cells is not None:
+            x, y, visible, explored = snapshot.cells
+            game_map.visible[x, y] = visible
+            game_map.explored[x, y] = explored
+            self._visible[x, y] = visible
+            self._explored[x, y] = explored
+        if snapshot.tiles is not None:
+            x, y, tiles = snapshot.tiles
+            game_map.tiles[x, y] = tiles
+            self._tiles[x, y] = tiles
+
+        for entity, state in snapshot.entities:
+            if state is None:
+                self._states.pop(entity, None)  # It didn't exist yet, the membership list drops it.
+                continue
+            restore_entity(entity, state)
+            self._states[entity] = state
+
+        if snapshot.members is not None:
+            game_map.entities = EntitySet(snapshot.members)
+            self._members = list(snapshot.members)
+
+        self._inventory = list(engine.player.inventory.items)
+        self._stamp_members()
+        engine.turn = self._turn = snapshot.turn
+        engine.game_world.current_floor, engine.game_world.map_width, engine.game_world.map_height = snapshot.floor
+        self._floor = snapshot.floor
+        self._player_xy = snapshot.player_xy
+        self._random = snapshot.random_state
+        random.setstate(snapshot.random_state)
+
+        # Positions were restored behind the index's back, and everything derived from the map is stale.
+        game_map.entities.reindex()
+        game_map.entities.take_touched()  # Restoring them isn't a change of the next turn.
+        game_map.revisions.bump("tiles", "fov", "entities", "player", "ui")
+        return True
+
+    def _stamp_members(self) -> None:
+        """Remember the entity set of the map and its count of additions and removals, the list is compared again when they change."""
+        self._entity_set = self.engine.game_map.entities
+        self._entity_changes = self._entity_set.changes
+
+    def _world_state(self) -> Tuple[int, int, int]:
+        world = self.engine.game_world
+        return world.current_floor, world.map_width, world.map_height
+
+    def _shadow_map(self, game_map: GameMap) -> None:
+        """Copy the arrays of a map the following turns are compared against."""
+        self._map = game_map
+        self._tiles = game_map.tiles.copy()
+        self._visible = game_map.visible.copy()
+        self._explored = game_map.explored.copy()
+        self._tiles_revision = game_map.revisions.stamp("tiles")
+
+    def _capture_cells(self, snapshot: Snapshot) -> None:
+        """Store the FOV cells that changed around the player's old and new position, and tiles if they changed."""
+        game_map = self._map
+        player = self.engine.player
+        x1 = max(0, min(self._player_xy[0], player.x) - FOV_RADIUS)
+        x2 = min(game_map.width, max(self._player_xy[0], player.x) + FOV_RADIUS + 1)
+        y1 = max(0, min(self._player_xy[1], player.y) - FOV_RADIUS)
+        y2 = min(game_map.height, max(self._player_xy[1], player.y) + FOV_RADIUS + 1)
+        window = slice(x1, x2), slice(y1, y2)
+
+        changed = (game_map.visible[window] != self._visible[window]) | (game_map.explored[window] != self._explored[window])
+        if changed.any():
+            x, y = np.nonzero(changed)
+            x, y = (x + x1).astype(np.int16), (y + y1).astype(np.int16)
+            snapshot.cells = x, y, self._visible[x, y], self._explored[x, y]
+            snapshot.size += x.nbytes * 3
+            self._visible[x, y] = game_map.visible[x, y]
+            self._explored[x, y] = game_map.explored[x, y]
+
+        if game_map.revisions.stamp("tiles") != self._tiles_revision:
+            self._tiles_revision = game_map.revisions.stamp("tiles")
+            x, y = np.nonzero(game_map.tiles != self._tiles)
+            snapshot.tiles = x, y, self._tiles[x, y]
+            snapshot.size += snapshot.tiles[2].nbytes + x.nbytes * 2
+            self._tiles[x, y] = game_map.tiles[x, y]
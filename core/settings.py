@@ -1,11 +1,11 @@
 import lzma
 import pickle
 from getpass import getuser
-from os import makedirs
-from os.path import exists, isfile
+from os import environ, makedirs
+from os.path import exists, isfile, join
 
 class Settings:
-     _instance = None 
+    _instance = None
     
     def __new__(cls, filename: str):
         if not cls._instance:
@@ -14,6 +14,9 @@ class Settings:
             cls._instance.screen_width = 80
             cls._instance.screen_height = 50
             cls._instance.path_folder = f'C:\\Users\\{getuser()}\\AppData\\Local\\The_Lost_Mind\\'
+            if environ.get("LOST_MIND_DATA"):
+                # Somewhere else to keep settings and saves, used by headless runs and CI.
+                cls._instance.path_folder = join(environ["LOST_MIND_DATA"], "")
             cls._instance.DEFAULT_SETTINGS = {
                 "controls": {
                     "up": "w",
@@ -28,12 +31,17 @@ class Settings:
                     "wait": "q",
                     "stairs": "e",
                     "history": "v",
-                    "restart": "BACKSPACE"
+                    "restart": "BACKSPACE",
+                    "travel_stairs": "t",
+                    "explore": "z",
+                    "undo_turn": "u"
                 },
                 "name": "",
                 "theme_classic": False,
                 "fullscreen": False,
-                "volume": 0.05
+                "volume": 0.05,
+                "undo": False,
+                "rewind_budget_mb": 8
             }
             cls._instance.make_folder()
             cls._instance._data_settings = cls._instance.load_settings()
@@ -68,6 +76,11 @@ class Settings:
 
         with open(self.path_folder + self.filename, "rb") as f:
             settings = pickle.loads(lzma.decompress(f.read()))
+        # Settings and controls added since the settings were saved get their default value.
+        for name, value in self.DEFAULT_SETTINGS.items():
+            settings.setdefault(name, value)
+        for control, key in self.DEFAULT_SETTINGS["controls"].items():
+            settings["controls"].setdefault(control, key)
         return settings
 
     def file_exists(self, filename: str) -> bool:
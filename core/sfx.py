@@ -0,0 +1,158 @@
+"""
+Sound effects, mixed into the music by the mixer thread of core.audio.
+
+`play` only queues the name of the sound, so the game thread never waits on audio. The mixer thread
+starts a voice for it from the sample cache, which keeps the sounds decoded for the device and drops
+the ones played least recently once it holds more than CACHE_BYTES. At most MAX_VOICES sounds play at
+once, a new one takes the place of the oldest. Every sound is read from `assets/sounds/<name>.wav`,
+from the asset pack when it has it, and is made up from a few tones when there is no such file.
+Until `start` has run, and without an audio device, `play` does nothing, like in replays and benchmarks.
+"""
+from __future__ import annotations
+
+import collections
+import logging
+import threading
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+import core.assets as assets
+import core.audio as audio
+
+MAX_VOICES = 8
+CACHE_BYTES = 4 * 2 ** 20
+
+
+class Tone(NamedTuple):
+    """A made up sound: a sweep from `start` to `end` Hz, mixed with `noise`, that fades out over `seconds`."""
+
+    start: float
+    end: float
+    seconds: float
+    noise: float = 0.0
+    volume: float = 0.5
+
+
+SOUNDS: Dict[str, Tone] = {
+    "attack": Tone(180, 90, 0.08, noise=0.7),
+    "death": Tone(400, 100, 0.4, noise=0.2),
+    "player_death": Tone(300, 50, 0.9, noise=0.3, volume=0.6),
+    "stairs": Tone(330, 165, 0.35, noise=0.1),
+    "item": Tone(600, 800, 0.12),
+    "heal": Tone(500, 1000, 0.3),
+    "confusion": Tone(700, 350, 0.3),
+    "poison": Tone(160, 120, 0.3, noise=0.3),
+    "freeze": Tone(1400, 1200, 0.35, noise=0.1, volume=0.3),
+    "fireball": Tone(120, 40, 0.6, noise=0.9, volume=0.6),
+    "lightning": Tone(2000, 200, 0.25, noise=0.8, volume=0.6),
+}
+
+
+def asset_name(name: str) -> str:
+    return f"assets/sounds/{name}.wav"
+
+
+def synthesize(tone: Tone, frequency: int) -> np.ndarray:
+    """The samples of a made up sound at `frequency`, in mono."""
+    frames = int(tone.seconds * frequency)
+    progress = np.arange(frames) / frames
+    pitch = tone.start * (tone.end / tone.start) ** progress  # Sweeps evenly through the octaves.
+    wave = np.sin(2 * np.pi * np.cumsum(pitch) / frequency)
+    noise = np.random.default_rng(frames).uniform(-1, 1, frames)
+    envelope = np.minimum(progress * 100, 1) * (1 - progress) ** 2  # A click free attack, then fades out.
+    return (tone.volume * envelope * ((1 - tone.noise) * wave + tone.noise * noise)).astype(np.float32)[:, np.newaxis]
+
+
+class SampleCache:
+    """The sounds decoded for the device, the least recently played are dropped past `budget` bytes."""
+
+    def __init__(self, frequency: int, channels: int, budget: int = CACHE_BYTES) -> None:
+        self.frequency = frequency
+        self.channels = channels
+        self.budget = budget
+        self.samples: collections.OrderedDict[str, np.ndarray] = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, name: str) -> np.ndarray:
+        if assets.exists(asset_name(name)):
+            track = audio.Track(asset_name(name), self.frequency, self.channels)
+            try:
+                return track.convert(track.remaining() + 2)
+            finally:
+                track.close()
+        return audio.to_channels(synthesize(SOUNDS[name], self.frequency), self.channels)
+
+    def get(self, name: str) -> np.ndarray:
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is not None:
+                self.samples.move_to_end(name)
+                self.hits += 1
+                return samples
+            self.misses += 1
+        samples = self.decode(name)
+        with self.lock:
+            if name not in self.samples:
+                self.samples[name] = samples
+                self.size += samples.nbytes
+            while self.size > self.budget and len(self.samples) > 1:
+                self.size -= self.samples.popitem(last=False)[1].nbytes
+        return samples
+
+
+class Effects:
+    """The voices playing, mixed into each block of the mixer."""
+
+    def __init__(self, cache: SampleCache, max_voices: int = MAX_VOICES) -> None:
+        self.cache = cache
+        self.max_voices = max_voices
+        self.triggered: Deque[Tuple[str, float]] = collections.deque()  # Appended to by the game thread.
+        self.voices: List[List] = []  # The samples, the next frame and the volume of each.
+        self.stolen = 0  # Voices cut short for a new one.
+
+    def trigger(self, name: str, volume: float = 1.0) -> None:
+        self.triggered.append((name, volume))
+
+    def mix(self, block: np.ndarray) -> None:
+        """Add the voices to `block`, called by the mixer thread."""
+        while self.triggered:
+            name, volume = self.triggered.popleft()
+            try:
+                self.voices.append([self.cache.get(name), 0, volume])
+            except Exception:
+                logging.error(f"Could not load the sound {name}", exc_info=True)
+            if len(self.voices) > self.max_voices:
+                self.voices.pop(0)
+                self.stolen += 1
+        for voice in self.voices:
+            samples, position, volume = voice
+            chunk = samples[position:position + len(block)]
+            block[:len(chunk)] += chunk * volume
+            voice[1] += len(block)
+        self.voices = [voice for voice in self.voices if voice[1] < len(voice[0])]
+
+
+_effects: Optional[Effects] = None
+
+
+def start() -> None:
+    """Decode every sound and mix them in from now on, on the startup thread once the mixer is open."""
+    global _effects
+    mixer = audio.mixer()
+    if mixer is None or _effects is not None:
+        return
+    cache = SampleCache(mixer.device.frequency, mixer.device.channels)
+    for name in SOUNDS:
+        cache.get(name)
+    _effects = Effects(cache)
+    mixer.sources.append(_effects)
+
+
+def play(name: str, volume: float = 1.0) -> None:
+    """Play the sound `name`, one of SOUNDS, from the game thread."""
+    if _effects is not None:
+        _effects.trigger(name, volume)
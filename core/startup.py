@@ -0,0 +1,72 @@
+"""
+Time to first frame, and the loading deferred until after it.
+
+main.py imports this module first, so the time it was imported stands for the start of the game.
+Loading that the main menu can show without, like its music, the scoreboard and the network
+libraries, is registered with `startup.defer` and runs on a background thread once the first frame
+has been presented.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+# Seconds from the start of the game to the first frame, slower starts are logged as warnings.
+FIRST_FRAME_TARGET = 0.5
+
+
+class Startup:
+    """Measures the time to first frame and runs the deferred loading."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.first_frame: Optional[float] = None  # Seconds from the start to the first frame.
+        self.deferred: List[Tuple[str, Callable[[], object]]] = []
+        self.lock = threading.Lock()
+        self.worker: Optional[threading.Thread] = None
+        self.timings: List[Tuple[str, float]] = []  # Seconds each deferred task took.
+
+    def defer(self, name: str, task: Callable[[], object]) -> None:
+        """Run `task` on the background thread after the first frame, right away if it was presented already."""
+        with self.lock:
+            self.deferred.append((name, task))
+            if self.first_frame is not None and (self.worker is None or not self.worker.is_alive()):
+                self.start_worker()
+
+    def frame_presented(self) -> None:
+        """Called after every presented frame, the first one starts the deferred loading."""
+        if self.first_frame is not None:
+            return
+        with self.lock:
+            self.first_frame = time.perf_counter() - self.started
+            self.start_worker()
+        level = logging.WARNING if self.first_frame > FIRST_FRAME_TARGET else logging.INFO
+        logging.log(level, f"First frame after {self.first_frame * 1e3:.0f} ms, the target is {FIRST_FRAME_TARGET * 1e3:.0f} ms.")
+
+    def start_worker(self) -> None:
+        self.worker = threading.Thread(target=self.run, name="startup", daemon=True)
+        self.worker.start()
+
+    def run(self) -> None:
+        while True:
+            with self.lock:
+                if not self.deferred:
+                    return
+                name, task = self.deferred.pop(0)
+            start = time.perf_counter()
+            try:
+                task()
+            except Exception:
+                logging.error(f"Deferred loading of {name} failed", exc_info=True)
+            self.timings.append((name, time.perf_counter() - start))
+            logging.debug(f"Loaded {name} in {self.timings[-1][1] * 1e3:.0f} ms after the first frame.")
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Wait for the deferred loading to finish."""
+        if self.worker is not None:
+            self.worker.join(timeout)
+
+
+startup = Startup()
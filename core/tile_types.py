@@ -3,8 +3,6 @@ from typing import Tuple
 
 import numpy as np
 
-import core.settings as settings
-
 graphic_dt = np.dtype(
     [
         ("ch", np.int32),
@@ -59,43 +57,30 @@ down_stairs = new_tile(
     light=(ord(">"), (255, 255, 255), (170, 80, 170)),
 )
 
-if settings.data_settings['theme_classic']:
-    floor = new_tile(
+# The tiles of the classic theme, which draws the map with characters instead of colored blocks.
+CLASSIC = {
+    "floor": new_tile(
         walkable=True,
         transparent=True,
         dark=(ord("."), (100, 100, 100), (0, 0, 0)),
         light=(ord("."), (200, 200, 200), (0, 0, 0)),
-    )
-    wall = new_tile(
+    ),
+    "wall": new_tile(
         walkable=False,
         transparent=False,
         dark=(ord("#"), (100, 100, 100), (0, 0, 0)),
         light=(ord("#"), (200, 200, 200), (0, 0, 0)),
-    )
-    down_stairs = new_tile(
+    ),
+    "down_stairs": new_tile(
         walkable=True,
         transparent=True,
         dark=(ord(">"), (100, 100, 100), (0, 0, 0)),
         light=(ord(">"), (200, 200, 200), (0, 0, 0)),
-    )
+    ),
+}
+DEFAULT = {"floor": floor, "wall": wall, "down_stairs": down_stairs}
 
-elif settings.data_settings['theme_classic']:
-    floor = new_tile(
-        walkable=True,
-        transparent=True,
-        dark=(ord(" "), (255, 255, 255), (148, 176, 174)),
-        light=(ord(" "), (255, 255, 255), (190, 190, 190)),
-    )
-    wall = new_tile(
-        walkable=False,
-        transparent=False,
-        dark=(ord(" "), (255, 255, 255), (30, 30, 30)),
-        light=(ord(" "), (255, 255, 255), (109, 136, 138)),
-    )
 
-    down_stairs = new_tile(
-        walkable=True,
-        transparent=True,
-        dark=(ord(">"), (0, 0, 100), (150, 50, 150)),
-        light=(ord(">"), (255, 255, 255), (170, 80, 170)),
-    )
+def apply_theme(classic: bool) -> None:
+    """Use the tiles of the classic or the default theme for the floors generated from now on."""
+    globals().update(CLASSIC if classic else DEFAULT)
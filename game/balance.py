@@ -0,0 +1,298 @@
+"""Estimate how the spawn tables and equipment play out by letting bots play thousands of games.
+
+Games are played headlessly across a process pool, one game per task. Every game only depends on
+its seed and each worker sends back a small summary, so a run scales with the number of cores.
+The summaries are combined into death floors, damage taken per floor, the XP curve and item usage.
+Run from the project folder, then change the tables in game/procgen.py or components/equippable.py
+and compare against the saved report:
+    python -m game.balance --games 2000 --json before.json
+    python -m game.balance --games 2000 --baseline before.json
+Set LOST_MIND_DATA to keep the settings out of the usual folder.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import core.input_handlers as input_handlers
+from components.consumable import HealingConsumable
+from core.actions import DropItem, EquipAction, ItemAction, WaitAction
+from core.profiler import profiler
+from game.bots import BOTS
+from game.headless import new_engine
+
+if TYPE_CHECKING:
+    from components.level import Level
+
+# Games end after this many player turns when the player is still alive.
+MAX_TURNS = 3000
+
+# (bot name, seed, max turns, max floor)
+Task = Tuple[str, int, int, Optional[int]]
+
+
+def total_xp(level: Level) -> int:
+    """
+    Returns the experience gathered since level 1, the level component only keeps the part of the current level.
+
+    :param level: Level component of the player.
+    """
+    spent = sum(level.level_up_base + n * level.level_up_factor for n in range(1, level.current_level))
+    return spent + level.current_xp
+
+
+def play_game(task: Task) -> Dict[str, object]:
+    """
+    Plays one game and returns its summary. Runs in the pool workers.
+
+    :param task: Bot name, seed, turn limit and floor limit of the game.
+    :return: Death floor, turns, damage taken and turns per floor, XP on arriving on each floor and item counts.
+    """
+    bot_name, seed, max_turns, max_floor = task
+    bot = BOTS[bot_name](seed)
+    engine = new_engine(seed)
+    handler = input_handlers.MainGameEventHandler(engine)
+    player = engine.player
+
+    floor = engine.game_world.current_floor
+    damage: Counter = Counter()
+    turns_on: Counter = Counter()
+    arrivals = {floor: (0, player.level.current_level, 0)}
+    picked: Counter = Counter()
+    used: Counter = Counter()
+    equipped: Counter = Counter()
+
+    turns = 0
+    while turns < max_turns and player.is_alive:
+        action = bot.choose(engine)
+        hp = player.fighter.hp
+        carried = list(player.inventory.items)
+        if isinstance(action, ItemAction) and isinstance(action.item.consumable, HealingConsumable):
+            # The potion heals before the enemies act, count it so the damage of the turn isn't hidden.
+            hp += min(action.item.consumable.amount, player.fighter.max_hp - hp)
+
+        if handler.handle_action(action):
+            if isinstance(action, EquipAction):
+                equipped[action.item.name] += 1
+            elif isinstance(action, ItemAction) and not isinstance(action, DropItem):
+                used[action.item.name] += 1
+            picked.update(item.name for item in player.inventory.items if item not in carried)
+        else:
+            hp = player.fighter.hp
+            handler.handle_action(WaitAction(player))
+        turns += 1
+        damage[floor] += max(0, hp - player.fighter.hp)
+        turns_on[floor] += 1
+
+        if engine.game_world.current_floor != floor:
+            floor = engine.game_world.current_floor
+            arrivals[floor] = (turns, player.level.current_level, total_xp(player.level))
+            if max_floor is not None and floor >= max_floor:
+                break
+        if player.is_alive and player.level.requires_level_up:
+            bot.level_up(engine)
+
+    return {
+        "seed": seed,
+        "death_floor": None if player.is_alive else floor,
+        "deepest": floor,
+        "turns": turns,
+        "level": player.level.current_level,
+        "xp": total_xp(player.level),
+        "damage": dict(damage),
+        "turns_on": dict(turns_on),
+        "arrivals": arrivals,
+        "picked": dict(picked),
+        "used": dict(used),
+        "equipped": dict(equipped),
+    }
+
+
+def init_worker() -> None:
+    """Runs once in every worker, the profiler trace isn't looked at and would only cost memory."""
+    profiler.enabled = False
+
+
+class BalanceReport:
+    """
+    The summaries of a batch of games, combined per floor and per item.
+    """
+
+    def __init__(self, bot: str) -> None:
+        self.bot = bot
+        self.games = 0
+        self.deaths = 0
+        self.turns = 0
+        self.seconds = 0.0
+        self.died_on: Counter = Counter()
+        self.reached: Counter = Counter()
+        self.damage: Counter = Counter()
+        self.turns_on: Counter = Counter()
+        self.arrival_xp: Counter = Counter()
+        self.arrival_level: Counter = Counter()
+        self.arrival_turn: Counter = Counter()
+        self.picked: Counter = Counter()
+        self.used: Counter = Counter()
+        self.equipped: Counter = Counter()
+
+    def add(self, game: Dict[str, object]) -> None:
+        """
+        Adds the summary of one game.
+
+        :param game: A summary returned by `play_game`.
+        """
+        self.games += 1
+        self.turns += game["turns"]
+        if game["death_floor"] is not None:
+            self.deaths += 1
+            self.died_on[game["death_floor"]] += 1
+        for floor, (turn, level, xp) in game["arrivals"].items():
+            self.reached[floor] += 1
+            self.arrival_turn[floor] += turn
+            self.arrival_level[floor] += level
+            self.arrival_xp[floor] += xp
+        self.damage.update(game["damage"])
+        self.turns_on.update(game["turns_on"])
+        self.picked.update(game["picked"])
+        self.used.update(game["used"])
+        self.equipped.update(game["equipped"])
+
+    def floors(self) -> Dict[int, Dict[str, float]]:
+        """
+        Returns the statistics of every floor reached by at least one game.
+        """
+        return {
+            floor: {
+                "reached": reached,
+                "died": self.died_on[floor],
+                "death_rate": self.died_on[floor] / reached,
+                "damage": self.damage[floor] / reached,
+                "damage_per_turn": self.damage[floor] / max(1, self.turns_on[floor]),
+                "arrival_turn": self.arrival_turn[floor] / reached,
+                "arrival_level": self.arrival_level[floor] / reached,
+                "arrival_xp": self.arrival_xp[floor] / reached,
+            }
+            for floor, reached in sorted(self.reached.items())
+        }
+
+    def as_dict(self) -> Dict[str, object]:
+        """
+        Returns the report as plain data, for saving as JSON.
+        """
+        return {
+            "bot": self.bot,
+            "games": self.games,
+            "deaths": self.deaths,
+            "turns": self.turns,
+            "seconds": round(self.seconds, 3),
+            "floors": {str(floor): stats for floor, stats in self.floors().items()},
+            "picked": dict(self.picked),
+            "used": dict(self.used),
+            "equipped": dict(self.equipped),
+        }
+
+    def lines(self, baseline: Optional[Dict[str, object]] = None) -> List[str]:
+        """
+        Returns the report as text, with the change of each floor's death rate and damage against a saved report.
+
+        :param baseline: A report saved with `as_dict`, or None.
+        """
+        lines = [
+            f"{self.games} games by the {self.bot} bot, {self.deaths} deaths, {self.turns} turns "
+            f"in {self.seconds:.1f}s ({self.games / max(self.seconds, 1e-9):.1f} games/sec)",
+            "",
+            "floor  reached   died  death%   damage  dmg/turn  arrival turn  level      xp",
+        ]
+        old_floors = baseline["floors"] if baseline else {}
+        for floor, stats in self.floors().items():
+            line = (
+                f"{floor:>5}{stats['reached']:>9}{stats['died']:>7}{stats['death_rate'] * 100:>7.1f}%"
+                f"{stats['damage']:>9.1f}{stats['damage_per_turn']:>10.2f}{stats['arrival_turn']:>14.0f}"
+                f"{stats['arrival_level']:>7.1f}{stats['arrival_xp']:>8.0f}"
+            )
+            old = old_floors.get(str(floor))
+            if old:
+                line += (
+                    f"   {(stats['death_rate'] - old['death_rate']) * 100:+.1f}% deaths"
+                    f" {stats['damage'] - old['damage']:+.1f} damage"
+                )
+            lines.append(line)
+
+        lines += ["", "item                      picked     used  equipped   per game"]
+        for name in sorted(set(self.picked) | set(self.used) | set(self.equipped)):
+            lines.append(
+                f"{name:<24}{self.picked[name]:>8}{self.used[name]:>9}{self.equipped[name]:>10}"
+                f"{self.picked[name] / max(1, self.games):>11.2f}"
+            )
+        return lines
+
+
+def run(
+        games: int,
+        bot: str = "careful",
+        seed: int = 0,
+        max_turns: int = MAX_TURNS,
+        max_floor: Optional[int] = None,
+        processes: Optional[int] = None,
+) -> BalanceReport:
+    """
+    Plays a batch of games across a process pool and combines their summaries.
+
+    :param games: Number of games, each one gets its own seed.
+    :param bot: Name of the bot playing every game.
+    :param seed: Seed of the first game, the others use the following seeds.
+    :param max_turns: Player turns after which a game ends.
+    :param max_floor: End a game on reaching this floor, None to keep descending.
+    :param processes: Worker processes, the number of cores when None. 1 plays in this process.
+    :return: The combined report, the same for the same arguments whatever the number of processes.
+    """
+    report = BalanceReport(bot)
+    tasks = [(bot, seed + n, max_turns, max_floor) for n in range(games)]
+    processes = processes or multiprocessing.cpu_count()
+    start = time.perf_counter()
+
+    if processes == 1:
+        init_worker()
+        for game in map(play_game, tasks):
+            report.add(game)
+    else:
+        # A few chunks per worker keeps them all busy until the end without much messaging.
+        chunksize = max(1, games // (processes * 8))
+        with multiprocessing.Pool(processes, initializer=init_worker) as pool:
+            for game in pool.imap(play_game, tasks, chunksize):
+                report.add(game)
+
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--bot", choices=sorted(BOTS), default="careful")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=MAX_TURNS)
+    parser.add_argument("--max-floor", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes, all cores by default.")
+    parser.add_argument("--json", help="Save the report to this file.")
+    parser.add_argument("--baseline", help="Compare against a report saved with --json.")
+    args = parser.parse_args()
+
+    report = run(args.games, args.bot, args.seed, args.max_turns, args.max_floor, args.processes)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report.as_dict(), f, indent=2)
+    print("\n".join(report.lines(baseline)))
+
+
+if __name__ == "__main__":
+    main()
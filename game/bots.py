@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import random
+from typing import TYPE_CHECKING, Dict, List, Optional, Type
+
+from components.consumable import HealingConsumable, LightningDamageConsumable
+from components.equipment_type import EquipmentType
+from core.actions import (Action, BumpAction, EquipAction, ItemAction, MeleeAction, PickupAction, TakeStairsAction,
+                          TravelAction, WaitAction)
+
+if TYPE_CHECKING:
+    from core.engine import Engine
+    from game.entity import Actor, Item
+
+DIRECTIONS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+
+class Bot:
+    """
+    Chooses the player's actions when the game runs without anyone at the keyboard.
+    """
+
+    name = "bot"
+
+    def __init__(self, seed: Optional[int] = None):
+        """
+        Initializes a new bot.
+
+        :param seed: Seed of the bot's own random generator, kept apart from the one used by procgen.
+        """
+        self.rng = random.Random(seed)
+
+    def choose(self, engine: Engine) -> Action:
+        """
+        Returns the next action of the player.
+
+        :param engine: The game being played.
+        """
+        raise NotImplementedError()
+
+    def level_up(self, engine: Engine) -> None:
+        """
+        Spends a pending level up, like the level up screen would.
+
+        :param engine: The game being played.
+        """
+        engine.level_up(self.rng.randrange(3))
+
+    def random_step(self, engine: Engine) -> Action:
+        """
+        Returns a step in a random walkable direction, or waiting if there is none.
+
+        :param engine: The game being played.
+        """
+        player = engine.player
+        game_map = engine.game_map
+        directions = [
+            (dx, dy)
+            for dx, dy in DIRECTIONS
+            if game_map.in_bounds(player.x + dx, player.y + dy)
+            and game_map.tiles["walkable"][player.x + dx, player.y + dy]
+        ]
+        if not directions:
+            return WaitAction(player)
+        return BumpAction(player, *self.rng.choice(directions))
+
+    def descend(self, engine: Engine) -> Action:
+        """
+        Returns the next step towards the stairs, or taking them when standing on them.
+
+        :param engine: The game being played.
+        """
+        player = engine.player
+        if (player.x, player.y) == engine.game_map.downstairs_location:
+            return TakeStairsAction(player)
+        if not engine.game_map.goal_maps.path_from("downstairs", player.x, player.y):
+            return self.random_step(engine)
+        return TravelAction(player, "downstairs")
+
+    def visible_hostiles(self, engine: Engine) -> List[Actor]:
+        """
+        Returns the living actors the player can see, nearest first.
+
+        :param engine: The game being played.
+        """
+        player = engine.player
+        game_map = engine.game_map
+        return sorted(
+            (actor for actor in game_map.actors if actor is not player and game_map.visible[actor.x, actor.y]),
+            key=lambda actor: player.distance(actor.x, actor.y),
+        )
+
+
+class RandomWalkBot(Bot):
+    """
+    Steps in a random direction every turn, attacking whatever is in the way.
+    """
+
+    name = "random"
+
+    def choose(self, engine: Engine) -> Action:
+        return self.random_step(engine)
+
+
+class GreedyDescendBot(Bot):
+    """
+    Walks straight to the stairs of every floor and takes them.
+    """
+
+    name = "descend"
+
+    def choose(self, engine: Engine) -> Action:
+        return self.descend(engine)
+
+
+class FightBot(Bot):
+    """
+    Hunts down every hostile it can see, explores while there is none, and descends once the floor is explored.
+    """
+
+    name = "fight"
+
+    def choose(self, engine: Engine) -> Action:
+        player = engine.player
+        game_map = engine.game_map
+
+        targets = self.visible_hostiles(engine)
+        if targets:
+            target = targets[0]
+            dx, dy = target.x - player.x, target.y - player.y
+            if max(abs(dx), abs(dy)) <= 1:
+                return MeleeAction(player, dx, dy)
+            path = player.ai.get_path_to(target.x, target.y) if player.ai else []
+            if path:
+                return BumpAction(player, path[0][0] - player.x, path[0][1] - player.y)
+
+        if game_map.goal_maps.path_from("frontier", player.x, player.y):
+            return TravelAction(player, "frontier")
+        return self.descend(engine)
+
+
+class CarefulBot(FightBot):
+    """
+    Fights like FightBot, but also collects the items it sees, wears the best equipment it carries,
+    drinks a potion when hurt and throws lightning at the nearest hostile. Closest to how people play.
+    """
+
+    name = "careful"
+
+    # Drink a potion below this share of the maximum hp.
+    heal_below = 0.4
+
+    def choose(self, engine: Engine) -> Action:
+        player = engine.player
+        game_map = engine.game_map
+        fighter = player.fighter
+        items = player.inventory.items
+
+        if fighter.hp < fighter.max_hp * self.heal_below:
+            potion = self.find_item(player, HealingConsumable)
+            if potion is not None:
+                return ItemAction(player, potion)
+
+        upgrade = self.find_upgrade(player)
+        if upgrade is not None:
+            return EquipAction(player, upgrade)
+
+        targets = self.visible_hostiles(engine)
+        if targets:
+            scroll = self.find_item(player, LightningDamageConsumable)
+            if scroll is not None and player.distance(targets[0].x, targets[0].y) <= scroll.consumable.maximum_range:
+                return ItemAction(player, scroll)
+            return super().choose(engine)
+
+        if len(items) < player.inventory.capacity:
+            if any(item.x == player.x and item.y == player.y for item in game_map.items):
+                return PickupAction(player)
+            if game_map.goal_maps.path_from("items", player.x, player.y):
+                return TravelAction(player, "items")
+        return super().choose(engine)
+
+    @staticmethod
+    def find_item(player: Actor, consumable: type) -> Optional[Item]:
+        """
+        Returns the first carried item with a consumable of the given class.
+
+        :param player: The player.
+        :param consumable: Consumable class to look for.
+        """
+        return next((item for item in player.inventory.items if isinstance(item.consumable, consumable)), None)
+
+    @staticmethod
+    def find_upgrade(player: Actor) -> Optional[Item]:
+        """
+        Returns a carried equippable with larger bonuses than what is worn in its slot.
+
+        :param player: The player.
+        """
+        equipment = player.equipment
+        for item in player.inventory.items:
+            if item.equippable is None or equipment.item_is_equipped(item):
+                continue
+            worn = equipment.weapon if item.equippable.equipment_type == EquipmentType.WEAPON else equipment.armor
+            bonus = item.equippable.power_bonus + item.equippable.defense_bonus
+            if worn is None or bonus > worn.equippable.power_bonus + worn.equippable.defense_bonus:
+                return item
+        return None
+
+
+BOTS: Dict[str, Type[Bot]] = {bot.name: bot for bot in (RandomWalkBot, GreedyDescendBot, FightBot, CarefulBot)}
+
@@ -0,0 +1,248 @@
+"""Generate a large corpus of floors and report how long they take and what they look like.
+
+Every (depth, seed) pair is generated through `GameWorld.generate_floor`, with the map size that
+depth has in a game, across a process pool. Each floor gives one row: generation time split into
+carving and entity placement, rooms placed out of `max_rooms`, floor tile fraction, walking distance
+from the player to the stairs and spawn counts. Rows are written as CSV, or as one NumPy array per
+column with an .npz path, and summarized per depth with percentiles. Floors with no reachable
+stairs, few rooms or a generation time far above their depth's median are listed by seed.
+    python -m game.corpus --depths 1-20 --seeds 200 --out corpus.npz
+A flagged floor is generated again with `--depths D --seed S --seeds 1`.
+Set LOST_MIND_DATA to keep the settings out of the usual folder.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import gc
+import multiprocessing
+import random
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+from core.profiler import profiler
+from game.entity import Actor, Item
+from game.goal_maps import UNREACHABLE
+from game.headless import new_engine
+
+if TYPE_CHECKING:
+    from core.engine import Engine
+
+# The columns of the corpus, in file order.
+COLUMNS = (
+    "depth", "seed", "width", "height", "gen_ms", "carve_ms", "place_ms", "rooms", "max_rooms",
+    "floor_fraction", "stairs_distance", "monsters", "items",
+)
+
+# A floor is flagged when it places fewer rooms than this share of its depth's median,
+SPARSE_ROOMS = 0.5
+# or takes this many times the median generation time of its depth.
+SLOW_FACTOR = 3.0
+
+# The engine each worker generates its floors with and the map size of its first floor, made by `init_worker`.
+_engine: Optional[Engine] = None
+_base_size = (0, 0)
+
+
+def init_worker() -> None:
+    """Build the engine of this process, the floors replace its map one after another."""
+    global _engine, _base_size
+    _engine = new_engine(0)
+    profiler.tracing = True  # The procgen phases of each floor are read from the trace.
+    world = _engine.game_world
+    # Every generated floor made the next map 10 tiles larger.
+    _base_size = world.map_width - 10 * world.current_floor, world.map_height - 10 * world.current_floor
+
+
+def floor_seed(depth: int, seed: int) -> int:
+    """
+    Returns the seed the random module gets before generating a floor, so each pair can be generated alone.
+
+    :param depth: Floor number.
+    :param seed: Seed of the corpus row.
+    """
+    return seed * 1000 + depth
+
+
+def generate(task: Tuple[int, int]) -> Tuple[float, ...]:
+    """
+    Generates one floor and returns its row. Runs in the pool workers.
+
+    :param task: Depth and seed of the floor.
+    :return: The values of COLUMNS.
+    """
+    depth, seed = task
+    engine = _engine
+    world = engine.game_world
+    base_width, base_height = _base_size
+
+    # The map grows by 10 tiles per floor in a game, give this depth the size it would have.
+    world.current_floor = depth - 1
+    world.map_width = base_width + 10 * (depth - 1)
+    world.map_height = base_height + 10 * (depth - 1)
+    random.seed(floor_seed(depth, seed))
+
+    # Collect the previous floor now, so its garbage isn't timed as part of this one.
+    gc.collect()
+    profiler.clear()
+    start = time.perf_counter_ns()
+    world.generate_floor()
+    gen_ms = (time.perf_counter_ns() - start) / 1e6
+    carve_ms = sum(duration for name, _, _, _, duration in profiler.trace if name == "carve") / 1e6
+    place_ms = sum(duration for name, _, _, _, duration in profiler.trace if name == "place entities") / 1e6
+
+    game_map = engine.game_map
+    player = engine.player
+    distance = game_map.goal_maps.distance_to("downstairs", player.x, player.y)
+    return (
+        depth,
+        seed,
+        game_map.width,
+        game_map.height,
+        gen_ms,
+        carve_ms,
+        place_ms,
+        len(game_map.rooms),
+        world.max_rooms,
+        float(game_map.tiles["walkable"].mean()),
+        -1 if distance == UNREACHABLE else distance,
+        sum(1 for entity in game_map.entities if isinstance(entity, Actor) and entity is not player),
+        sum(1 for entity in game_map.entities if isinstance(entity, Item)),
+    )
+
+
+def build(
+        depths: List[int], seeds: int, first_seed: int = 0, processes: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Generates every (depth, seed) pair across a process pool.
+
+    :param depths: Floor numbers to generate.
+    :param seeds: Number of seeds per depth.
+    :param first_seed: First seed, the others follow it.
+    :param processes: Worker processes, the number of cores when None. 1 generates in this process.
+    :return: One array per column, ordered by depth then seed.
+    """
+    tasks = [(depth, seed) for depth in depths for seed in range(first_seed, first_seed + seeds)]
+    processes = processes or multiprocessing.cpu_count()
+
+    if processes == 1:
+        init_worker()
+        rows = list(map(generate, tasks))
+    else:
+        # Deeper floors take longer, small chunks keep the workers evenly loaded.
+        chunksize = max(1, len(tasks) // (processes * 16))
+        with multiprocessing.Pool(processes, initializer=init_worker) as pool:
+            rows = pool.map(generate, tasks, chunksize)
+
+    columns = np.array(rows, dtype=np.float64).T if rows else np.zeros((len(COLUMNS), 0))
+    corpus = {name: column for name, column in zip(COLUMNS, columns)}
+    for name in ("depth", "seed", "width", "height", "rooms", "max_rooms", "stairs_distance", "monsters", "items"):
+        corpus[name] = corpus[name].astype(np.int64)
+    return corpus
+
+
+def save(corpus: Dict[str, np.ndarray], path: str) -> None:
+    """
+    Writes the corpus as an .npz of columns, or as CSV for any other extension.
+
+    :param corpus: Columns returned by `build`.
+    :param path: File to write.
+    """
+    if path.endswith(".npz"):
+        np.savez_compressed(path, **corpus)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(zip(*(corpus[name].tolist() for name in COLUMNS)))
+
+
+def summary(corpus: Dict[str, np.ndarray]) -> List[str]:
+    """
+    Returns the percentiles of the generation time, rooms and floor fraction of each depth.
+
+    :param corpus: Columns returned by `build`.
+    """
+    lines = [
+        "depth     size  floors   gen p50   p95   p99   max ms  carve%  place%  rooms p5  p50  floor%  no stairs"
+    ]
+    for depth in np.unique(corpus["depth"]):
+        rows = corpus["depth"] == depth
+        gen = corpus["gen_ms"][rows]
+        p50, p95, p99 = np.percentile(gen, (50, 95, 99))
+        rooms_p5, rooms_p50 = np.percentile(corpus["rooms"][rows], (5, 50))
+        lines.append(
+            f"{depth:>5}{corpus['width'][rows][0]:>5}x{corpus['height'][rows][0]:<4}{rows.sum():>6}"
+            f"{p50:>10.2f}{p95:>6.2f}{p99:>6.2f}{gen.max():>7.2f}"
+            f"{corpus['carve_ms'][rows].sum() / gen.sum() * 100:>9.1f}"
+            f"{corpus['place_ms'][rows].sum() / gen.sum() * 100:>8.1f}"
+            f"{rooms_p5:>10.0f}{rooms_p50:>5.0f}{np.median(corpus['floor_fraction'][rows]) * 100:>8.1f}"
+            f"{(corpus['stairs_distance'][rows] < 0).sum():>11}"
+        )
+    return lines
+
+
+def flagged(corpus: Dict[str, np.ndarray]) -> List[Tuple[int, int, str]]:
+    """
+    Returns the (depth, seed, reason) of floors with unreachable stairs, few rooms or a slow generation.
+
+    :param corpus: Columns returned by `build`.
+    """
+    depths = np.unique(corpus["depth"])
+    medians = {depth: np.median(corpus["gen_ms"][corpus["depth"] == depth]) for depth in depths}
+    rooms = {depth: np.median(corpus["rooms"][corpus["depth"] == depth]) for depth in depths}
+    found = []
+    for n in range(len(corpus["depth"])):
+        depth, seed = int(corpus["depth"][n]), int(corpus["seed"][n])
+        if corpus["stairs_distance"][n] < 0:
+            found.append((depth, seed, "stairs unreachable"))
+        if corpus["rooms"][n] < rooms[depth] * SPARSE_ROOMS:
+            found.append((depth, seed, f"{corpus['rooms'][n]} of {corpus['max_rooms'][n]} rooms, median {rooms[depth]:.0f}"))
+        if corpus["gen_ms"][n] > medians[depth] * SLOW_FACTOR:
+            found.append((depth, seed, f"{corpus['gen_ms'][n]:.1f} ms, median {medians[depth]:.1f} ms"))
+    return found
+
+
+def parse_depths(text: str) -> List[int]:
+    """
+    Returns the floors of a list like "1-5,8,10-12".
+
+    :param text: Comma separated floors and inclusive ranges.
+    """
+    depths = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        depths += range(int(first), int(last or first) + 1)
+    return depths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depths", type=parse_depths, default=parse_depths("1-10"), help='Floors, like "1-5,8".')
+    parser.add_argument("--seeds", type=int, default=100, help="Seeds per depth.")
+    parser.add_argument("--seed", type=int, default=0, help="First seed.")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes, all cores by default.")
+    parser.add_argument("--out", help="Write the rows to this .csv or .npz file.")
+    parser.add_argument("--show", type=int, default=20, help="Flagged floors to list.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    corpus = build(args.depths, args.seeds, args.seed, args.processes)
+    seconds = time.perf_counter() - start
+    if args.out:
+        save(corpus, args.out)
+
+    print(f"{len(corpus['depth'])} floors in {seconds:.1f}s")
+    print("\n".join(summary(corpus)))
+    found = flagged(corpus)
+    if found:
+        print(f"\n{len(found)} flagged floors:")
+        for depth, seed, reason in found[:args.show]:
+            print(f"  depth {depth:<4} seed {seed:<8} {reason}")
+
+
+if __name__ == "__main__":
+    main()
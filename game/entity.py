@@ -53,6 +53,21 @@ class Entity:
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    def mark_changed(self) -> None:
+        """Bump the revision counters of the map this entity is on after it moved or changed looks."""
+        if not hasattr(self, "parent"):
+            return
+        gamemap = self.gamemap
+        gamemap.entities.moved(self)
+        gamemap.revisions.bump("entities")
+        if self is gamemap.player:
+            gamemap.revisions.bump("player")
+
+    def mark_state_changed(self) -> None:
+        """Note a change the map doesn't show, like hit points or an AI's plans, for the rewind buffer."""
+        if hasattr(self, "parent"):
+            self.gamemap.entities.touch(self)
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int) -> T:
         """Spawn a copy of this instance at the given location."""
         clone = copy.deepcopy(self)
@@ -60,10 +75,12 @@ class Entity:
         clone.y = y
         clone.parent = gamemap
         gamemap.entities.add(clone)
+        clone.mark_changed()
         return clone
 
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None:
         """Place this entitiy at a new location.  Handles moving across GameMaps."""
+        self.mark_changed()
         self.x = x
         self.y = y
         if gamemap:
@@ -72,6 +89,7 @@ class Entity:
                     self.gamemap.entities.remove(self)
             self.parent = gamemap
             gamemap.entities.add(self)
+        self.mark_changed()
 
     def distance(self, x: int, y: int) -> float:
         """
@@ -83,6 +101,7 @@ class Entity:
         # Move the entity by a given amount
         self.x += dx
         self.y += dy
+        self.mark_changed()
 
 
 class Actor(Entity):
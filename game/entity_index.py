@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core.render_order import RenderOrder
+
+if TYPE_CHECKING:
+    from game.entity import Entity
+
+# Side of the square chunks the spatial index groups entities by.
+CHUNK_SIZE = 16
+
+
+class EntitySet:
+    """
+    The entities of a GameMap, in the order they were added.
+
+    Works like the set it replaces, and also files every entity under the chunk of the map it
+    stands in and its RenderOrder, so drawing a layer and lookups by location only visit the
+    entities near the area asked for. Entities must call `moved` after changing position,
+    render order or looks, `Entity.mark_changed` does that.
+    It also counts the entities added and removed, and keeps the entities touched since the rewind
+    buffer last took them, so it only compares those after a turn.
+    """
+
+    def __init__(self, entities: Iterable[Entity] = ()) -> None:
+        """
+        Initializes the set with the given entities.
+
+        :param entities: Entities to add.
+        """
+        self._entities: Dict[Entity, None] = {}
+        self._index_stale = True
+        self.changes = 0  # Entities added and removed.
+        self.touched: Dict[Entity, None] = {}
+        self.update(entities)
+
+    def __getstate__(self) -> dict:
+        """
+        Only saves the entities, the buckets and chunks are rebuilt when first used.
+        """
+        return {"entities": list(self._entities)}
+
+    def __setstate__(self, state: dict) -> None:
+        """
+        Restores the entities. They may not be fully unpickled yet, so the index is built later.
+        """
+        self._entities = dict.fromkeys(state["entities"])
+        self._index_stale = True
+        self.changes = 0
+        self.touched = {}
+
+    def __contains__(self, entity: object) -> bool:
+        return entity in self._entities
+
+    def __iter__(self) -> Iterator[Entity]:
+        return iter(list(self._entities))
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def add(self, entity: Entity) -> None:
+        """
+        Adds an entity, or reindexes it if it is already in the set.
+
+        :param entity: The entity to add.
+        """
+        if entity not in self._entities:
+            self.changes += 1
+        self._entities[entity] = None
+        self.touched[entity] = None
+        if not self._index_stale:
+            self._index(entity)
+
+    def update(self, entities: Iterable[Entity]) -> None:
+        """
+        Adds every entity of `entities`.
+
+        :param entities: Entities to add.
+        """
+        for entity in entities:
+            self.add(entity)
+
+    def remove(self, entity: Entity) -> None:
+        """
+        Removes an entity, raising KeyError if it isn't in the set.
+
+        :param entity: The entity to remove.
+        """
+        del self._entities[entity]
+        self.changes += 1
+        if not self._index_stale:
+            self._unindex(entity)
+
+    def discard(self, entity: Entity) -> None:
+        """
+        Removes an entity if it is in the set.
+
+        :param entity: The entity to remove.
+        """
+        if entity in self._entities:
+            self.remove(entity)
+
+    def moved(self, entity: Entity) -> None:
+        """
+        Moves an entity to the bucket and chunk matching its current render order and position.
+
+        :param entity: The entity that changed, ignored if it isn't in the set.
+        """
+        self.touch(entity)
+        if entity in self._entities and not self._index_stale:
+            self._index(entity)
+
+    def touch(self, entity: Entity) -> None:
+        """
+        Notes that the state of an entity changed, its position or anything else.
+
+        :param entity: The entity that changed, it doesn't have to be in the set.
+        """
+        self.touched[entity] = None
+
+    def take_touched(self) -> List[Entity]:
+        """
+        Returns the entities touched since the last call, in the order they were first touched.
+        """
+        touched, self.touched = list(self.touched), {}
+        return touched
+
+    def reindex(self) -> None:
+        """
+        Rebuilds the chunks on next use, after entities changed without calling `moved`.
+        """
+        self._index_stale = True
+
+    def in_rect(
+            self, x1: int, y1: int, x2: int, y2: int, render_order: Optional[RenderOrder] = None
+    ) -> Iterator[Entity]:
+        """
+        Yields the entities with x1 <= x < x2 and y1 <= y < y2.
+
+        :param x1: Left edge, inclusive.
+        :param y1: Top edge, inclusive.
+        :param x2: Right edge, exclusive.
+        :param y2: Bottom edge, exclusive.
+        :param render_order: Only yield entities of this render order, all of them if None.
+        :return: Iterator over the entities inside the rectangle, in chunk order.
+        """
+        self._build_index()
+        orders = tuple(RenderOrder) if render_order is None else (render_order,)
+        for cx in range(x1 // CHUNK_SIZE, (x2 - 1) // CHUNK_SIZE + 1):
+            for cy in range(y1 // CHUNK_SIZE, (y2 - 1) // CHUNK_SIZE + 1):
+                chunk = self._chunks.get((cx, cy))
+                if chunk is None:
+                    continue
+                for order in orders:
+                    for entity in chunk.get(order, ()):
+                        x, y, _ = self._placed[entity]
+                        if x1 <= x < x2 and y1 <= y < y2:
+                            yield entity
+
+    def at(self, x: int, y: int) -> List[Entity]:
+        """
+        Returns the entities standing on one tile.
+
+        :param x: X coordinate of the tile.
+        :param y: Y coordinate of the tile.
+        """
+        return list(self.in_rect(x, y, x + 1, y + 1))
+
+    def _build_index(self) -> None:
+        """
+        Fills the chunks from scratch if they are out of date.
+        """
+        if not self._index_stale:
+            return
+        # Chunk coordinates -> render order -> entities, in the order they were filed.
+        self._chunks: Dict[Tuple[int, int], Dict[RenderOrder, Dict[Entity, None]]] = {}
+        self._placed: Dict[Entity, Tuple[int, int, RenderOrder]] = {}
+        self._index_stale = False
+        for entity in self._entities:
+            self._index(entity)
+
+    def _index(self, entity: Entity) -> None:
+        if entity in self._placed:
+            self._unindex(entity)
+        chunk = entity.x // CHUNK_SIZE, entity.y // CHUNK_SIZE
+        self._placed[entity] = entity.x, entity.y, entity.render_order
+        self._chunks.setdefault(chunk, {}).setdefault(entity.render_order, {})[entity] = None
+
+    def _unindex(self, entity: Entity) -> None:
+        x, y, order = self._placed.pop(entity)
+        chunk = x // CHUNK_SIZE, y // CHUNK_SIZE
+        bucket = self._chunks[chunk][order]
+        del bucket[entity]
+        if not bucket:
+            del self._chunks[chunk][order]
+            if not self._chunks[chunk]:
+                del self._chunks[chunk]
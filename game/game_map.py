@@ -1,16 +1,23 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import numpy as np  # type: ignore
 from tcod.console import Console
 
 import core.tile_types as tile_types
+from core.profiler import profiler
+from core.render_order import RenderOrder
 from game.entity import Actor, Item
+from game.entity_index import EntitySet
+from game.revisions import Revisions
 
 if TYPE_CHECKING:
     from core.engine import Engine
     from game.entity import Entity
+    from game.goal_maps import GoalMaps
+    from game.pathfinding import HierarchicalPathfinder
+    from game.procgen import RectangularRoom
 
 class GameMap:
     def __init__(
@@ -29,7 +36,7 @@ class GameMap:
         """
         self.engine = engine
         self.width, self.height = width, height
-        self.entities = set(entities)
+        self.entities = EntitySet(entities)
         self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
 
         # Fields that indicate visible and explored tiles
@@ -42,11 +49,57 @@ class GameMap:
 
         self.downstairs_location = (0, 0)
 
+        # Room graph filled in by procgen, used for hierarchical pathfinding.
+        self.rooms: List[RectangularRoom] = []
+        self.regions = np.full(
+            (width, height), fill_value=-1, dtype=np.int16, order="F"
+        )  # Index of the room (or the corridor dug towards it) each tile belongs to
+        self.region_links: Dict[int, Set[int]] = {}
+        self._pathfinder: Optional[HierarchicalPathfinder] = None
+        self._goal_maps: Optional[GoalMaps] = None
+
+        # Change counters, data derived from the map is only recomputed when they move.
+        self.revisions = Revisions()
+        self._tile_layer: Optional[np.ndarray] = None
+        self._walkable_cost: Optional[np.ndarray] = None
+        self._movement_cost: Optional[np.ndarray] = None
+        self.names_at_mouse = ""
+
         self.screen_width = screen_width
         self.screen_height = screen_height
         self.center = self.screen_width // 2, self.screen_height // 2
         self.player = player
 
+    def __getstate__(self) -> dict:
+        """
+        Leaves the cached arrays out of saves, they are rebuilt on demand.
+        """
+        state = self.__dict__.copy()
+        state["_tile_layer"] = state["_walkable_cost"] = state["_movement_cost"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """
+        Restores a pickled GameMap, filling in fields missing from older saves.
+        """
+        self.__dict__.update(state)
+        if not isinstance(self.entities, EntitySet):
+            self.entities = EntitySet(self.entities)
+        if "regions" not in state:
+            self.rooms = []
+            self.regions = np.full(
+                (self.width, self.height), fill_value=-1, dtype=np.int16, order="F"
+            )
+            self.region_links = {}
+            self._pathfinder = None
+        self.__dict__.setdefault("_goal_maps", None)
+        if "revisions" not in state:
+            self.revisions = Revisions()
+            self._tile_layer = self._walkable_cost = self._movement_cost = None
+            self.names_at_mouse = ""
+        for name in ("tile_layer", "walkable_cost", "movement_cost", "names_at_mouse"):
+            self.revisions.forget(name)
+
     @property
     def gamemap(self) -> GameMap:
         """
@@ -54,6 +107,86 @@ class GameMap:
         """
         return self
 
+    @property
+    def pathfinder(self) -> HierarchicalPathfinder:
+        """
+        Returns the hierarchical pathfinder for this map, creating it on first use.
+        """
+        if self._pathfinder is None:
+            from game.pathfinding import HierarchicalPathfinder
+
+            self._pathfinder = HierarchicalPathfinder(self)
+        return self._pathfinder
+
+    @property
+    def goal_maps(self) -> GoalMaps:
+        """
+        Returns the shared distance maps for this map, creating them on first use.
+        """
+        if self._goal_maps is None:
+            from game.goal_maps import GoalMaps
+
+            self._goal_maps = GoalMaps(self)
+        return self._goal_maps
+
+    def add_room(self, room: RectangularRoom) -> int:
+        """
+        Registers a room in the room graph and labels its tiles.
+
+        :param room: The room that was carved into the map.
+        :return: Region index of the room.
+        """
+        index = len(self.rooms)
+        self.rooms.append(room)
+        self.region_links.setdefault(index, set())
+
+        # A room carved over older corridors joins their regions to this one.
+        for other in np.unique(self.regions[room.inner]):
+            if other >= 0:
+                self.link_regions(index, int(other))
+        self.regions[room.inner] = index
+        self.revisions.bump("tiles")
+
+        if self._pathfinder is not None:
+            self._pathfinder.invalidate()
+        return index
+
+    def add_tunnel(self, index: int, start_region: int, cells: Iterable[Tuple[int, int]]) -> None:
+        """
+        Labels the tiles of a corridor dug towards the room `index`.
+
+        Tiles that already belong to another region link that region to the corridor.
+
+        :param index: Region index of the room the corridor was dug for.
+        :param start_region: Region index the corridor starts from.
+        :param cells: Coordinates of the corridor tiles, in digging order.
+        """
+        previous = start_region
+        for x, y in cells:
+            region = int(self.regions[x, y])
+            if region < 0:
+                self.regions[x, y] = region = index
+            if region != previous:
+                self.link_regions(previous, region)
+                previous = region
+        self.link_regions(previous, index)
+        self.revisions.bump("tiles")
+
+        if self._pathfinder is not None:
+            self._pathfinder.invalidate()
+
+    def link_regions(self, a: int, b: int) -> None:
+        """
+        Marks two regions as directly connected.
+
+        :param a: First region index.
+        :param b: Second region index.
+        """
+        if a == b or a < 0 or b < 0:
+            return
+        self.region_links.setdefault(a, set()).add(b)
+        self.region_links.setdefault(b, set()).add(a)
+
     @property
     def actors(self) -> Iterator[Actor]:
         """
@@ -86,12 +219,8 @@ class GameMap:
         :param location_y: Y coordinate of the location.
         :return: Entity that blocks movement or None if there is no such entity.
         """
-        for entity in self.entities:
-            if (
-                entity.blocks_movement
-                and entity.x == location_x
-                and entity.y == location_y
-            ):
+        for entity in self.entities.at(location_x, location_y):
+            if entity.blocks_movement:
                 return entity
 
         return None
@@ -104,9 +233,9 @@ class GameMap:
         :param y: Y coordinate of the location.
         :return: Actor at the location or None if there is no actor.
         """
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.entities.at(x, y):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
 
         return None
 
@@ -120,6 +249,39 @@ class GameMap:
         """
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def movement_cost(self, bounds: Tuple[slice, slice]) -> np.ndarray:
+        """
+        Returns the pathfinding cost of the tiles inside `bounds`.
+
+        Walls cost 0 (blocked), floors 1, and tiles with a blocking entity 10 more.
+        The array is reused until tiles or entities change and must not be modified.
+
+        :param bounds: Slices of the map to return the cost for.
+        :return: Cost array covering `bounds`.
+        """
+        if self.revisions.needs_update("walkable_cost", "tiles"):
+            self._walkable_cost = np.array(self.tiles["walkable"], dtype=np.int8)
+
+        key = bounds[0].start, bounds[0].stop, bounds[1].start, bounds[1].stop
+        if self.revisions.needs_update("movement_cost", "tiles", "entities", key=key):
+            x_offset, y_offset = bounds[0].start, bounds[1].start
+            cost = self._walkable_cost[bounds].copy()
+
+            for entity in self.entities.in_rect(
+                    x_offset, y_offset, x_offset + cost.shape[0], y_offset + cost.shape[1]
+            ):
+                x, y = entity.x - x_offset, entity.y - y_offset
+                # Check if an entity blocks movement and the cost isn't zero (blocking).
+                if entity.blocks_movement and cost[x, y]:
+                    # Add to the cost of a blocked position.
+                    # A lower number means more enemies will crowd behind each other in
+                    # hallways. A higher number means enemies will take longer paths to
+                    # surround the player.
+                    cost[x, y] += 10
+            self._movement_cost = cost
+
+        return self._movement_cost
+
     def render(self, console: Console, player_x: int, player_y: int) -> None:
         """
         Renders the map.
@@ -127,32 +289,53 @@ class GameMap:
         If a tile is in the "visible" array, draw it with the "light" colors.
         If it isn't, but it's in the "explored" array, draw it with the "dark" colors.
         Otherwise, the default is "SHROUD".
+        The tile graphics are only selected again when tiles, the FOV or the player moved.
 
         :param console: Console for drawing.
         :param player_x: X coordinate of the player.
         :param player_y: Y coordinate of the player.
         """
-        console.rgb[0: self.width, 0: self.height] = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
-            default=tile_types.SHROUD,
-        )[player_x - self.center[0]:player_x + self.center[0], player_y - self.center[1]:player_y + self.center[1]]
-
-        entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value
+        if self.revisions.needs_update("tile_layer", "tiles", "fov", key=(player_x, player_y)):
+            viewport = (
+                slice(player_x - self.center[0], player_x + self.center[0]),
+                slice(player_y - self.center[1], player_y + self.center[1]),
+            )
+            self._tile_layer = np.select(
+                condlist=[self.visible[viewport], self.explored[viewport]],
+                choicelist=[self.tiles["light"][viewport], self.tiles["dark"][viewport]],
+                default=tile_types.SHROUD,
+            )
+        console.rgb[0: self.width, 0: self.height] = self._tile_layer
+
+        first_pixel = player_x - self.center[0], player_y - self.center[1]
+        last_pixel = (
+            first_pixel[0] + min(console.width, self.center[0] * 2 + 1),
+            first_pixel[1] + min(console.height, self.center[1] * 2 + 1),
         )
 
-        first_pixel = self.player.x - self.center[0], self.player.y - self.center[1]
+        # Draw one render order at a time, bottom layer first, only looking at entities on screen.
+        for render_order in RenderOrder:
+            on_screen = [
+                entity
+                for entity in self.entities.in_rect(*first_pixel, *last_pixel, render_order=render_order)
+                if entity is not self.player
+            ]
+            if not on_screen:
+                continue
 
-        for entity in entities_sorted_for_rendering:
-            if entity.char == "@":
+            x = np.fromiter((entity.x for entity in on_screen), dtype=np.intp, count=len(on_screen))
+            y = np.fromiter((entity.y for entity in on_screen), dtype=np.intp, count=len(on_screen))
+            seen = self.visible[x, y]
+            if not seen.any():
                 continue
 
-            if self.visible[entity.x, entity.y]:
-                entity_x = entity.x - first_pixel[0]
-                entity_y = entity.y - first_pixel[1]
-                if abs(entity.x - self.player.x) < self.center[0] + 1 and abs(entity.y - self.player.y) < self.center[1] + 1:
-                    console.print(entity_x, entity_y, entity.char, fg=entity.color)
+            shown = [entity for entity, is_seen in zip(on_screen, seen) if is_seen]
+            x = x[seen] - first_pixel[0]
+            y = y[seen] - first_pixel[1]
+            glyphs = console.rgb[["ch", "fg"]]  # A view, the background stays untouched.
+            glyphs[x, y] = np.array(
+                [(ord(entity.char), entity.color) for entity in shown], dtype=glyphs.dtype
+            )
 
         console.print(self.center[0], self.center[1], self.player.char, fg=self.player.color)
 
@@ -215,17 +398,19 @@ class GameWorld:
         from game.procgen import generate_dungeon
 
         self.current_floor += 1
-
-        self.engine.game_map = generate_dungeon(
-            max_rooms=self.max_rooms,
-            room_min_size=self.room_min_size,
-            room_max_size=self.room_max_size,
-            map_width=self.map_width,
-            map_height=self.map_height,
-            engine=self.engine,
-            screen_width=self.screen_width,
-            screen_height=self.screen_height,
-            player=self.player
-        )
+        profiler.floor = self.current_floor
+
+        with profiler.section("generate floor", "procgen"):
+            self.engine.game_map = generate_dungeon(
+                max_rooms=self.max_rooms,
+                room_min_size=self.room_min_size,
+                room_max_size=self.room_max_size,
+                map_width=self.map_width,
+                map_height=self.map_height,
+                engine=self.engine,
+                screen_width=self.screen_width,
+                screen_height=self.screen_height,
+                player=self.player
+            )
         self.map_width += 10
         self.map_height += 10
\ No newline at end of file
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+import numpy as np  # type: ignore
+import tcod
+
+if TYPE_CHECKING:
+    from game.game_map import GameMap
+
+Goals = Union[np.ndarray, Iterable[Tuple[int, int]]]
+"""Either a boolean mask of goal tiles, or the coordinates of the goal tiles."""
+
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+def player_goals(gamemap: GameMap) -> Goals:
+    """The tile the player stands on."""
+    return [(gamemap.player.x, gamemap.player.y)]
+
+
+def downstairs_goals(gamemap: GameMap) -> Goals:
+    """The stairs leading to the next floor."""
+    return [gamemap.downstairs_location]
+
+
+def visible_item_goals(gamemap: GameMap) -> Goals:
+    """Every item the player can currently see."""
+    return sorted((item.x, item.y) for item in gamemap.items if gamemap.visible[item.x, item.y])
+
+
+def frontier_goals(gamemap: GameMap) -> Goals:
+    """Walkable tiles the player has not explored yet."""
+    return gamemap.tiles["walkable"] & ~gamemap.explored
+
+
+class GoalMaps:
+    """
+    Shared Dijkstra distance maps towards named goal sets.
+
+    Every caller asking for the same goal set in the same state of the map gets the same array,
+    so a whole floor of monsters chasing the player costs one search per turn instead of one each.
+    Maps are keyed by the map's tile revision and the goal coordinates, and recomputed when either
+    changes. Goal sets given as masks are recomputed whenever the FOV changes instead.
+    """
+
+    def __init__(self, gamemap: GameMap):
+        """
+        Initializes a new instance of the GoalMaps class.
+
+        :param gamemap: The map to compute distances on.
+        """
+        self.gamemap = gamemap
+        self._sources: Dict[str, Callable[[GameMap], Goals]] = {}
+        self._cache: Dict[str, Tuple[Hashable, np.ndarray]] = {}
+        self._cost: Optional[np.ndarray] = None
+
+        self.hits = 0
+        self.misses = 0
+
+        self.register("player", player_goals)
+        self.register("downstairs", downstairs_goals)
+        self.register("items", visible_item_goals)
+        self.register("frontier", frontier_goals)
+
+    def __getstate__(self) -> dict:
+        """
+        Drops the cached arrays when pickled, they are rebuilt on demand.
+        """
+        return {"gamemap": self.gamemap, "_sources": self._sources, "_cache": {}, "_cost": None, "hits": 0, "misses": 0}
+
+    def register(self, name: str, goals: Callable[[GameMap], Goals]) -> None:
+        """
+        Registers a goal set under a name, replacing any previous one.
+
+        :param name: Name callers use to ask for this distance map.
+        :param goals: Function returning the goal tiles for a map, must be picklable.
+        """
+        self._sources[name] = goals
+        self.invalidate(name)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """
+        Forgets one cached distance map, or all of them.
+
+        :param name: Goal set to forget, all of them if None.
+        """
+        if name is None:
+            self._cache.clear()
+            self._cost = None
+        else:
+            self._cache.pop(name, None)
+            self._cache.pop(f"flee:{name}", None)
+
+    @property
+    def cost(self) -> np.ndarray:
+        """
+        Movement cost of every tile, 0 for tiles that can't be walked on.
+        """
+        if self._cost is None or self.gamemap.revisions.needs_update("goal_map_cost", "tiles"):
+            self._cost = self.gamemap.tiles["walkable"].astype(np.int8)
+        return self._cost
+
+    def get(self, name: str) -> np.ndarray:
+        """
+        Returns the distance from every tile to the nearest goal of the named set.
+
+        Distances use 2 for cardinal and 3 for diagonal steps, like the pathfinder in BaseAI.
+        Tiles that can't reach a goal hold UNREACHABLE. The array must not be modified.
+
+        :param name: A registered goal set.
+        """
+        goals = self._sources[name](self.gamemap)
+        if isinstance(goals, np.ndarray):
+            key: Hashable = self.gamemap.revisions.stamp("tiles", "fov")
+        else:
+            goals = tuple(goals)
+            key = self.gamemap.revisions.stamp("tiles"), goals
+
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == key:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+
+        distance = np.full(self.cost.shape, UNREACHABLE, dtype=np.int32, order="F")
+        if isinstance(goals, np.ndarray):
+            distance[goals] = 0
+        else:
+            for x, y in goals:
+                distance[x, y] = 0
+        tcod.path.dijkstra2d(distance, self.cost, cardinal=2, diagonal=3, out=distance)
+
+        self._cache[name] = key, distance
+        self._cache.pop(f"flee:{name}", None)
+        return distance
+
+    def flee(self, name: str, coefficient: float = -1.2) -> np.ndarray:
+        """
+        Returns a map leading away from the named goal set.
+
+        The distances are scaled by a negative `coefficient` and rescanned, so walking downhill
+        moves away from the goals without running into dead ends right next to them.
+
+        :param name: A registered goal set.
+        :param coefficient: Scale applied to the distances, more negative prefers more distant escapes.
+        """
+        distance = self.get(name)
+        cached = self._cache.get(f"flee:{name}")
+        if cached is not None and cached[0] is distance:
+            self.hits += 1
+            return cached[1]
+
+        reachable = distance != UNREACHABLE
+        flee = np.full(distance.shape, UNREACHABLE, dtype=np.int32, order="F")
+        flee[reachable] = (distance[reachable] * coefficient).astype(np.int32)
+        tcod.path.dijkstra2d(flee, self.cost, cardinal=2, diagonal=3, out=flee)
+
+        self._cache[f"flee:{name}"] = distance, flee
+        return flee
+
+    def distance_to(self, name: str, x: int, y: int) -> int:
+        """
+        Returns the distance from a tile to the nearest goal of the named set.
+
+        :param name: A registered goal set.
+        :param x: X coordinate of the location.
+        :param y: Y coordinate of the location.
+        """
+        return int(self.get(name)[x, y])
+
+    def path_from(self, name: str, x: int, y: int, flee: bool = False) -> List[Tuple[int, int]]:
+        """
+        Returns the steps from a tile down to the nearest goal of the named set, or away from it.
+
+        :param name: A registered goal set.
+        :param x: X coordinate to start from.
+        :param y: Y coordinate to start from.
+        :param flee: Walk the flee map instead, moving away from the goals.
+        :return: Coordinates of each step, excluding the starting tile. Empty if there is nowhere to go.
+        """
+        distance = self.flee(name) if flee else self.get(name)
+        if distance[x, y] == UNREACHABLE:
+            return []
+        path = tcod.path.hillclimb2d(distance, (x, y), cardinal=True, diagonal=True)[1:].tolist()
+        return [(index[0], index[1]) for index in path]
@@ -0,0 +1,177 @@
+"""Play the game without a window, audio or keyboard, with a bot choosing the player's actions.
+
+Runs as fast as the CPU allows and reports turns/sec, floors/sec and the time spent in each phase.
+Run from the project folder, it works on machines without a display:
+    python -m game.headless --bot fight --turns 5000 --seed 1
+Set LOST_MIND_DATA to keep the settings and message archive out of the usual folder.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from typing import Dict, List, Optional
+
+import components.scoreboard as scoreboard
+import core.input_handlers as input_handlers
+import game.setup_game as setup_game
+from core.actions import WaitAction
+from core.engine import Engine
+from core.profiler import profiler
+from core.replay import Recorder
+from game.bots import BOTS, Bot
+
+
+class RunStats:
+    """
+    Counters of one headless run.
+    """
+
+    def __init__(self, bot: str, seed: int) -> None:
+        self.bot = bot
+        self.seed = seed
+        self.turns = 0
+        self.floors = 0
+        self.deaths = 0
+        self.impossible = 0
+        self.deepest = 0
+        self.seconds = 0.0
+
+    @property
+    def turns_per_second(self) -> float:
+        return self.turns / max(self.seconds, 1e-9)
+
+    @property
+    def floors_per_second(self) -> float:
+        return self.floors / max(self.seconds, 1e-9)
+
+    def as_dict(self) -> Dict[str, object]:
+        """
+        Returns the counters and rates, for printing or saving as JSON.
+        """
+        return {
+            "bot": self.bot,
+            "seed": self.seed,
+            "turns": self.turns,
+            "floors": self.floors,
+            "deaths": self.deaths,
+            "impossible": self.impossible,
+            "deepest": self.deepest,
+            "seconds": round(self.seconds, 3),
+            "turns_per_second": round(self.turns_per_second, 1),
+            "floors_per_second": round(self.floors_per_second, 3),
+        }
+
+
+def new_engine(seed: int, record: Optional[str] = None, rewind: bool = False) -> Engine:
+    """
+    Builds a game through `setup_game.new_game` with a fixed seed.
+
+    :param seed: Seed for the dungeon generation.
+    :param record: Path to record the game to, for replaying it with core.replay.
+    :param rewind: Keep the rewind buffer, it is dropped by default so it doesn't skew the timings.
+    """
+    scoreboard.disable()  # Bot games stay off the scoreboard.
+    engine = setup_game.new_game(seed, archive=False)  # Bot games leave the player's files alone.
+    if not rewind:
+        engine.rewind = None
+    if record:
+        engine.recorder = Recorder(record, seed)
+    return engine
+
+
+def run(
+        bot: Bot,
+        turns: int,
+        seed: int = 0,
+        max_floor: Optional[int] = None,
+        record: Optional[str] = None,
+        rewind: bool = False,
+) -> RunStats:
+    """
+    Plays `turns` player turns, starting a new game whenever the player dies.
+
+    :param bot: Chooses the player's actions.
+    :param turns: Number of player turns to play.
+    :param seed: Seed of the first game, later games use the following seeds.
+    :param max_floor: Start a new game after reaching this floor, None to keep descending.
+    :param record: Record the first game to this path, the run then ends with that game.
+    :param rewind: Capture every turn in the rewind buffer like the game does.
+    :return: The counters of the run.
+    """
+    stats = RunStats(bot.name, seed)
+    engine = new_engine(seed, record, rewind)
+    handler = input_handlers.MainGameEventHandler(engine)
+    game = 0
+    start = time.perf_counter()
+
+    while stats.turns < turns:
+        floor = engine.game_world.current_floor
+        action = bot.choose(engine)
+        if not handler.handle_action(action):
+            # Impossible actions don't take a turn, wait so the bot can't get stuck on one.
+            stats.impossible += 1
+            handler.handle_action(WaitAction(engine.player))
+        stats.turns += 1
+
+        if engine.game_world.current_floor != floor:
+            stats.floors += 1
+            stats.deepest = max(stats.deepest, engine.game_world.current_floor)
+
+        if not engine.player.is_alive or (max_floor is not None and engine.game_world.current_floor >= max_floor):
+            stats.deaths += not engine.player.is_alive
+            if record:
+                break
+            game += 1
+            engine = new_engine(seed + game, rewind=rewind)
+            handler = input_handlers.MainGameEventHandler(engine)
+        elif engine.player.level.requires_level_up:
+            bot.level_up(engine)
+
+    stats.seconds = time.perf_counter() - start
+    if engine.recorder is not None:
+        engine.recorder.close()
+    return stats
+
+
+def phase_report() -> List[str]:
+    """
+    Returns the mean time of each profiled section over all floors, slowest total first.
+    """
+    totals: Dict[str, List[float]] = {}
+    for name, category, _, calls, total, _, longest in profiler.totals():
+        entry = totals.setdefault(f"{category}/{name}", [0, 0.0, 0.0])
+        entry[0] += calls
+        entry[1] += total
+        entry[2] = max(entry[2], longest)
+    return [
+        f"{name:<28}{int(calls):>9} calls {total:>10.1f} ms total {total / calls:>8.3f} ms mean {longest:>8.2f} ms max"
+        for name, (calls, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1])
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bot", choices=sorted(BOTS), default="fight")
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-floor", type=int, default=None)
+    parser.add_argument("--record", help="Record the first game to this file, see core.replay.")
+    parser.add_argument("--rewind", action="store_true", help="Keep the rewind buffer on, as in the game.")
+    parser.add_argument("--trace", help="Also write the profiler trace, as JSON and CSV, into this folder.")
+    args = parser.parse_args()
+
+    profiler.clear()
+    profiler.tracing = True  # For the phase report.
+    stats = run(BOTS[args.bot](args.seed), args.turns, args.seed, args.max_floor, args.record, args.rewind)
+
+    for key, value in stats.as_dict().items():
+        print(f"{key:<18}{value}")
+    print()
+    print("\n".join(phase_report()))
+    if args.trace:
+        print("\nTrace written to", *profiler.export(os.path.join(args.trace, "")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import heapq
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+if TYPE_CHECKING:
+    from game.game_map import GameMap
+
+# Maps with fewer tiles than this are searched in full, it is cheap enough there.
+HIERARCHICAL_MIN_CELLS = 40_000
+
+Bounds = Tuple[slice, slice]
+
+
+class HierarchicalPathfinder:
+    """
+    Plans paths over the room graph built by procgen before searching tiles.
+
+    A route of regions (rooms and the corridors dug towards them) is found first,
+    the tile search is then limited to the rectangle covering the regions on that route.
+    """
+
+    def __init__(self, gamemap: GameMap):
+        """
+        Initializes a new instance of the HierarchicalPathfinder class.
+
+        :param gamemap: The map to plan paths on.
+        """
+        self.gamemap = gamemap
+        self._region_bounds: Optional[np.ndarray] = None
+        self._centers: Optional[np.ndarray] = None
+        self._routes: Dict[Tuple[int, int], Optional[Bounds]] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self) -> dict:
+        """
+        Drops the caches when pickled, they are rebuilt on demand.
+        """
+        return {"gamemap": self.gamemap, "_region_bounds": None, "_centers": None, "_routes": {}, "hits": 0, "misses": 0}
+
+    def invalidate(self) -> None:
+        """
+        Forgets all cached routes, used when the map changes.
+        """
+        self._region_bounds = None
+        self._centers = None
+        self._routes.clear()
+
+    def region_at(self, x: int, y: int) -> int:
+        """
+        Returns the region index at the given location, or -1 if it belongs to none.
+
+        :param x: X coordinate of the location.
+        :param y: Y coordinate of the location.
+        """
+        if not self.gamemap.in_bounds(x, y):
+            return -1
+        return int(self.gamemap.regions[x, y])
+
+    def search_bounds(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[Bounds]:
+        """
+        Returns the area a tile search between two points has to cover.
+
+        :param start: Starting coordinates (x, y).
+        :param goal: Destination coordinates (x, y).
+        :return: Slices into the map arrays, or None if the regions are unknown or not connected.
+        """
+        start_region = self.region_at(*start)
+        goal_region = self.region_at(*goal)
+        if start_region < 0 or goal_region < 0:
+            return None
+
+        key = (start_region, goal_region)
+        if key in self._routes:
+            self.hits += 1
+            return self._routes[key]
+        self.misses += 1
+
+        route = self.route(start_region, goal_region)
+        bounds = None
+        if route is not None:
+            region_bounds = self.region_bounds[list(route)]
+            x1, y1 = region_bounds[:, 0].min(), region_bounds[:, 1].min()
+            x2, y2 = region_bounds[:, 2].max(), region_bounds[:, 3].max()
+            bounds = slice(int(x1), int(x2) + 1), slice(int(y1), int(y2) + 1)
+
+        self._routes[key] = self._routes[key[::-1]] = bounds
+        return bounds
+
+    def route(self, start_region: int, goal_region: int) -> Optional[Tuple[int, ...]]:
+        """
+        Finds the shortest chain of regions between two regions, by distance between their centers.
+
+        :param start_region: Region index to start from.
+        :param goal_region: Region index to reach.
+        :return: Region indexes along the route, or None if there is no route.
+        """
+        centers = self.centers
+        links = self.gamemap.region_links
+
+        distances = {start_region: 0.0}
+        came_from: Dict[int, int] = {}
+        queue = [(0.0, start_region)]
+        while queue:
+            distance, region = heapq.heappop(queue)
+            if region == goal_region:
+                break
+            if distance > distances[region]:
+                continue
+            for neighbour in links.get(region, ()):
+                step = float(np.hypot(*(centers[neighbour] - centers[region])))
+                if distance + step < distances.get(neighbour, np.inf):
+                    distances[neighbour] = distance + step
+                    came_from[neighbour] = region
+                    heapq.heappush(queue, (distance + step, neighbour))
+        else:
+            return None
+
+        route = [goal_region]
+        while route[-1] != start_region:
+            route.append(came_from[route[-1]])
+        return tuple(reversed(route))
+
+    @property
+    def region_bounds(self) -> np.ndarray:
+        """
+        Bounding box (x1, y1, x2, y2) of every region, inclusive, indexed by region.
+        """
+        if self._region_bounds is None:
+            regions = self.gamemap.regions
+            count = max(len(self.gamemap.rooms), int(regions.max()) + 1, 1)
+            xs, ys = np.nonzero(regions >= 0)
+            labels = regions[xs, ys]
+
+            bounds = np.empty((count, 4), dtype=np.int64)
+            bounds[:, :2] = np.iinfo(np.int64).max
+            bounds[:, 2:] = -1
+            np.minimum.at(bounds[:, 0], labels, xs)
+            np.minimum.at(bounds[:, 1], labels, ys)
+            np.maximum.at(bounds[:, 2], labels, xs)
+            np.maximum.at(bounds[:, 3], labels, ys)
+            self._region_bounds = bounds
+        return self._region_bounds
+
+    @property
+    def centers(self) -> np.ndarray:
+        """
+        Center of every region's bounding box, indexed by region.
+        """
+        if self._centers is None:
+            bounds = self.region_bounds
+            self._centers = np.stack(
+                [(bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2], axis=1
+            )
+        return self._centers
@@ -7,6 +7,7 @@ import tcod
 
 import game.entity_factories as entity_factories
 import core.tile_types as tile_types
+from core.profiler import profiler
 from game.game_map import GameMap
 
 if TYPE_CHECKING:
@@ -212,7 +213,7 @@ def place_entities(room: RectangularRoom, dungeon: GameMap, floor_number: int, m
         x = random.randint(room.x1 + 1, room.x2 - 1)
         y = random.randint(room.y1 + 1, room.y2 - 1)
 
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
+        if not dungeon.entities.at(x, y):
             entity.spawn(dungeon, x, y)
 
     return multiplier
@@ -291,20 +292,25 @@ def generate_dungeon(
         if any(new_room.intersects(other_room) for other_room in rooms):
             continue  # This room intersects, so go to the next attempt.
 
-        dungeon.tiles[new_room.inner] = tile_types.floor
-
-        if len(rooms) == 0:
-            # The first ro  # All rooms after the first.
-            # Dig out a tunnel between this room and the previous one.om, where the player starts.
-            player.place(*new_room.center, dungeon)
-        else:  # All rooms after the first.
-            # Dig out a tunnel between this room and the previous one.
-            for x, y in tunnel_between(rooms[-1].center, new_room.center):
-                dungeon.tiles[x, y] = tile_types.floor
-
-            center_of_last_room = new_room.center
-
-        multiplier = place_entities(new_room, dungeon, engine.game_world.current_floor, multiplier)
+        with profiler.section("carve", "procgen"):
+            dungeon.tiles[new_room.inner] = tile_types.floor
+            region = dungeon.add_room(new_room)
+
+            if len(rooms) == 0:
+                # The first ro  # All rooms after the first.
+                # Dig out a tunnel between this room and the previous one.om, where the player starts.
+                player.place(*new_room.center, dungeon)
+            else:  # All rooms after the first.
+                # Dig out a tunnel between this room and the previous one.
+                tunnel = list(tunnel_between(rooms[-1].center, new_room.center))
+                for x, y in tunnel:
+                    dungeon.tiles[x, y] = tile_types.floor
+                dungeon.add_tunnel(region, region - 1, tunnel)
+
+                center_of_last_room = new_room.center
+
+        with profiler.section("place entities", "procgen"):
+            multiplier = place_entities(new_room, dungeon, engine.game_world.current_floor, multiplier)
 
         dungeon.tiles[center_of_last_room] = tile_types.down_stairs
         dungeon.downstairs_location = center_of_last_room
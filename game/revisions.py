@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from typing import Dict, Hashable, Tuple
+
+# What each counter tracks.
+KINDS = {
+    "tiles": "Tile types, so walkability and transparency.",
+    "fov": "The visible and explored arrays.",
+    "entities": "Entities being added, removed, moved or changing how they look.",
+    "player": "The player's position.",
+    "ui": "Interface state drawn over the map, like the mouse location.",
+}
+
+
+class Revisions:
+    """
+    Change counters for the parts of a GameMap other data is derived from.
+
+    Code that changes the map bumps the matching counter. Code that derives data from the map
+    asks `needs_update` with the counters its result depends on, and skips the work when none
+    of them moved since the last time. How often that happens is counted per derived value.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes every counter to zero.
+        """
+        self.counters: Dict[str, int] = dict.fromkeys(KINDS, 0)
+        self._seen: Dict[str, Tuple[Hashable, ...]] = {}
+        self.computed: Dict[str, int] = {}
+        self.skipped: Dict[str, int] = {}
+
+    def bump(self, *kinds: str) -> None:
+        """
+        Marks the given parts of the map as changed.
+
+        :param kinds: Names of the counters to increase.
+        """
+        for kind in kinds:
+            self.counters[kind] += 1
+
+    def stamp(self, *kinds: str) -> Tuple[int, ...]:
+        """
+        Returns the current value of the given counters.
+
+        :param kinds: Names of the counters.
+        """
+        return tuple(self.counters[kind] for kind in kinds)
+
+    def needs_update(self, name: str, *kinds: str, key: Hashable = None) -> bool:
+        """
+        Checks whether a derived value has to be recomputed, and records that it will be.
+
+        :param name: Name of the derived value.
+        :param kinds: Names of the counters the value depends on.
+        :param key: Any other input of the value, compared along with the counters.
+        :return: True the first time and whenever one of the inputs changed since the last True.
+        """
+        stamp = self.stamp(*kinds) + (key,)
+        if self._seen.get(name) == stamp:
+            self.skipped[name] = self.skipped.get(name, 0) + 1
+            return False
+        self._seen[name] = stamp
+        self.computed[name] = self.computed.get(name, 0) + 1
+        return True
+
+    def forget(self, name: str) -> None:
+        """
+        Forces the next `needs_update` for a derived value to return True.
+
+        :param name: Name of the derived value.
+        """
+        self._seen.pop(name, None)
+
+    def report(self) -> str:
+        """
+        Returns how many times each derived value was recomputed or skipped.
+        """
+        lines = []
+        for name in sorted(self.computed.keys() | self.skipped.keys()):
+            computed = self.computed.get(name, 0)
+            skipped = self.skipped.get(name, 0)
+            lines.append(f"{name}: computed {computed}, skipped {skipped} ({skipped / (computed + skipped):.0%})")
+        return "\n".join(lines)
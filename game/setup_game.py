@@ -4,67 +4,99 @@ from __future__ import annotations
 import copy
 import lzma
 import pickle
+import random
 import traceback
+import uuid
 from typing import Optional
 
-import soundfile
 import tcod
 from tcod import libtcodpy
 
+import core.assets as assets
+import core.audio as audio
 import core.color as color
 import updates.constant
 import game.entity_factories as entity_factories
 import core.exceptions as exceptions
 import core.input_handlers as input_handlers
 import core.settings as settings
-import updates.update_game
+import core.sfx as sfx
+import core.tile_types as tile_types
 from components.scoreboard import get_score
 from core.engine import Engine
+from core.layers import LayerCache
+from core.message_log import ARCHIVE_NAME, MessageLog
+from core.profiler import profiler
+from core.replay import Recorder
+from core.rewind import RewindBuffer
+from core.startup import startup
 from game.game_map import GameWorld
 
-# Load the background image and remove the alpha channel.
-background_image = tcod.image.load(
-    "assets/images/menu_background.png")[:, :, :3]
+# Loaded the first time the menu is drawn.
+background_image = None
+
+# The menu background is drawn once into an offscreen layer and blitted after that.
+layers = LayerCache()
+
+
+def draw_background(console: tcod.Console) -> None:
+    """Draw the menu background image over the whole console."""
+    global background_image
+    if background_image is None:
+        # The RGB pixels, without the alpha channel.
+        background_image = assets.image("assets/images/menu_background.png")
+    console.draw_semigraphics(background_image, 0, 0)
+
+
+# The tracks played in the menu, in order and looped.
+MENU_PLAYLIST = ["assets/music/music.wav"]
 
 
 class playerMenuMusic:
-    """Class to handle the background music in the player menu."""
+    """Class to handle the background music in the player menu.
+    Nothing is opened until the menu asks for the music, so games can be built without an audio device.
+    The audio device is opened on the startup thread once the first frame is on screen, core.audio streams the music from there.
+    """
 
     def __init__(self, volume=None) -> None:
-        self.player = None
-        self.start(volume)
+        self.loading = False
+        self.volume(volume)
 
     def __call__(self, volume=None):
-        if not volume:
-            pass
-        self.player.volume = volume
-
-    def start(self, volume):
-        """Start playing the background music."""
-        mixer = tcod.sdl.audio.BasicMixer(
-            tcod.sdl.audio.open()
-        )  # Setup BasicMixer with the default audio output.
-        sound, samplerate = soundfile.read(
-            "assets/music/music.wav", dtype="float32"
-        )  # Load an audio sample using SoundFile.
-        song = mixer.device.convert(
-            sound, samplerate
-        )  # Convert this sample to the format expected by the device.
-        self.player = mixer.play(
-            song, volume=volume, loops=-1
-            # Start asynchronous playback, audio is mixed on a separate Python thread.
-        )
+        self.volume(volume)
+        self.play()
+
+    def play(self) -> None:
+        """Start the music the first time the menu is shown."""
+        if not self.loading:
+            self.loading = True
+            startup.defer("menu music", self.start)
+
+    def start(self):
+        """Start playing the background music, and decode the sound effects for the audio device it opened."""
+        audio.play_music(MENU_PLAYLIST)
+        sfx.start()
 
     def volume(self, volume):
-        """Set the volume of the background music."""
-        self.player.volume = self.volume
+        """Set the volume of the background music, heard right away."""
+        if volume is not None:
+            audio.set_volume(volume)
 
 
 player_music = playerMenuMusic(settings.data_settings["volume"])
 
 
-def new_game() -> Engine:
-    """Return a brand new game session as an Engine instance."""
+def new_game(seed: Optional[int] = None, archive: bool = True) -> Engine:
+    """Return a brand new game session as an Engine instance.
+    The dungeon and every roll of the game follow from `seed`, a random one if it is None.
+    With `archive`, messages that no longer fit in memory are kept in a file of this game's own.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    random.seed(seed)
+
+    tile_types.apply_theme(settings.data_settings["theme_classic"])
+
     map_width = 80 + settings.data.screen_width
     map_height = 43 + settings.data.screen_height
 
@@ -75,6 +107,11 @@ def new_game() -> Engine:
     player = copy.deepcopy(entity_factories.player)
 
     engine = Engine(player=player)
+    engine.seed = seed
+    if archive:
+        # Kept next to the save, named for this game so it never writes over another game's messages.
+        name = ARCHIVE_NAME.format(seed=seed, id=uuid.uuid4().hex[:8])
+        engine.message_log = MessageLog(archive_path=settings.data.path_folder + name)
 
     engine.game_world = GameWorld(
         engine=engine,
@@ -90,6 +127,7 @@ def new_game() -> Engine:
 
     engine.game_world.generate_floor()
     engine.update_fov()
+    engine.rewind = new_rewind_buffer(engine)
 
     engine.message_log.add_message(
         "Good luck buddy, you will need it", color.welcome_text
@@ -103,13 +141,23 @@ def load_game(filename: str) -> Engine:
     with open(settings.data.path_folder + filename, "rb") as f:
         engine = pickle.loads(lzma.decompress(f.read()))
     assert isinstance(engine, Engine)
+    tile_types.apply_theme(settings.data_settings["theme_classic"])  # For the floors still to come.
+    profiler.floor = engine.game_world.current_floor
+    engine.rewind = new_rewind_buffer(engine)
     return engine
 
 
+def new_rewind_buffer(engine: Engine) -> RewindBuffer:
+    """Return a rewind buffer for the game, within the memory budget from the settings."""
+    budget = settings.data_settings["rewind_budget_mb"] * 1024 * 1024
+    return RewindBuffer(engine, budget=budget)
+
+
 class MainMenu(input_handlers.BaseEventHandler):
     """Handle the main menu rendering and input."""
 
     def __init__(self):
+        player_music.play()
         self.selected = 0
         self.menu = [
             "  Continue last game",
@@ -124,10 +172,12 @@ class MainMenu(input_handlers.BaseEventHandler):
             self.menu.pop(0)
 
         self.lenght = len(self.menu)
+        # Start fetching the scoreboard in the background once the menu is on screen, so it is there when opened.
+        startup.defer("scoreboard", lambda: get_score(limit=20, name=settings.data_settings["name"]))
 
     def on_render(self, console: tcod.Console) -> None:
         """Render the main menu on a background image."""
-        console.draw_semigraphics(background_image, 0, 0)
+        layers.blit(console, "background", draw_background)
 
         console.print(
             console.width // 2,
@@ -207,9 +257,12 @@ class MainMenu(input_handlers.BaseEventHandler):
                     traceback.print_exc()  # Print to stderr.
                     return input_handlers.PopupMessage(self, f"Failed to load save:\n{exc}")
             elif self.menu[self.selected] == "  Play a new game":
-                return input_handlers.MainGameEventHandler(new_game())
+                engine = new_game()
+                # Record the run so a crash or a slow turn can be replayed with core.replay.
+                engine.recorder = Recorder(settings.data.path_folder + "last_run.lmr", engine.seed)
+                return input_handlers.MainGameEventHandler(engine)
             elif self.menu[self.selected] == "  Scoreboard":
-                return input_handlers.PopupScoreboard(self, get_score(limit=20, name=name), name)
+                return input_handlers.PopupScoreboard(self, name, limit=20)
             elif self.menu[self.selected] == "  Update":
                 return Update()
             elif self.menu[self.selected] == "  Settings":
@@ -221,28 +274,35 @@ class MainMenu(input_handlers.BaseEventHandler):
 
 
 class Update(input_handlers.BaseEventHandler):
-    """Handle the Update logic and the rendering of the screen ."""
+    """Handle the Update logic and the rendering of the screen .
+    The check and the download run on an update worker, the screen only shows its state.
+    """
 
     def __init__(self) -> None:
+        import updates.update_game  # Loads the network libraries, only needed once this screen is opened.
+
         self.folder_folder = f"The_Lost_Mind_{updates.constant.VERSION}"
 
         self.game_exe = "The_Lost_Mind.exe"
 
         self.game_folder = "data"
 
-        self.checking = True
-        self.update = None
+        self.worker = updates.update_game.UpdateWorker()
         self.updateGame = True
-        self.updating = None
-        self.done = None
         self.update_msg = "There is an update for this game it's version\nDo you want to update it"
 
+    def progress_text(self) -> str:
+        """The downloaded size, and the part of the archive it is when its size is known."""
+        done = self.worker.done_bytes / 2 ** 20
+        if self.worker.progress is None:
+            return f"{done:.1f} MiB"
+        return f"{done:.1f} / {self.worker.total_bytes / 2 ** 20:.1f} MiB ({self.worker.progress:.0%})"
+
     def on_render(self, console: tcod.Console) -> None:
         """Render the update screen."""
-        console.rgb["fg"] //= 8
-        console.rgb["bg"] //= 8
-        console.draw_semigraphics(background_image, 0, 0)
+        layers.blit(console, "background", draw_background)
         text_print = []
+        state = self.worker.state
 
         console.print(
             console.width // 2,
@@ -253,19 +313,24 @@ class Update(input_handlers.BaseEventHandler):
             alignment=libtcodpy.CENTER,
         )
 
-        if self.checking:
+        if state == updates.update_game.CHECKING:
             text_print = ["Checking for updates"]
 
-        elif self.updating:
-            text_print = ["Updating the game"]
+        elif state == updates.update_game.DOWNLOADING:
+            text_print = ["Updating the game", "", self.progress_text()]
+
+        elif state == updates.update_game.INSTALLING:
+            text_print = ["Installing the update"]
 
-        elif self.done:
+        elif state == updates.update_game.DONE:
             text_print = ["Updating is done and the new version is installed\n\n\n\n",
                           "Press any key to restart the game"]
 
-        elif not (self.update):
+        elif state == updates.update_game.FAILED:
+            text_print = ["The update failed, try again later"]
+
+        elif state != updates.update_game.AVAILABLE:
             text_print = ["Update is not availble"]
-            self.done = True
 
         elif self.updateGame:
             text_print = [
@@ -296,35 +361,28 @@ class Update(input_handlers.BaseEventHandler):
                 bg_blend=libtcodpy.BKGND_ALPHA(64),
             )
 
-        if self.checking:
-            self.update = updates.update_game.check_updates()
-            self.checking = False
-
-        if self.updating:
-            self.updating_game()
-
-    def updating_game(self):
-        """Handle the game updating process."""
-        self.update = updates.update_game.download_game()
-        self.update = updates.update_game.manipultion_files()
-
-        self.checking = None
-        self.update = None
-        self.updateGame = None
-        self.updating = None
-        self.done = True
+    def needs_redraw(self) -> bool:
+        """Keep rendering while the update check or the download is pending."""
+        return self.worker.state in (
+            updates.update_game.CHECKING, updates.update_game.DOWNLOADING, updates.update_game.INSTALLING
+        )
 
     def ev_keydown(
             self, event: tcod.event.KeyDown
     ) -> Optional[input_handlers.BaseEventHandler]:
         """Handle keydown events in the update screen."""
+        state = self.worker.state
+        if state == updates.update_game.DONE:
+            raise exceptions.launchUpdate()
+
         if event.sym in (tcod.event.KeySym.q, tcod.event.KeySym.ESCAPE):
+            self.worker.cancel()  # A download stops, and resumes from where it stopped next time.
             return MainMenu()
 
-        if self.done:
+        if state in (updates.update_game.UP_TO_DATE, updates.update_game.FAILED):
             return MainMenu()
 
-        if self.checking or not (self.update):
+        if state != updates.update_game.AVAILABLE:
             return None
 
         elif event.sym in (tcod.event.KeySym.w, tcod.event.KeySym.s, tcod.event.KeySym.a, tcod.event.KeySym.d, tcod.event.KeySym.UP, tcod.event.KeySym.DOWN, tcod.event.KeySym.LEFT, tcod.event.KeySym.RIGHT):
@@ -332,8 +390,9 @@ class Update(input_handlers.BaseEventHandler):
 
         elif event.sym == tcod.event.KeySym.RETURN or event.sym == tcod.event.KeySym.SPACE:
             if self.updateGame:
-                self.updating = True
+                self.worker.download()
                 return None
+            self.worker.cancel()
             return MainMenu()
 
 
@@ -365,14 +424,13 @@ class Settings(input_handlers.BaseEventHandler):
 
     def on_render(self, console: tcod.Console) -> None:
         """Render the settings screen."""
-        console.rgb["fg"] //= 8
-        console.rgb["bg"] //= 8
-        console.draw_semigraphics(background_image, 0, 0)
+        layers.blit(console, "background", draw_background)
         self.text_selected = self.option_list[self.selected]
+        top = console.height // 2 - 16  # First control, high enough for every control and the general settings.
 
         console.print(
             console.width // 2,
-            console.height // 2 - 18,
+            top - 8,
             "TOMBS OF THE LOST MIND\n\nSettings",
             fg=color.menu_title,
             alignment=libtcodpy.CENTER,
@@ -397,7 +455,7 @@ class Settings(input_handlers.BaseEventHandler):
             )
             console.print(
                 console.width // 2,
-                console.height // 2 - 10 + i,
+                top + i,
                 text.ljust(menu_width).ljust(menu_width),
                 fg=color.menu_text,
                 bg=bg_color,
@@ -406,7 +464,7 @@ class Settings(input_handlers.BaseEventHandler):
             )
             console.print(
                 console.width // 2,
-                console.height // 2 - 10 + i + 1,
+                top + i + 1,
                 "".ljust(menu_width),
                 fg=color.menu_text,
                 bg=color.black,
@@ -438,13 +496,23 @@ class Settings(input_handlers.BaseEventHandler):
             text = text[:-2] + "<-"
         text_to_print.append(text)
 
+        text = f"Undo: {self.data['undo']}  "
+        if self.text_selected == "undo":
+            text = text[:-2] + "<-"
+        text_to_print.append(text)
+
+        text = f"Rewind budget: {self.data['rewind_budget_mb']} MB  "
+        if self.text_selected == "rewind_budget_mb":
+            text = text[:-2] + "<-"
+        text_to_print.append(text)
+
         for num, txt in enumerate(text_to_print):
             bg_color = color.black
             if "<-" in txt:
                 bg_color = color.selected
             console.print(
                 console.width // 2,
-                console.height // 2 - 7 + i + num,
+                top + 3 + i + num,
                 txt,
                 fg=color.menu_text,
                 bg=bg_color,
@@ -453,8 +521,8 @@ class Settings(input_handlers.BaseEventHandler):
             )
         console.print(
             console.width // 2,
-            console.height // 2 - 10 - 2,
-            f"CONTROLS{'\n'*29}GENERAL",
+            top - 2,
+            f"CONTROLS{'\n' * (i + 3)}GENERAL",
             fg=color.menu_text,
             bg=color.black,
             alignment=libtcodpy.CENTER,
@@ -505,6 +573,16 @@ class Settings(input_handlers.BaseEventHandler):
                     settings.data_settings["fullscreen"])
                 return None
 
+            elif self.text_selected == "undo":
+                settings.data_settings["undo"] = not settings.data_settings["undo"]
+                return None
+
+            elif self.text_selected == "rewind_budget_mb":
+                if settings.data_settings["rewind_budget_mb"] <= 2:
+                    return None
+
+                settings.data_settings["rewind_budget_mb"] -= 2
+
         elif event.sym == tcod.event.KeySym.d or event.sym == tcod.event.KeySym.RIGHT:
             if self.text_selected == "theme_classic":
                 settings.data_settings["theme_classic"] = not (
@@ -524,6 +602,16 @@ class Settings(input_handlers.BaseEventHandler):
                     settings.data_settings["fullscreen"])
                 return None
 
+            elif self.text_selected == "undo":
+                settings.data_settings["undo"] = not settings.data_settings["undo"]
+                return None
+
+            elif self.text_selected == "rewind_budget_mb":
+                if settings.data_settings["rewind_budget_mb"] >= 64:
+                    return None
+
+                settings.data_settings["rewind_budget_mb"] += 2
+
         elif event.sym == tcod.event.KeySym.RETURN:
             if self.text_selected == "name":
                 return input_handlers.PopupMessageChangeKey(
@@ -532,14 +620,14 @@ class Settings(input_handlers.BaseEventHandler):
                     selected=self.text_selected,
                     name=self.data["name"],
                 )
-            elif self.text_selected == "theme_classic" or self.text_selected == "volume":
+            elif self.text_selected in ("theme_classic", "volume", "undo", "rewind_budget_mb"):
                 return None
             return input_handlers.PopupMessageChangeKey(
                 self, "Press key you want to change it to", selected=self.text_selected
             )
 
         elif event.sym == tcod.event.KeySym.BACKSPACE:
-            if self.text_selected == "theme_classic" or self.text_selected == "volume" or self.text_selected == "name":
+            if self.text_selected in ("theme_classic", "volume", "name", "undo", "rewind_budget_mb"):
                 return None
             self.default_setting()
             return input_handlers.PopupMessage(self, "Reset to default")
@@ -1,29 +1,43 @@
+from core.startup import startup  # First, so the time to first frame counts every import after it.
 import game.setup_game as setup_game
 import core.input_handlers as input_handlers
 import core.exceptions as exceptions
+import core.assets as assets
 import core.color as color
+import core.log as log
+import core.message_log as message_log
 import core.settings as settings
+from core.profiler import profiler
 import tcod.sdl.audio
 import tcod
 import os
 import sys
 import logging
+import time
 import traceback
-from typing import Optional
+from typing import Iterable, List, Optional
 
 sys.dont_write_bytecode = True
 
+# Seconds between frames while a handler keeps redrawing without input, like a loading scoreboard.
+FRAME_INTERVAL = 1 / 60
 
-# Set up logging
-log_file = f'{settings.data.path_folder}The_Lost_Mind.log'
-logging.basicConfig(filename=log_file, filemode='a', format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.DEBUG)
+
+# Set up logging, written to a rotated file by a background thread
+log.setup(settings.data.path_folder)
 
 
 def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
     """If the current event handler has an active Engine then save it."""
     if isinstance(handler, input_handlers.EventHandler):
+        if handler.engine.recorder is not None:
+            handler.engine.recorder.close()  # The saved game continues without being recorded.
         handler.engine.save_as(filename)
+        archive = handler.engine.message_log.archive
+        # Only the saved game's messages can be read again, the archives of other games are deleted.
+        message_log.remove_archives(settings.data.path_folder, archive.path if archive is not None else None)
         logging.info("Game saved.")
+        logging.debug("Derived map data reuse:\n%s", handler.engine.game_map.revisions.report())
 
 
 def toggle_fullscreen(context: tcod.context.Context, fullscreen) -> None:
@@ -36,12 +50,40 @@ def toggle_fullscreen(context: tcod.context.Context, fullscreen) -> None:
     )
 
 
+class FrameStats:
+    """Count presented frames against handled input and CPU time, logged when the game closes."""
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.events = 0
+        self.coalesced = 0
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    def log(self) -> None:
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        logging.info(
+            f"Presented {self.frames} frames for {self.events} input events "
+            f"({self.frames / max(self.events, 1):.2f} frames per input, {self.coalesced} mouse motions coalesced), "
+            f"used {cpu:.1f}s CPU over {wall:.1f}s ({cpu / max(wall, 1e-9):.1%})."
+        )
+
+
+def coalesce_motion(events: Iterable[tcod.event.Event]) -> List[tcod.event.Event]:
+    """Drop every mouse motion event that is directly followed by another one, only the last of a run matters."""
+    events = list(events)
+    return [
+        event
+        for event, next_event in zip(events, events[1:] + [None])
+        if not (isinstance(event, tcod.event.MouseMotion) and isinstance(next_event, tcod.event.MouseMotion))
+    ]
+
+
 def load_tileset() -> Optional[tcod.tileset.Tileset]:
     """Load the tileset for the game."""
     try:
-        return tcod.tileset.load_tilesheet(
-            'assets/images/dejavu10x10_gs_tc.png', 32, 8, tcod.tileset.CHARMAP_TCOD
-        )
+        return assets.tileset('assets/images/dejavu10x10_gs_tc.png', 32, 8, tcod.tileset.CHARMAP_TCOD)
     except Exception as ex:
         logging.error(f"Failed to load tileset: {ex}")
         return None
@@ -67,43 +109,76 @@ def main() -> bool:
     ) as context:
         root_console = tcod.console.Console(settings.data.screen_width, settings.data.screen_height, order="F")
         toggle_fullscreen(context, settings.data_settings["fullscreen"])
-        while True:
-            # Set up the main menu handler
-            handler: input_handlers.BaseEventHandler = setup_game.MainMenu()
-            try:
-                while True:
-                    root_console.clear()
-                    handler.on_render(console=root_console)
+        stats = FrameStats()
+        try:
+            run_handlers(context, root_console, stats)
+        finally:
+            stats.log()
+
+
+def run_handlers(context: tcod.context.Context, root_console: tcod.console.Console, stats: FrameStats) -> None:
+    """Run the event handlers, only rendering a frame when what is on screen changed."""
+    while True:
+        # Set up the main menu handler
+        handler: input_handlers.BaseEventHandler = setup_game.MainMenu()
+        dirty = True
+        try:
+            while True:
+                if dirty:
+                    # The frame time leaves out presenting, which waits for vsync.
+                    with profiler.section("frame", "render"):
+                        root_console.clear()
+                        handler.on_render(console=root_console)
+                    if profiler.overlay:
+                        profiler.render_overlay(root_console)
                     context.present(root_console)
-                    try:
-                        for event in tcod.event.wait():
-                            context.convert_event(event)
-                            handler = handler.handle_events(event)
-                    except Exception:
-                        logging.error("Exception occurred during event handling", exc_info=True)
-                        if isinstance(handler, input_handlers.EventHandler):
-                            handler.engine.message_log.add_message(traceback.format_exc(), color.error)
-            except exceptions.Restart:
-                pass
-            except exceptions.DownloadError:
-                print("Download Error")
-            except exceptions.QuitWithoutSaving:
-                raise
-            except exceptions.launchUpdate:
-                os.startfile(".\\assets\\manipulator.bat")
-                raise
-            except exceptions.saveSettings:
-                input_handlers.player_controls()
-                toggle_fullscreen(context, settings.data_settings["fullscreen"])
-                settings.data.save_settings()
-            except exceptions.mainMenu:
-                save_game(handler, "savegame.sav")
-            except SystemExit:
-                save_game(handler, "savegame.sav")
-                raise
-            except BaseException:
-                save_game(handler, "savegame.sav")
-                raise
+                    stats.frames += 1
+                    startup.frame_presented()
+
+                # While the handler has work in progress, wait for input at most a frame before drawing again.
+                dirty = handler.needs_redraw()
+                events = tcod.event.wait(FRAME_INTERVAL if dirty else None)
+                try:
+                    events = list(events)
+                    coalesced = coalesce_motion(events)
+                    stats.coalesced += len(events) - len(coalesced)
+                    for event in coalesced:
+                        context.convert_event(event)
+                        previous_handler, previous_key = handler, handler.redraw_key()
+                        handler = handler.handle_events(event)
+                        stats.events += 1
+                        if (
+                            not isinstance(event, tcod.event.MouseMotion)
+                            or handler is not previous_handler
+                            or handler.redraw_key() != previous_key
+                        ):
+                            dirty = True
+                except Exception:
+                    dirty = True
+                    logging.error("Exception occurred during event handling", exc_info=True)
+                    if isinstance(handler, input_handlers.EventHandler):
+                        handler.engine.message_log.add_message(traceback.format_exc(), color.error)
+        except exceptions.Restart:
+            pass
+        except exceptions.DownloadError:
+            print("Download Error")
+        except exceptions.QuitWithoutSaving:
+            raise
+        except exceptions.launchUpdate:
+            os.startfile(assets.path("assets/manipulator.bat"))
+            raise
+        except exceptions.saveSettings:
+            input_handlers.player_controls()
+            toggle_fullscreen(context, settings.data_settings["fullscreen"])
+            settings.data.save_settings()
+        except exceptions.mainMenu:
+            save_game(handler, "savegame.sav")
+        except SystemExit:
+            save_game(handler, "savegame.sav")
+            raise
+        except BaseException:
+            save_game(handler, "savegame.sav")
+            raise
 
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+"""
+Package the game as one archive of compiled modules and assets, started with `python The_Lost_Mind.pyz`.
+
+Every module of `core/`, `components/`, `game/` and `updates/` and `main.py` is compiled ahead
+of time, at the chosen optimization level, as unchecked-hash bytecode, so nothing is compiled
+or checked against a source when the game starts. The modules keep their package layout, so no
+import needs rewriting like the flat build of make_exe.py does. The assets and the asset pack,
+made again first, are stored next to them, uncompressed, and found through the archive's index.
+`bundle.json` lists every file of the archive with its size and hash, and the hash of the whole
+bundle names its asset cache.
+The libraries the game uses, like tcod and numpy, are loaded from the installed Python.
+Run from the project folder:
+    python -m updates.make_bundle
+    python -m updates.make_bundle --optimize 2 --out builds/The_Lost_Mind.pyz
+"""
+import argparse
+import hashlib
+import json
+import os
+import py_compile
+import tempfile
+import zipapp
+
+import updates.make_pack as make_pack
+from updates.constant import VERSION
+
+PACKAGES = ("core", "components", "game", "updates")
+ASSETS = "assets"
+BUNDLE_INDEX = "bundle.json"  # Read by core.assets.
+# Only used while developing, not part of the game.
+SKIPPED = ("updates/make_exe.py", "updates/make_bundle.py", "updates/make_pack.py")
+
+MAIN = '''"""Start the game from the bundle."""
+import runpy
+
+runpy.run_module("main", run_name="__main__")
+'''
+
+
+def sources(root: str) -> list:
+    """Paths of the modules of the game, relative to the project folder and with forward slashes."""
+    paths = ["main.py"]
+    for package in PACKAGES:
+        for folder, folders, files in os.walk(os.path.join(root, package)):
+            folders[:] = sorted(name for name in folders if name != "__pycache__")
+            for name in sorted(files):
+                path = os.path.relpath(os.path.join(folder, name), root).replace(os.sep, "/")
+                if name.endswith(".py") and path not in SKIPPED:
+                    paths.append(path)
+    return paths
+
+
+def asset_files(root: str) -> list:
+    paths = []
+    for folder, folders, files in os.walk(os.path.join(root, ASSETS)):
+        folders.sort()
+        paths += [os.path.relpath(os.path.join(folder, name), root).replace(os.sep, "/") for name in sorted(files)]
+    return paths
+
+
+def build(root: str, out: str, optimize: int = 1) -> dict:
+    """Write the bundle of the game in `root` to `out`, returns its index."""
+    files = {}
+    with tempfile.TemporaryDirectory() as staging:
+        for path in sources(root):
+            # The bytecode goes where zipimport looks for it, next to where the source would be.
+            target = os.path.join(staging, *path.split("/")) + "c"
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            py_compile.compile(
+                os.path.join(root, path), cfile=target, dfile=path, doraise=True, optimize=optimize,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+            )
+        for path in asset_files(root):
+            target = os.path.join(staging, *path.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(os.path.join(root, path), "rb") as source, open(target, "wb") as f:
+                f.write(source.read())
+        with open(os.path.join(staging, "__main__.py"), "w") as f:
+            f.write(MAIN)
+
+        for folder, _, names in os.walk(staging):
+            for name in names:
+                path = os.path.join(folder, name)
+                with open(path, "rb") as f:
+                    files[os.path.relpath(path, staging).replace(os.sep, "/")] = {
+                        "size": os.path.getsize(path), "sha256": hashlib.sha256(f.read()).hexdigest(),
+                    }
+        digest = hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()
+        index = {"version": VERSION, "optimize": optimize, "hash": digest, "files": files}
+        with open(os.path.join(staging, BUNDLE_INDEX), "w") as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        # Stored uncompressed, modules and assets are read without inflating them.
+        zipapp.create_archive(staging, out, interpreter="/usr/bin/env python3", compressed=False)
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Package the game as one archive of compiled modules and assets.")
+    parser.add_argument("--out", default=os.path.join("builds", "The_Lost_Mind.pyz"))
+    parser.add_argument("--optimize", type=int, choices=(0, 1, 2), default=1,
+                        help="1 drops asserts, 2 also drops docstrings.")
+    args = parser.parse_args()
+
+    make_pack.build()
+    index = build(os.getcwd(), args.out, args.optimize)
+    modules = sum(name.endswith(".pyc") for name in index["files"])
+    assets = sum(name.startswith(ASSETS + "/") for name in index["files"])
+    print(f"{modules} modules and {assets} assets, {os.path.getsize(args.out) / 2 ** 10:.0f} KiB, written to {args.out}")
+    print("Compare its start with the source: python -m benchmarks.startup --bundle " + args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -87,6 +87,18 @@ def making_package_for_exe(version) -> None:
     copytree(data_path, new_exe_path + "\\assets")
 
 
+def build_pack() -> None:
+    # The decoded assets, copied with the others into the package.
+    subprocess.call(r"python -m updates.make_pack", cwd=mypath)
+
+
+def publish_manifest(version) -> None:
+    # The manifest and the files named after their hash, uploaded with the release for delta updates.
+    new_exe_path = f"{mypath}\\builds\\The_Lost_Mind_{version}"
+    assets_path = f"{mypath}\\builds\\release_{version}"
+    subprocess.call(fr"python -m updates.manifest publish {new_exe_path} --version {version} --out {assets_path}", cwd=mypath)
+
+
 def increase_game_version():
     with open("updates/constant.py", "w") as o:
         new_version = float(Decimal(str(version)) + Decimal('0.1'))
@@ -109,6 +121,8 @@ if __name__ == "__main__":
     version = VERSION
 
     compile_to_exe()
+    build_pack()
     making_package_for_exe(version)
+    publish_manifest(version)
     clean_after_compile()
     increase_game_version()
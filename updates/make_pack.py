@@ -0,0 +1,90 @@
+"""
+Decode the game's images, tilesheet and music once into `assets/assets.pack`, read by core/assets.py.
+
+The pack holds the pixels and samples exactly as the game would decode them, so loading them is a
+memory map instead of decoding a PNG or a WAV at every start. Assets that are missing are left out
+and are decoded from their files. Make the pack again after changing an asset, the game decodes
+the changed one from its file until then. make_exe.py and make_bundle.py make it before packaging.
+Run from the project folder:
+    python -m updates.make_pack
+"""
+import json
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np  # type: ignore
+import tcod
+
+from core.assets import PACK, PACK_ALIGN, PACK_HEADER, PACK_MAGIC
+
+TILESET = ("assets/images/dejavu10x10_gs_tc.png", 32, 8, tcod.tileset.CHARMAP_TCOD)
+IMAGES = ("assets/images/menu_background.png",)
+SOUNDS = ("assets/music/music.wav",)
+SOUND_EFFECTS = "assets/sounds"  # Every WAV file in it, played by core.sfx.
+
+
+def decode() -> Dict[str, Tuple[Dict[str, np.ndarray], dict]]:
+    """The arrays and details of every asset there is, by name."""
+    assets = {}
+    name, columns, rows, charmap = TILESET
+    if os.path.exists(name):
+        tileset = tcod.tileset.load_tilesheet(name, columns, rows, charmap)
+        codepoints = np.array(charmap, dtype=np.int32)
+        tiles = np.stack([tileset.get_tile(codepoint) for codepoint in charmap])
+        assets[name] = ({"data": tiles, "codepoints": codepoints}, {"columns": columns, "rows": rows})
+    for name in IMAGES:
+        if os.path.exists(name):
+            assets[name] = ({"data": np.ascontiguousarray(tcod.image.load(name)[:, :, :3])}, {})
+    effects = []
+    if os.path.isdir(SOUND_EFFECTS):
+        effects = sorted(f"{SOUND_EFFECTS}/{name}" for name in os.listdir(SOUND_EFFECTS) if name.endswith(".wav"))
+    for name in [*SOUNDS, *effects]:
+        if os.path.exists(name):
+            import soundfile
+
+            samples, samplerate = soundfile.read(name, dtype="float32", always_2d=True)
+            assets[name] = ({"data": samples}, {"samplerate": samplerate})
+    return assets
+
+
+def align(offset: int) -> int:
+    return -(-offset // PACK_ALIGN) * PACK_ALIGN
+
+
+def build(out: str = PACK) -> List[str]:
+    """Write the pack, returns the names of the assets in it."""
+    assets = decode()
+    entries = {}
+    blobs = []
+    offset = 0  # From the start of the data, which follows the index.
+    for name, (arrays, details) in assets.items():
+        entry = {"arrays": {}, "details": details, "size": os.path.getsize(name)}
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            offset = align(offset)
+            entry["arrays"][key] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+            blobs.append((offset, array))
+            offset += array.nbytes
+        entries[name] = entry
+    index = json.dumps(entries, sort_keys=True).encode()
+    start = align(PACK_HEADER.size + len(index))
+
+    with open(out + ".tmp", "wb") as f:
+        f.write(PACK_HEADER.pack(PACK_MAGIC, len(index)))
+        f.write(index)
+        for blob_offset, array in blobs:
+            f.seek(start + blob_offset)
+            f.write(array.tobytes())
+    os.replace(out + ".tmp", out)
+    return list(entries)
+
+
+def main() -> None:
+    names = build()
+    print(f"{len(names)} assets, {os.path.getsize(PACK) / 2 ** 10:.0f} KiB, written to {PACK}:")
+    for name in names:
+        print(f"    {name}")
+
+
+if __name__ == "__main__":
+    main()
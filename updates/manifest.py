@@ -0,0 +1,242 @@
+"""
+Delta updates from a manifest of per-file hashes.
+
+A release publishes `manifest.json`, the SHA-256 and size of every file of the game folder, and each
+file as an asset named after its hash, so a file unchanged between releases is never downloaded again
+and a file that moved is downloaded once. The updater compares the manifest with the installed files
+and downloads only the ones that differ, in parallel, into the `update` folder the update script copies
+over the game on restart. Each file is checked against its hash before it is moved in place.
+
+Hashing the installed files is what makes a check slow, so the hashes are cached with the size and
+modification time they were taken at, and only files that changed since are hashed again.
+Release tooling and checks, run from the project folder:
+    python -m updates.manifest publish builds/The_Lost_Mind_2.1 --version 2.1 --out builds/release_2.1
+    python -m updates.manifest verify
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import core.exceptions as exceptions
+import updates.update_game as update_game
+
+MANIFEST = "manifest.json"
+HASH_CACHE = "manifest_cache.json"
+WORKERS = 8  # Files downloaded and hashed at once.
+# Not part of the game: files of an update in progress and what the game writes next to itself.
+SKIPPED = {MANIFEST, HASH_CACHE, "update", "__pycache__", "Update.zip", "Update.zip.part", "Update.7z", "Update.7z.part"}
+
+Manifest = Dict[str, object]  # {"version": float, "files": {path: {"sha256": str, "size": int}}}
+
+
+def write_json(path: str, data: object) -> None:
+    """Replace a file with `data` as JSON, a crash while writing leaves the old file whole."""
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(update_game.CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def game_files(folder: str) -> List[str]:
+    """Paths of the files of the game folder, relative to it and with forward slashes."""
+    paths = []
+    for root, folders, files in os.walk(folder):
+        folders[:] = sorted(name for name in folders if name not in SKIPPED and not name.startswith("."))
+        for name in sorted(files):
+            if name not in SKIPPED and not name.startswith("."):
+                paths.append(os.path.relpath(os.path.join(root, name), folder).replace(os.sep, "/"))
+    return paths
+
+
+def local_hashes(folder: str, paths: Iterable[str], full: bool = False) -> Dict[str, Optional[str]]:
+    """
+    SHA-256 of the files of the game folder, None for missing ones.
+    Files with the size and modification time of their cached hash aren't read again unless `full`.
+    """
+    cache_path = os.path.join(folder, HASH_CACHE)
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    hashes: Dict[str, Optional[str]] = {}
+    stale = {}
+    for path in paths:
+        try:
+            stat = os.stat(os.path.join(folder, path))
+        except OSError:
+            hashes[path] = None
+            continue
+        cached = cache.get(path)
+        if not full and cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            hashes[path] = cached[2]
+        else:
+            stale[path] = [stat.st_size, stat.st_mtime_ns]
+
+    # hashlib releases the GIL while hashing, so threads read and hash files at once.
+    with ThreadPoolExecutor(WORKERS) as pool:
+        for path, digest in zip(stale, pool.map(lambda path: hash_file(os.path.join(folder, path)), stale)):
+            hashes[path] = digest
+            cache[path] = stale[path] + [digest]
+    if stale:
+        try:
+            write_json(cache_path, cache)
+        except OSError:
+            pass  # A read-only install is checked in full every time.
+    return hashes
+
+
+def build(folder: str, version: float) -> Manifest:
+    """The manifest of a game folder."""
+    paths = game_files(folder)
+    hashes = local_hashes(folder, paths, full=True)
+    return {
+        "version": version,
+        "files": {
+            path: {"sha256": hashes[path], "size": os.path.getsize(os.path.join(folder, path))} for path in paths
+        },
+    }
+
+
+def changed(folder: str, manifest: Manifest, full: bool = False) -> List[str]:
+    """Files of the manifest missing from the game folder or different from it."""
+    files = manifest["files"]
+    hashes = local_hashes(folder, files, full)
+    return [path for path, entry in files.items() if hashes[path] != entry["sha256"]]
+
+
+def verify(folder: str = ".", full: bool = False) -> List[str]:
+    """Files of the installed game that don't match the manifest it was installed with."""
+    with open(os.path.join(folder, MANIFEST)) as f:
+        return changed(folder, json.load(f), full)
+
+
+def file_url(releases: str, version: float, digest: str) -> str:
+    return f"{releases}/download/{version}/{digest}"
+
+
+def fetch_manifest(releases: str, version: float, session=requests) -> Optional[Manifest]:
+    """The manifest of a release, None for releases published before there were manifests."""
+    r = session.get(f"{releases}/download/{version}/{MANIFEST}", timeout=update_game.TIMEOUT)
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return r.json()
+
+
+def download_changed(
+        manifest: Manifest,
+        paths: List[str],
+        staging: str,
+        releases: str = update_game.RELEASES,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+        workers: int = WORKERS,
+) -> bool:
+    """
+    Download `paths` of the manifest into the `staging` folder, `workers` files at once,
+    and write the manifest there too. Returns False if it was cancelled.
+
+    :param progress: Called with the bytes downloaded of all the files and their total.
+    """
+    files = manifest["files"]
+    total = sum(files[path]["size"] for path in paths)
+    lock = threading.Lock()
+    downloaded = [0]
+
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+
+    def fetch(path: str) -> bool:
+        entry = files[path]
+        target = os.path.join(staging, *path.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        last = [0]
+
+        def on_progress(done: int, _: Optional[int]) -> None:
+            with lock:
+                downloaded[0] += done - last[0]
+                last[0] = done
+                if progress:
+                    progress(downloaded[0], total)
+
+        if os.path.exists(target) and hash_file(target) == entry["sha256"]:
+            on_progress(entry["size"], None)  # Staged by an attempt that was cut short.
+            return True
+        try:
+            digest = update_game.download_file(
+                file_url(releases, manifest["version"], entry["sha256"]), target, session, on_progress, cancelled
+            )
+        except requests.HTTPError as error:
+            raise exceptions.DownloadError(f"{path} is missing from the release") from error
+        if digest is None:
+            return False
+        if digest != entry["sha256"]:
+            os.remove(target)
+            raise exceptions.DownloadError(f"{path} doesn't match the manifest")
+        return True
+
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            if not all(list(pool.map(fetch, paths))):
+                return False
+    finally:
+        session.close()
+    write_json(os.path.join(staging, MANIFEST), manifest)
+    return True
+
+
+def publish(folder: str, version: float, out: str) -> Manifest:
+    """Write the assets of a release: its manifest, and every file of the game folder named after its hash."""
+    manifest = build(folder, version)
+    os.makedirs(out, exist_ok=True)
+    for path, entry in manifest["files"].items():
+        asset = os.path.join(out, entry["sha256"])
+        if not os.path.exists(asset):
+            shutil.copyfile(os.path.join(folder, *path.split("/")), asset)
+    write_json(os.path.join(out, MANIFEST), manifest)
+    # The installed game gets it too, to verify itself against.
+    write_json(os.path.join(folder, MANIFEST), manifest)
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Publish a release manifest, or verify the installed game against its own.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publishing = commands.add_parser("publish", help="Write the manifest and the file assets of a release.")
+    publishing.add_argument("folder", help="Game folder of the release.")
+    publishing.add_argument("--version", type=float, required=True)
+    publishing.add_argument("--out", required=True, help="Folder of the assets to upload to the release.")
+    verifying = commands.add_parser("verify", help="List the installed files that don't match the manifest.")
+    verifying.add_argument("folder", nargs="?", default=".")
+    verifying.add_argument("--full", action="store_true", help="Hash every file, not just the ones that changed.")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        manifest = publish(args.folder, args.version, args.out)
+        size = sum(entry["size"] for entry in manifest["files"].values())
+        print(f"{len(manifest['files'])} files, {size / 2 ** 20:.1f} MiB, written to {args.out}")
+    else:
+        bad = verify(args.folder, args.full)
+        print("\n".join(bad) if bad else "All files match the manifest.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,242 @@
+"""
+Check for a new release and download it, off the render thread.
+
+The archive is streamed to `Update.<end>.part` a chunk at a time, so memory use doesn't grow with its
+size, and hashed as it is written. A download that breaks off is resumed from the part file with an
+HTTP Range request, by the next attempt or the next run. When the release publishes the SHA-256 of
+the archive next to it as `<archive>.sha256`, the download is checked against it before it is used.
+Releases with a manifest are updated file by file instead, see `updates.manifest`.
+"""
+import hashlib
 import os
 import re
+import threading
 import zipfile
+from typing import Optional
 
 import requests
 
 import updates.constant
 import core.exceptions as exceptions
 
+RELEASES = "https://github.com/Pw-Wolf/The_Lost_Mind/releases"
+TIMEOUT = (3.05, 30)  # Connect timeout, and the longest wait for the next chunk.
+CHUNK_SIZE = 1 << 16
+RETRIES = 3  # Attempts to finish a download that breaks off, each one resuming the last.
+
 new_version = None
 
 game_exe = "The_Lost_Mind.exe"
 
 game_folder = "data"
 
+STAGING = "update"  # Where the update is put together, the update script copies it over the game on restart.
+
+# States of the update worker, in the order they happen.
+CHECKING = "checking"
+UP_TO_DATE = "up to date"
+AVAILABLE = "available"
+DOWNLOADING = "downloading"
+INSTALLING = "installing"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+def archive_url(version, end="zip", releases=RELEASES):
+    return f"{releases}/download/{version}/The_Lost_Mind_{version}.{end}"
+
+
+def published_hash(url, session=requests):
+    """The SHA-256 published next to an archive, None if the release has none."""
+    r = session.get(url + ".sha256", timeout=TIMEOUT)
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return r.text.split()[0].lower()
 
-def download_game(end="zip"):
-    download_link = f"https://github.com/Pw-Wolf/The_Lost_Mind/releases/download/{new_version}/The_Lost_Mind_{new_version}.{end}"
-    save_path = os.path.join(os.getcwd(), "Update.{end}")
-    r = requests.get(download_link)
-    if r.status_code == 200:
-        with open(save_path, 'wb') as f:
-            f.write(r.content)
-    elif r.status_code == 404 and end == "zip":
-        download_game("7z")
-    else:
-        raise exceptions.DownloadError()
 
+def download_file(url, path, session=requests, progress=None, cancelled=None):
+    """
+    Stream `url` to `path`, resuming from `path + ".part"` if an earlier download left one.
+    Returns the SHA-256 of the file.
 
-def check_updates():
-    url = "https://github.com/Pw-Wolf/The_Lost_Mind/releases/latest"
-    r = requests.get(url)
+    :param progress: Called with the bytes downloaded and the total, None while unknown, after each chunk.
+    :param cancelled: Called after each chunk, the download stops when it returns True and the part file is kept.
+    """
+    part = path + ".part"
+    digest = hashlib.sha256()
+    done = 0
+    if os.path.exists(part):
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                done += len(chunk)
+
+    headers = {"Range": f"bytes={done}-"} if done else {}
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as r:
+        if r.status_code == 416:
+            if r.headers.get("Content-Range") != f"bytes */{done}":
+                os.remove(part)  # Longer than the archive, not a piece of it.
+                raise requests.ConnectionError("The part file doesn't match the archive")
+            total = done  # The part file is already whole.
+        else:
+            r.raise_for_status()
+            if done and r.status_code != 206:
+                digest = hashlib.sha256()  # The server sent the whole file, start over.
+                done = 0
+            length = r.headers.get("Content-Length")
+            total = done + int(length) if length is not None else None
+            with open(part, "ab" if done else "wb") as f:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    done += len(chunk)
+                    if progress:
+                        progress(done, total)
+                    if cancelled and cancelled():
+                        return None
+    if total is not None and done != total:
+        raise requests.ConnectionError(f"Download ended after {done} of {total} bytes")
+    os.replace(part, path)
+    return digest.hexdigest()
+
+
+def download_game(end="zip", releases=RELEASES, session=requests, progress=None, cancelled=None):
+    """
+    Download the archive of `new_version` to `Update.<end>` and check it against the published hash.
+    Returns its path, or None if it was cancelled.
+    """
+    download_link = archive_url(new_version, end, releases)
+    save_path = os.path.join(os.getcwd(), f"Update.{end}")
+    try:
+        digest = download_file(download_link, save_path, session, progress, cancelled)
+    except requests.HTTPError as error:
+        if error.response.status_code == 404 and end == "zip":
+            return download_game("7z", releases, session, progress, cancelled)
+        raise exceptions.DownloadError() from error
+    if digest is None:
+        return None
+    expected = published_hash(download_link, session)
+    if expected is not None and digest != expected:
+        os.remove(save_path)
+        raise exceptions.DownloadError(f"{save_path} doesn't match its published SHA-256")
+    return save_path
+
+
+def check_updates(releases=RELEASES, session=requests):
+    """Find the latest release from where its page redirects to, returns True if it is newer."""
+    with session.get(f"{releases}/latest", stream=True, timeout=TIMEOUT) as r:
+        r.raise_for_status()
+        url = r.url
     global new_version
-    new_version = float(re.search(r'tag/(\d+(\.\d+)+)', r.url).group(1))
-    print(new_version)
+    new_version = float(re.search(r'tag/(\d+(\.\d+)+)', url).group(1))
     if new_version > updates.constant.VERSION:
         return True
     return False
 
 
-def manipultion_files():
+def install_update():
+    """Extract the downloaded archive to the folder the update script copies over the game."""
     with zipfile.ZipFile('Update.zip', 'r') as zip_ref:
         zip_ref.extractall()
     os.remove("Update.zip")
-    os.rename(f"The_Lost_Mind_{new_version}", "update")
+    os.rename(f"The_Lost_Mind_{new_version}", STAGING)
+
+
+def manipultion_files():
+    install_update()
     raise exceptions.launchUpdate()
 
 
+class UpdateWorker(threading.Thread):
+    """
+    Checks for an update as soon as it is made, and downloads and installs it once asked to.
+    The Update screen only reads its state, so no frame waits on the network.
+    """
+
+    def __init__(self, releases: str = RELEASES) -> None:
+        super().__init__(name="update", daemon=True)
+        self.releases = releases
+        self.session = requests.Session()
+        self.state = CHECKING
+        self.error: Optional[BaseException] = None
+        self.done_bytes = 0
+        self.total_bytes: Optional[int] = None
+        self.confirmed = threading.Event()
+        self.cancelling = False
+        self.start()
+
+    @property
+    def progress(self) -> Optional[float]:
+        """Part of the archive downloaded, from 0 to 1, None while its size is unknown."""
+        if not self.total_bytes:
+            return None
+        return self.done_bytes / self.total_bytes
+
+    def download(self) -> None:
+        """Start downloading the update found."""
+        self.confirmed.set()
+
+    def cancel(self) -> None:
+        """Stop at the next chunk, what was downloaded is kept for the next attempt."""
+        self.cancelling = True
+        self.confirmed.set()
+
+    def on_progress(self, done: int, total: Optional[int]) -> None:
+        self.done_bytes, self.total_bytes = done, total
+
+    def run(self) -> None:
+        try:
+            self.state = AVAILABLE if check_updates(self.releases, self.session) else UP_TO_DATE
+            if self.state == UP_TO_DATE:
+                return
+            self.confirmed.wait()
+            if self.cancelling:
+                self.state = CANCELLED
+                return
+            self.state = DOWNLOADING
+            import updates.manifest as manifest
+
+            # Only the changed files when the release has a manifest, the whole archive otherwise.
+            release = manifest.fetch_manifest(self.releases, new_version, self.session)
+            for attempt in range(RETRIES):
+                try:
+                    if release is not None:
+                        finished = manifest.download_changed(
+                            release,
+                            manifest.changed(os.getcwd(), release),
+                            STAGING,
+                            self.releases,
+                            progress=self.on_progress,
+                            cancelled=lambda: self.cancelling,
+                        )
+                    else:
+                        finished = download_game(
+                            releases=self.releases,
+                            session=self.session,
+                            progress=self.on_progress,
+                            cancelled=lambda: self.cancelling,
+                        ) is not None
+                    break
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                    if attempt == RETRIES - 1:
+                        raise
+            if not finished:
+                self.state = CANCELLED
+                return
+            if release is None:
+                self.state = INSTALLING
+                install_update()
+            self.state = DONE
+        except (exceptions.DownloadError, requests.RequestException, OSError, zipfile.BadZipFile,
+                AttributeError, ValueError) as error:
+            self.error = error
+            self.state = FAILED
+        finally:
+            self.session.close()
+
+
 if __name__ == "__main__":
     check_updates()
     print(new_version)